@@ -3,6 +3,8 @@ from madats.core.coordinator import map, get_workflow_dag, manage, validate, que
 from madats.core.scheduler import Scheduler
 from madats.core.storage import get_data_id, get_path_elements, build_data_path, get_storage_tiers, get_selected_storage
 from madats.management.data_manager import dm_workflow_aware, dm_storage_aware
+from madats.management.simulator import simulate
+from madats.management.purge_manager import purge
 from madats.utils.constants import ExecutionMode, Persistence, Policy
 
 __version__ = '1.1.3'
@@ -13,4 +15,5 @@ __all__ = ['VirtualDataSpace', 'VirtualDataObject', 'Task', # data abstractions
            'get_data_id', 'get_path_elements', 'build_data_path',
            'get_storage_tiers', 'get_selected_storage', # storage abstractions
            'dm_workflow_aware', 'dm_storage_aware', # data management types
+           'simulate', # policy evaluation
            'ExecutionMode', 'Persistence', 'Policy', 'Scheduler']
@@ -1,5 +1,6 @@
 import argparse
-from madats.management import workflow_manager, execution_manager
+import sys
+from madats.management import workflow_manager, execution_manager, simulator, purge_manager, policy_manager
 from madats.utils.constants import ExecutionMode, Policy
 from madats.core import coordinator
 
@@ -12,7 +13,67 @@ def execute(args):
     vds = coordinator.map(workflow, language, policy)
     coordinator.manage(vds, mode)
 
+def simulate(args):
+    workflow = args.workflow
+    language = args.language
+    policies = [Policy.type(p) for p in args.policy]
+    limits = {simulator.COMPUTE: args.compute_slots, simulator.STAGE_IN: args.stagein_slots}
+    if args.stageout_slots is not None:
+        limits[simulator.STAGE_OUT] = args.stageout_slots
+
+    vds = coordinator.map(workflow, language)
+    vds.auto_cleanup = args.auto_cleanup
+    results = simulator.simulate(vds, policies, limits)
+    simulator.report(results)
+
+"""
+`madats simulate` predicts the makespan of a workflow with every policy, without running it
+"""
+def simulate_main(argv):
+    parser = argparse.ArgumentParser(description="predict the makespan of a workflow with different data management policies",
+                                     prog="madats simulate",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.set_defaults(func=simulate)
+    parser.add_argument('-w','--workflow', help='workflow description file', required=True)
+    parser.add_argument('-l','--language', help='workflow description language', default='yaml')
+    parser.add_argument('-p','--policy', help='data management policies', nargs='+',
+                        choices=policy_manager.names(), default=['none', 'wfa', 'sta'])
+    parser.add_argument('--compute-slots', help='compute tasks running at a time (unlimited if not set)', type=int)
+    parser.add_argument('--stagein-slots', help='stage-ins running at a time (unlimited if not set)', type=int)
+    parser.add_argument('--stageout-slots', help='stage-outs running at a time (stage-out workers if not set)', type=int)
+    parser.add_argument('--auto-cleanup', help='remove the moved data after its last use', action='store_true')
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+def purge(args):
+    purge_manager.purge(args.dry_run, args.tiers, args.workers)
+
+"""
+`madats purge` removes the copies of data that outlived their persistence
+"""
+def purge_main(argv):
+    parser = argparse.ArgumentParser(description="delete or demote the copies of data whose lifetime has expired",
+                                     prog="madats purge",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.set_defaults(func=purge)
+    parser.add_argument('-n','--dry-run', help='only report the expired copies', action='store_true')
+    parser.add_argument('-t','--tiers', help='storage tiers to purge (all if not set)', nargs='+')
+    parser.add_argument('--workers', help='copies purged in parallel ([purge] workers if not set)', type=int)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'simulate':
+        simulate_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'purge':
+        purge_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="",
                                      prog="madats",
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -21,7 +82,7 @@ def main():
     parser.add_argument('-w','--workflow', help='workflow description file', required=True)
     parser.add_argument('-l','--language', help='workflow description language', default='yaml')
     parser.add_argument('-m','--mode', help='execution mode', choices=['dag', 'bin'], default='dag')
-    parser.add_argument('-p','--policy', help='data management policy', choices=['none', 'wfa', 'sta'], default='none')
+    parser.add_argument('-p','--policy', help='data management policy', choices=policy_manager.names() + ['auto'], default='none')
     
     args = parser.parse_args()
     args.func(args)
@@ -0,0 +1,201 @@
+"""
+`madats.core.backends`
+====================================
+
+.. currentmodule:: madats.core.backends
+
+:platform: Unix, Mac
+:synopsis: Module abstracting the transfer backends that move data between storage interfaces
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import os
+import time
+import threading
+from madats.core import storage
+
+MB = 1024 * 1024
+
+class TransferBackend(object):
+    """
+    A transfer backend moves data between two storage interfaces, and declares its
+    throughput characteristics:
+    - bandwidth: MB/s of a single stream (None if it is only limited by the tiers)
+    - streams: number of files it moves in parallel
+    - latency: seconds to set up a transfer (e.g., a tape mount)
+    - native: if True, the data is moved by the native data mover of MaDaTS,
+      otherwise by running the backend's command as a job script
+    """
+
+    name = 'backend'
+    native = False
+
+    def __init__(self, bandwidth=None, streams=1, latency=0):
+        self._bandwidth = bandwidth
+        self._streams = streams
+        self._latency = latency
+
+    @property
+    def bandwidth(self):
+        return self._bandwidth
+
+    @property
+    def streams(self):
+        return self._streams
+
+    @property
+    def latency(self):
+        return self._latency
+
+    """
+    command that moves the data of `vdo_src` to `vdo_dest`; the execution manager
+    appends the source and destination paths to it
+    - backends copy with `cp -R` unless they have a command of their own
+    """
+    def command(self, vdo_src, vdo_dest):
+        return 'cp -R'
+
+    """
+    called for every chunk of data moved by the native data mover
+    """
+    def throttle(self, nbytes):
+        pass
+
+    """
+    estimated time in seconds to move `nbytes` between two tiers
+    - the throughput is bounded by the backend streams and by the tier bandwidths (MB/s)
+    """
+    def estimate(self, nbytes, src_id=None, dest_id=None):
+        rates = []
+        if self._bandwidth is not None:
+            rates.append(self._bandwidth * self._streams)
+        tiers = storage.get_storage_tiers()
+        for storage_id in [src_id, dest_id]:
+            bandwidth = float(tiers.get(storage_id, {}).get('bandwidth', 0))
+            if bandwidth > 0:
+                rates.append(bandwidth)
+        if len(rates) == 0:
+            return float(self._latency)
+        return self._latency + float(nbytes) / (min(rates) * MB)
+
+
+class PosixParallelBackend(TransferBackend):
+    """
+    Moves data between POSIX file systems with the native data mover, which copies
+    the files of a directory over parallel streams
+    """
+
+    name = 'posix-parallel'
+    native = True
+
+    def __init__(self, bandwidth=None, streams=8, latency=0):
+        TransferBackend.__init__(self, bandwidth, streams, latency)
+
+    def command(self, vdo_src, vdo_dest):
+        return 'cp -R'
+
+
+class HsiBackend(TransferBackend):
+    """
+    Moves data to and from an HPSS archive through HSI sessions
+    """
+
+    name = 'hsi'
+    native = False
+
+    def __init__(self, bandwidth=100, streams=1, latency=30):
+        TransferBackend.__init__(self, bandwidth, streams, latency)
+
+    def command(self, vdo_src, vdo_dest):
+        dest_directory = os.path.dirname(vdo_dest.abspath)
+        if storage.is_archive(vdo_src.storage_id):
+            # hack: using ls -lrt at the end so that using
+            # vdo_src and vdo_dest params work in general
+            # through the execution manager, which appends
+            # the task inputs at the end of the command
+            return 'mkdir -p {}; cd {}; hsi -q "prompt; mget {}"; ls'.format(dest_directory, vdo_dest.abspath, vdo_src.abspath)
+        else:
+            src_dir = os.path.dirname(vdo_src.abspath)
+            filename = os.path.basename(vdo_dest.abspath)
+            return 'cd {}; hsi -q "prompt; mkdir -p {}; cd {}; mput {}"; ls'.format(src_dir, dest_directory, dest_directory, filename)
+
+
+class LocalThrottledBackend(TransferBackend):
+    """
+    Moves data between local directories with the native data mover at a fixed rate,
+    after a fixed latency; emulates a slow tier (e.g., an archive) for testing
+    """
+
+    name = 'local-throttled'
+    native = True
+
+    def __init__(self, bandwidth=100, streams=1, latency=0):
+        TransferBackend.__init__(self, bandwidth, streams, latency)
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def command(self, vdo_src, vdo_dest):
+        return 'cp -R'
+
+    def throttle(self, nbytes):
+        self._lock.acquire()
+        now = time.time()
+        if self._next < now:
+            # a new transfer pays the latency
+            self._next = now + self._latency
+        self._next += float(nbytes) / (self._bandwidth * MB)
+        delay = self._next - now
+        self._lock.release()
+        if delay > 0:
+            time.sleep(delay)
+
+
+"""
+registry of transfer backends keyed by (source interface, destination interface)
+"""
+__backends__ = {}
+__default_backend__ = PosixParallelBackend()
+
+"""
+registers a backend for moving data from tiers with `src_interface` to tiers with `dest_interface`
+"""
+def register(src_interface, dest_interface, backend):
+    __backends__[(src_interface, dest_interface)] = backend
+
+
+def unregister(src_interface, dest_interface):
+    __backends__.pop((src_interface, dest_interface), None)
+
+
+def get_backend(src_interface, dest_interface):
+    return __backends__.get((src_interface, dest_interface), __default_backend__)
+
+
+def get_backends():
+    return __backends__
+
+
+"""
+get the interface of a storage tier; an archive is always accessed through HSI
+"""
+def get_interface(storage_id):
+    if storage.is_archive(storage_id):
+        return 'hsi'
+    return storage.get_interface(storage_id)
+
+
+"""
+get the backend that moves the data of `vdo_src` to `vdo_dest`
+"""
+def get_transfer_backend(vdo_src, vdo_dest):
+    return get_backend(get_interface(vdo_src.storage_id), get_interface(vdo_dest.storage_id))
+
+
+hsi_backend = HsiBackend()
+register('posix', 'posix', __default_backend__)
+register('hsi', 'posix', hsi_backend)
+register('posix', 'hsi', hsi_backend)
+register('mock', 'posix', LocalThrottledBackend())
+register('posix', 'mock', LocalThrottledBackend())
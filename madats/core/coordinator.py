@@ -16,7 +16,8 @@ import os
 import shlex
 from madats.core.vds import VirtualDataSpace, VirtualDataObject
 from madats.utils.constants import ExecutionMode, Policy
-from madats.management import workflow_manager, execution_manager, data_manager
+from madats.management import workflow_manager, execution_manager, data_manager, eviction_manager, simulator
+from madats.management import replication_manager, policy_manager
 import sys
 from collections import namedtuple
 
@@ -34,15 +35,49 @@ def map(workflow, language='yaml', policy=Policy.NONE):
     return vds
 
 
+"""
+the policy that manages a VDS: the automatic policy is resolved to the policy with
+the shortest estimated makespan, which becomes the strategy of the VDS
+"""
+def __resolve_policy__(vds):
+    policy = vds.strategy
+    if policy == Policy.AUTO:
+        policy = simulator.select_policy(vds)
+        vds.strategy = policy
+    return policy
+
+
+"""
+plans the data movement of a VDS with its policy; once planned, only the VDOs and
+tasks added to the VDS since are planned
+"""
+def __plan__(vds):
+    policy = __resolve_policy__(vds)
+    if vds.planned:
+        vdos = data_manager.replan(vds)
+        if len(vdos) > 0:
+            __apply__(vds.view(vdos), policy)
+    else:
+        __apply__(vds, policy)
+        # the data that is cleaned up can be evicted from the faster tiers between its uses,
+        # when the tiers have a capacity
+        if vds.auto_cleanup and policy != Policy.NONE and eviction_manager.capacity_bounded():
+            eviction_manager.plan_evictions(vds)
+    vds.mark_planned()
+
+
+def __apply__(vds, policy):
+    policy_manager.apply(vds, policy)
+    # the inputs read by many tasks are replicated to spread their reads
+    if policy != Policy.NONE:
+        replication_manager.plan_replicas(vds)
+
+
 """
 unmap a VDS into a workflow DAG
 """
 def get_workflow_dag(vds):
-    policy = vds.strategy
-    if policy == Policy.WORKFLOW_AWARE:
-        data_manager.dm_workflow_aware(vds)
-    elif policy == Policy.STORAGE_AWARE:
-        data_manager.dm_storage_aware(vds)
+    __plan__(vds)
 
     dag = vds.get_task_dag()
     return dag
@@ -54,14 +89,10 @@ manage VDS by managing data as per the defined policy
  - manage the workflow consisting of data and compute tasks
 """
 def manage(vds, execute_mode=ExecutionMode.DAG):
-    policy = vds.strategy
     # identify the task dependencies before applying the data mangement strategy
     # the data movements will come into effect based on the the data-task dependencies
     dag = vds.get_task_dag()
-    if policy == Policy.WORKFLOW_AWARE:
-        data_manager.dm_workflow_aware(vds)
-    elif policy == Policy.STORAGE_AWARE:
-        data_manager.dm_storage_aware(vds)
+    __plan__(vds)
         
     # get the extended workflow with data and compute tasks
     dag = vds.get_task_dag()
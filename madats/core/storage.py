@@ -16,6 +16,7 @@ import os
 import yaml
 import sys
 import filecmp
+from madats.utils.store import JsonStore
 
 class StorageHierarchy(object):
     def __init__(self):
@@ -48,18 +49,59 @@ class StorageHierarchy(object):
     def __get_storage_hierarchy__(self, storage_yaml):
         hierarchy = {}
         for tier in storage_yaml:
-            hierarchy[tier] = {}
-            tier_info = storage_yaml[tier]
-            if 'mount' in tier_info:
-                hierarchy[tier]['mount'] = tier_info['mount']
-            if 'persist' in tier_info:
-                hierarchy[tier]['persist'] = tier_info['persist']
-            if 'interface' in tier_info:
-                hierarchy[tier]['interface'] = tier_info['interface']
-            if 'bandwidth' in tier_info:
-                hierarchy[tier]['bandwidth'] = tier_info['bandwidth']
+            hierarchy.update(self.__get_tiers__(tier, storage_yaml[tier]))
 
         return hierarchy
+
+    '''
+    the storage tiers of a tier in the storage configuration: a node-local tier (`type:
+    node-local`) is a tier on each of its `nodes` (a list of node names, or a number of
+    simulated nodes), mounted where its `mount` has `{node}`, or else in a directory named
+    after the node, so that the copies of some data on different nodes have their own paths
+    '''
+    def __get_tiers__(self, tier, tier_info):
+        properties = {}
+        if 'mount' in tier_info:
+            properties['mount'] = tier_info['mount']
+        if 'persist' in tier_info:
+            properties['persist'] = tier_info['persist']
+        if 'interface' in tier_info:
+            properties['interface'] = tier_info['interface']
+        if 'bandwidth' in tier_info:
+            properties['bandwidth'] = tier_info['bandwidth']
+        # transfer limits: concurrent streams and MB/s to/from the tier, and per destination tier
+        if 'max_streams' in tier_info:
+            properties['max_streams'] = tier_info['max_streams']
+        if 'max_rate' in tier_info:
+            properties['max_rate'] = tier_info['max_rate']
+        if 'links' in tier_info:
+            properties['links'] = tier_info['links']
+        if 'capacity' in tier_info:
+            properties['capacity'] = parse_size(tier_info['capacity'])
+
+        if tier_info.get('type', None) != NODE_LOCAL:
+            return {tier: properties}
+        tiers = {}
+        for node in node_names(tier_info.get('nodes', [])):
+            node_properties = dict(properties)
+            node_properties['type'] = NODE_LOCAL
+            node_properties['tier'] = tier
+            node_properties['node'] = node
+            node_properties['mount'] = node_mount(properties['mount'], node)
+            tiers[node_tier_id(tier, node)] = node_properties
+        return tiers
+
+    def add_tier(self, tier, tier_info):
+        tiers = self.__get_tiers__(tier, tier_info)
+        for storage_id, properties in tiers.items():
+            self._hierarchy[storage_id] = properties
+            self._mount_points[properties['mount']] = storage_id
+        return sorted(tiers.keys())
+
+    def remove_tier(self, tier):
+        for storage_id in [k for k, v in self._hierarchy.items() if k == tier or v.get('tier', None) == tier]:
+            properties = self._hierarchy.pop(storage_id)
+            self._mount_points.pop(properties.get('mount', None), None)
             
     def get_mount_point(self, storage_id):
         if storage_id not in self._hierarchy:
@@ -105,7 +147,44 @@ class StorageHierarchy(object):
         return default_id
                     
         
+"""
+converts a size in bytes, or with a unit suffix (K, M, G, T, P), into bytes
+"""
+def parse_size(size):
+    if isinstance(size, (int, float)):
+        return int(size)
+    units = {'K': 1, 'M': 2, 'G': 3, 'T': 4, 'P': 5}
+    value = str(size).strip().upper().rstrip('B')
+    if len(value) > 0 and value[-1] in units:
+        return int(float(value[:-1]) * (1024 ** units[value[-1]]))
+    return int(float(value))
+
+
+"""
+names of the nodes of a node-local tier: a list of names, a comma-separated string,
+or a number of simulated nodes (node0, node1, ...)
+"""
+def node_names(nodes):
+    if isinstance(nodes, int):
+        return ['node{}'.format(i) for i in range(nodes)]
+    if not isinstance(nodes, list):
+        nodes = str(nodes).split(',')
+    return [str(node).strip() for node in nodes if str(node).strip() != '']
+
+
+def node_mount(mount, node):
+    if '{node}' in mount:
+        return mount.replace('{node}', node)
+    return os.path.join(mount, node)
+
+
+def node_tier_id(tier, node):
+    return '{}@{}'.format(tier, node)
+
+
+NODE_LOCAL = 'node-local'
 __storage_hierarchy__ = StorageHierarchy()
+__fingerprints__ = JsonStore('fingerprints')
 
 """
 return a decoded hash of a datapath
@@ -168,6 +247,86 @@ def get_storage_tiers():
     return __storage_hierarchy__.hierarchy
 
 
+"""
+get the access interface of a storage tier (posix, hsi, ...)
+"""
+def get_interface(storage_id):
+    tier = get_storage_tiers().get(storage_id, {})
+    return tier.get('interface', 'posix')
+
+
+"""
+get the capacity of a storage tier in bytes, or None if it is not configured
+"""
+def get_capacity(storage_id):
+    return get_storage_tiers().get(storage_id, {}).get('capacity', None)
+
+
+"""
+adds a storage tier, as described in the storage configuration, to the storage hierarchy
+- returns the storage-ids of the tier (one per node for a node-local tier)
+"""
+def add_tier(tier, tier_info):
+    return __storage_hierarchy__.add_tier(tier, tier_info)
+
+
+"""
+removes a storage tier, or all the node tiers of a node-local tier
+"""
+def remove_tier(tier):
+    __storage_hierarchy__.remove_tier(tier)
+
+
+"""
+check if a storage tier is on a single node, where only the tasks of that node can use it
+"""
+def is_node_local(storage_id):
+    return get_storage_tiers().get(storage_id, {}).get('type', None) == NODE_LOCAL
+
+
+"""
+get the node of a node-local storage tier, or None for a shared tier
+"""
+def get_node(storage_id):
+    return get_storage_tiers().get(storage_id, {}).get('node', None)
+
+
+"""
+get the node tiers of the node-local tiers, or of one node-local tier
+- returns a dictionary {storage_id: node}
+"""
+def get_node_tiers(tier=None):
+    node_tiers = {}
+    for storage_id, properties in get_storage_tiers().items():
+        if properties.get('type', None) == NODE_LOCAL and tier in [None, properties['tier']]:
+            node_tiers[storage_id] = properties['node']
+    return node_tiers
+
+
+"""
+check if a storage tier is an archive accessed through HSI
+"""
+def is_archive(storage_id):
+    return storage_id == 'archive' or get_interface(storage_id) == 'hsi'
+
+
+"""
+get the transfer limits that apply when moving data from one storage tier to another
+- returns a dictionary {resource: (max_streams, max_rate)} for the source tier, the destination
+  tier and the link between them; a limit that is not configured is None
+"""
+def get_transfer_limits(src_id, dest_id):
+    tiers = get_storage_tiers()
+    src_tier = tiers.get(src_id, {})
+    dest_tier = tiers.get(dest_id, {})
+    link = src_tier.get('links', {}).get(dest_id, {})
+    limits = {}
+    limits[src_id] = (src_tier.get('max_streams', None), src_tier.get('max_rate', None))
+    limits[dest_id] = (dest_tier.get('max_streams', None), dest_tier.get('max_rate', None))
+    limits[src_id + '->' + dest_id] = (link.get('max_streams', None), link.get('max_rate', None))
+    return limits
+
+
 """
 select the best storage tier based on the selected property 
 """
@@ -184,6 +343,9 @@ def get_selected_storage(property='bandwidth'):
     #print(storage_hierarchy)
     for tier in storage_hierarchy:
         #print("{}: {}".format(tier, storage_hierarchy[tier]))
+        # the data on a node-local tier is only seen by the tasks of its node
+        if is_node_local(tier):
+            continue
         value = storage_hierarchy[tier][order_key]
         if value > max_value:
             max_value = value
@@ -192,17 +354,111 @@ def get_selected_storage(property='bandwidth'):
     return fast_tier
 
 
+"""
+record the content digests of files, computed while the data was moved
+- `fingerprints` is a dictionary {datapath: (digest, algorithm)}
+- the size, modification time and inode of a file are recorded with its digest,
+  so that a fingerprint is only used as long as the file is not modified or replaced
+"""
+def record_fingerprints(fingerprints):
+    entries = {}
+    for datapath, (digest, algorithm) in fingerprints.items():
+        if not os.path.isfile(datapath):
+            continue
+        stat = os.stat(datapath)
+        entries[os.path.abspath(datapath)] = {'digest': digest, 'algorithm': algorithm,
+                                              'size': stat.st_size, 'mtime': stat.st_mtime,
+                                              'ino': stat.st_ino}
+
+    def _record(data):
+        data.update(entries)
+    __fingerprints__.update(_record)
+
+
+"""
+drops the fingerprints of removed data: of the paths, and of the files under them
+"""
+def remove_fingerprints(paths):
+    prefixes = [os.path.abspath(p) for p in paths]
+    if len(prefixes) == 0:
+        return
+
+    def _remove(data):
+        for datapath in list(data.keys()):
+            if any([datapath == p or datapath.startswith(p + os.sep) for p in prefixes]):
+                del data[datapath]
+    __fingerprints__.update(_remove)
+
+
+"""
+returns a snapshot of the recorded fingerprints
+"""
+def load_fingerprints():
+    return __fingerprints__.load()
+
+
+"""
+get the recorded (digest, algorithm) of a file, or None if the file has
+no fingerprint or has changed (or was replaced) since its fingerprint was recorded
+"""
+def get_fingerprint(datapath, fingerprints=None):
+    if fingerprints is None:
+        fingerprints = __fingerprints__.load()
+    entry = fingerprints.get(os.path.abspath(datapath), None)
+    if entry is None or not os.path.isfile(datapath):
+        return None
+    stat = os.stat(datapath)
+    if stat.st_size != entry['size'] or stat.st_mtime != entry['mtime'] \
+            or stat.st_ino != entry.get('ino', stat.st_ino):
+        return None
+    return (entry['digest'], entry['algorithm'])
+
+
+"""
+compare two datapaths through their recorded fingerprints, without reading the data
+- returns None if any of the files has no valid fingerprint
+"""
+def _is_same_fingerprint(datapath1, datapath2, fingerprints):
+    if os.path.isdir(datapath1) != os.path.isdir(datapath2):
+        return False
+    if os.path.isdir(datapath1):
+        names1 = sorted(os.listdir(datapath1))
+        names2 = sorted(os.listdir(datapath2))
+        if names1 != names2:
+            return False
+        for name in names1:
+            same = _is_same_fingerprint(os.path.join(datapath1, name), os.path.join(datapath2, name), fingerprints)
+            if same is not True:
+                return same
+        return True
+
+    fingerprint1 = get_fingerprint(datapath1, fingerprints)
+    fingerprint2 = get_fingerprint(datapath2, fingerprints)
+    if fingerprint1 is None or fingerprint2 is None or fingerprint1[1] != fingerprint2[1]:
+        return None
+    return fingerprint1[0] == fingerprint2[0]
+
+
 """
 if the two datapaths have changed, then the data is stale 
-- uses a simple logic using python's filecmp module
+- uses the fingerprints recorded by the data mover when available, otherwise
+  a simple logic using python's filecmp module
+- `fingerprints` is a snapshot of the recorded fingerprints (`load_fingerprints`),
+  so that many comparisons share it; it is loaded if it is not given
 `POTENTIALLY A USE-CASE FOR DEDUCE`
 """
-def is_same(datapath1, datapath2):
+def is_same(datapath1, datapath2, fingerprints=None):
     if not os.path.exists(datapath1) or not os.path.exists(datapath2):
         return False
     
     if os.path.isdir(datapath1) != os.path.isdir(datapath2):
         return False
+
+    if fingerprints is None:
+        fingerprints = __fingerprints__.load()
+    same = _is_same_fingerprint(datapath1, datapath2, fingerprints)
+    if same is not None:
+        return same
     
     # simple dir comparison, because does not do recursive subdir/file comparison
     if os.path.isdir(datapath1) and os.path.isdir(datapath2):
@@ -18,6 +18,7 @@ import uuid
 from madats.utils.constants import TaskType, Persistence, Policy, UNKNOWN
 from madats.core.scheduler import Scheduler
 from madats.core import storage
+from madats.core import backends
 try:
     from os import scandir
 except ImportError:
@@ -46,6 +47,7 @@ class VirtualDataObject(object):
         self._destination = ''
         self._qos = {} 
         self._non_movable = False # if the vdo is non-movable, then the data management strategy will not affect its location
+        self._mutable = True # if the vdo is immutable, then its copies can share the data with it (hard links)
 
         self.copy_to = []
         self.copy_from = None
@@ -176,6 +178,14 @@ class VirtualDataObject(object):
     def non_movable(self, non_movable):
         self._non_movable = non_movable
 
+    @property
+    def mutable(self):
+        return self._mutable
+
+    @mutable.setter
+    def mutable(self, mutable):
+        self._mutable = mutable
+
     def add_consumer(self, task):
         if isinstance(task, Task):
            if task not in self._consumers:
@@ -234,11 +244,16 @@ class VirtualDataSpace(object):
         self._storage_tiers = {}
         self.__datatasks__ = {}
         self._auto_cleanup = False
+        self._cache = False
+        # the producers and consumers of every VDO when the data movement was last planned
+        self.__plan__ = None
+        # the recorded fingerprints, loaded once while the data movement is planned
+        self.__fingerprints__ = None
 
         # basic lookup keys, more can be added later
         self.__query_elements__ = {'num_vdos': 0, 'data_tasks': 0, 'data_movements': 0,
                                    'preparer_tasks': 0, 'cleanup_tasks': 0,
-                                   'auto_cleanup': False,
+                                   'auto_cleanup': False, 'cache': False,
                                    'policy': self._strategy}
 
     @property
@@ -308,6 +323,44 @@ class VirtualDataSpace(object):
         return vdo
 
 
+    '''
+    copies a VDO to a storage tier through the intermediate tiers in `route`, in the
+    order the data moves: every hop is a data task that moves the copy made by the
+    previous hop, and every intermediate copy is temporary
+    '''
+    def cascade(self, vdo_src, dest_id, route=None):
+        vdo_dest = self.copy(vdo_src, dest_id)
+        if not route or vdo_src.non_movable:
+            return vdo_dest
+        if len(vdo_src.producers) == 0:
+            # staging in: the hops are added from the destination back to the source
+            for hop_id in reversed(route):
+                movers = [t for t in vdo_src.consumers if isinstance(t, DataTask)]
+                vdo_hop = self.copy(vdo_src, hop_id)
+                for task in movers:
+                    task.reroute(vdo_src=vdo_hop)
+        else:
+            # staging out: the hops are added from the source to the destination
+            for hop_id in route:
+                movers = [t for t in vdo_src.producers if isinstance(t, DataTask)]
+                vdo_hop = self.copy(vdo_src, hop_id)
+                for task in movers:
+                    task.reroute(vdo_dest=vdo_hop)
+        return vdo_dest
+
+
+    '''
+    copies some of the files of a directory VDO to a storage tier: the other files are
+    linked to the VDO, so that its consumers still read the whole directory from the tier
+    '''
+    def copy_files(self, vdo_src, dest_id, files):
+        vdo_dest = self.copy(vdo_src, dest_id)
+        for task in vdo_dest.producers:
+            if isinstance(task, DataTask) and task.src is vdo_src:
+                task.files = files
+        return vdo_dest
+
+
     '''
     replaces a VDO with another VDO
     '''
@@ -347,6 +400,15 @@ class VirtualDataSpace(object):
             return False
 
     ### Data Management Operations ###
+    """
+    check if the data of two VDOs is the same, through the fingerprints recorded
+    when the planning started
+    """
+    def _is_same(self, vdo1, vdo2):
+        if self.__fingerprints__ is None:
+            self.__fingerprints__ = storage.load_fingerprints()
+        return storage.is_same(vdo1.abspath, vdo2.abspath, self.__fingerprints__)
+
     """
     creates a data task to move a virtual data object to a different storage layer(s)
     """
@@ -370,7 +432,8 @@ class VirtualDataSpace(object):
             if the source is in on archive or the data is stale, then
             stage-in
             """
-            if vdo_src.storage_id != 'archive' and storage.is_same(vdo_src.abspath, vdo_dest.abspath):
+            cached = self.cache and not storage.is_archive(vdo_src.storage_id)
+            if vdo_src.storage_id != 'archive' and not cached and self._is_same(vdo_src, vdo_dest):
                 print("No data movement necessary, {} == {}".format(vdo_src.abspath, vdo_dest.abspath))
                 self.replace(vdo_src, vdo_dest)
                 vdo_dest.__is_temporary__ = True
@@ -378,6 +441,7 @@ class VirtualDataSpace(object):
 
             """
             check the datatask-id and create a datatask
+            - a cached stage-in maps the copy in the shared cache, if it is the latest data
             """
             dt_id = self._get_datatask_id(vdo_src, vdo_dest)            
             if self._datatask_exists(dt_id):
@@ -401,6 +465,7 @@ class VirtualDataSpace(object):
                         task.params[i] = vdo_dest
 
             data_task = DataTask(dt_id, vdo_src, vdo_dest, **kwargs)
+            data_task.cached = cached
             self.__datatasks__[dt_id] = data_task
             self.__query_elements__['data_movements'] += 1
             """
@@ -493,7 +558,7 @@ class VirtualDataSpace(object):
                 vdo_src_dir.add_consumer(data_task)
         # for non-persistent intermediate data: vdo_src <-> vdo_dest
         else:
-            if vdo_src.storage_id != 'archive' and storage.is_same(vdo_src.abspath, vdo_dest.abspath):
+            if vdo_src.storage_id != 'archive' and self._is_same(vdo_src, vdo_dest):
                 print("No data preparation necessary, {} == {}".format(vdo_src.abspath, vdo_dest.abspath))
                 self.replace(vdo_src, vdo_dest)
                 vdo_dest.__is_temporary__ = True
@@ -524,7 +589,7 @@ class VirtualDataSpace(object):
         and hence, the actual physical data may not be persisted (depends on the VDO properties)
         '''
         vdo_dest.__is_temporary__ = True
-        if self.auto_cleanup:
+        if self.auto_cleanup or self._is_cached(vdo_dest):
             self._create_cleanup_task(vdo_dest)
 
 
@@ -552,6 +617,8 @@ class VirtualDataSpace(object):
                 for producer in vdo.producers:
                     dummy_vdo.add_producer(producer)            
                 cleanup_task = DataTask(dt_id, vdo, dummy_vdo, DataTask.CLEANER)
+                # a cached copy is released instead of being removed
+                cleanup_task.cached = self._is_cached(vdo)
                 self.__datatasks__[dt_id] = cleanup_task
                 #cleanup_task = CleanupTask(vdo)
                 dummy_vdo.add_consumer(cleanup_task)
@@ -559,6 +626,143 @@ class VirtualDataSpace(object):
 
 
 
+    '''
+    evicts a VDO from its tier after the tasks in `released_by`, and restores it
+    before the tasks in `needed_by`
+    - staged-in data is staged in again from its source, while data produced by the
+      workflow is first demoted to the tier it was moved from, and moved back later
+    - dummy vdos order the demotion, removal and restoration of the data between
+      the two sets of tasks
+    '''
+    def evict(self, vdo, released_by, needed_by, tag=''):
+        stage_in = [p for p in vdo.producers if isinstance(p, DataTask) and p.src is vdo.copy_from]
+        vdo_released = self.map(vdo.abspath + '.released' + tag)
+        for task in released_by:
+            vdo_released.add_producer(task)
+        cleaner_id = self._get_datatask_id(vdo, vdo_released)
+        if self._datatask_exists(cleaner_id):
+            return
+        cleaner = DataTask(cleaner_id, vdo, vdo_released, DataTask.CLEANER)
+        self.__datatasks__[cleaner_id] = cleaner
+        self.__query_elements__['cleanup_tasks'] += 1
+
+        if len(stage_in) > 0:
+            vdo_src = vdo.copy_from
+            vdo_released.add_consumer(cleaner)
+        else:
+            vdo_src = self.map(storage.build_data_path(vdo.copy_from.storage_id, vdo.relative_path) + tag)
+            demote_id = self._get_datatask_id(vdo, vdo_src)
+            if not self._datatask_exists(demote_id):
+                self.__datatasks__[demote_id] = DataTask(demote_id, vdo, vdo_src)
+                self.__query_elements__['data_movements'] += 1
+                print('Data demotion task ({} -> {}) created'.format(vdo.abspath, vdo_src.abspath))
+            demote_task = self.__datatasks__[demote_id]
+            vdo_released.add_consumer(demote_task)
+            vdo_src.add_producer(demote_task)
+            vdo_src.add_consumer(cleaner)
+
+        vdo_evicted = self.map(vdo.abspath + '.evicted' + tag)
+        vdo_evicted.add_producer(cleaner)
+        restore_id = self._get_datatask_id(vdo_evicted, vdo)
+        if not self._datatask_exists(restore_id):
+            self.__datatasks__[restore_id] = DataTask(restore_id, vdo_src, vdo)
+            self.__query_elements__['data_movements'] += 1
+            print('Data restore task ({} -> {}) created'.format(vdo_src.abspath, vdo.abspath))
+        restore_task = self.__datatasks__[restore_id]
+        vdo_evicted.add_consumer(restore_task)
+        if len(stage_in) == 0:
+            vdo_src.add_consumer(restore_task)
+        vdo_restored = self.map(vdo.abspath + '.restored' + tag)
+        vdo_restored.add_producer(restore_task)
+        for task in needed_by:
+            vdo_restored.add_consumer(task)
+
+
+    '''
+    replicates a VDO for the tasks in `consumers`: the replica is copied from the VDO
+    once it is available, the tasks read the replica instead of the VDO, and the
+    replica is removed after its last use
+    - the replica is in the `.replica<tag>` directory of the tier of the VDO, or of
+      `storage_id`, under the relative path of the VDO
+    '''
+    def replicate(self, vdo, consumers, tag='', storage_id=None):
+        if storage_id is None:
+            storage_id = vdo.storage_id
+        replica_path = storage.build_data_path(storage_id, os.path.join('.replica' + tag, vdo.relative_path))
+        vdo_replica = self.map(replica_path)
+        replica_id = self._get_datatask_id(vdo, vdo_replica)
+        if self._datatask_exists(replica_id):
+            return vdo_replica
+        replica_task = DataTask(replica_id, vdo, vdo_replica)
+        replica_task.replica = True
+        self.__datatasks__[replica_id] = replica_task
+        self.__query_elements__['data_movements'] += 1
+        print('Data replication task ({} -> {}) created'.format(vdo.abspath, vdo_replica.abspath))
+        vdo.add_consumer(replica_task)
+        vdo_replica.add_producer(replica_task)
+        for task in consumers:
+            task.params = [vdo_replica if param is vdo else param for param in task.params]
+            vdo.consumers.remove(task)
+            vdo_replica.add_consumer(task)
+        # the VDO is not removed before it is replicated
+        vdo_deleted = self.datapaths.get(vdo.abspath + '.deleted', None)
+        if vdo_deleted is not None:
+            vdo_deleted.add_producer(replica_task)
+        vdo_replica.__is_temporary__ = True
+        self._create_cleanup_task(vdo_replica)
+        return vdo_replica
+
+
+    '''
+    records the VDOs and their tasks once the data movement of the VDS is planned, so
+    that the VDOs and tasks added afterwards can be planned on their own
+    '''
+    def mark_planned(self):
+        self.__fingerprints__ = None
+        self.__plan__ = {}
+        for vdo in self.vdos:
+            self.__plan__[vdo] = (set(vdo.producers), set(vdo.consumers))
+
+    @property
+    def planned(self):
+        return self.__plan__ is not None
+
+    '''
+    changes to the VDS since the data movement was last planned:
+    - the VDOs added to the VDS
+    - for every planned VDO, the producers and consumers added to it
+    '''
+    def changes(self):
+        added = []
+        tasks = {}
+        plan = self.__plan__ if self.__plan__ is not None else {}
+        for vdo in self.vdos:
+            if vdo not in plan:
+                added.append(vdo)
+                continue
+            producers, consumers = plan[vdo]
+            new_producers = [t for t in vdo.producers if t not in producers]
+            new_consumers = [t for t in vdo.consumers if t not in consumers]
+            if len(new_producers) > 0 or len(new_consumers) > 0:
+                tasks[vdo] = (new_producers, new_consumers)
+        return added, tasks
+
+    '''
+    a view of the VDS with only some of its VDOs, through which data management
+    policies plan the movement of these VDOs; the data tasks are created in the VDS
+    '''
+    def view(self, vdos):
+        return VirtualDataSpaceView(self, vdos)
+
+    '''
+    check if a VDO is a copy in the shared cache of staged-in data
+    '''
+    def _is_cached(self, vdo):
+        for producer in vdo.producers:
+            if isinstance(producer, DataTask) and producer.cached:
+                return True
+        return False
+
     '''
     setup auto cleanup
     '''
@@ -572,6 +776,19 @@ class VirtualDataSpace(object):
         #print("AUTO_CELANUP: {}".format(auto_cleanup))
         self._auto_cleanup = auto_cleanup
 
+    '''
+    setup the shared cache of staged-in data: stage-ins map the copies already
+    cached by other workflows, and the copies are released instead of removed
+    '''
+    @property
+    def cache(self):
+        return self._cache
+
+    @cache.setter
+    def cache(self, cache):
+        self.__query_elements__['cache'] = cache
+        self._cache = cache
+
     '''
     check for a data task
     '''
@@ -722,6 +939,29 @@ class VirtualDataSpace(object):
 
 ##############################################################################
 
+class VirtualDataSpaceView(object):
+    """
+    A VDS restricted to some of its VDOs: `vdos` lists only these VDOs, while all the
+    other operations are those of the VDS
+    """
+
+    def __init__(self, vds, vdos):
+        self._vds = vds
+        self._view_vdos = [v for v in vdos]
+
+    @property
+    def vds(self):
+        return self._vds
+
+    @property
+    def vdos(self):
+        return self._view_vdos
+
+    def __getattr__(self, name):
+        return getattr(self._vds, name)
+
+##############################################################################
+
 class Task(object):
     """
     A workflow task object that corresponds to a single stage/step/task/job in the workflow
@@ -733,6 +973,7 @@ class Task(object):
     def __init__(self, command, type=TaskType.COMPUTE):
         self.__id__  = str(uuid.uuid4())
         self._name = self.__id__
+        self._named = False
         self._command = command
         self._params = []
         self._expected_runtime = UNKNOWN
@@ -743,6 +984,7 @@ class Task(object):
         self._type = type
         self._scheduler = Scheduler.NONE
         self._scheduler_opts = {}
+        self._node = None # the node the task runs on, when it uses node-local data
         self._prerun = []
         self._postrun = []
 
@@ -753,6 +995,19 @@ class Task(object):
     @name.setter
     def name(self, name):
         self._name = name
+        self._named = True
+
+    '''
+    the task has a name of its own, which identifies it across workflows, rather than its
+    id or a name generated for display
+    '''
+    @property
+    def named(self):
+        return self._named
+
+    @named.setter
+    def named(self, named):
+        self._named = named
 
     @property
     def command(self):
@@ -789,6 +1044,14 @@ class Task(object):
     def runtime(self, runtime):
         self._expected_runtime = runtime
 
+    @property
+    def priority(self):
+        return self._priority
+
+    @priority.setter
+    def priority(self, priority):
+        self._priority = priority
+
     @property
     def type(self):
         return self._type
@@ -801,6 +1064,14 @@ class Task(object):
     def scheduler(self, scheduler):
         self._scheduler = scheduler
 
+    @property
+    def node(self):
+        return self._node
+
+    @node.setter
+    def node(self, node):
+        self._node = node
+
     @property
     def bin(self):
         return self._bin
@@ -855,11 +1126,18 @@ class DataTask(Task):
     PREPARER = 0 # only prepares the target data directory
     MOVER = 1    # prepares target directories and moves the data
     CLEANER = 2  # removes used up data
+    BATCH = 3    # moves a batch of data objects in a single session
 
     def __init__(self, id, vdo_src, vdo_dest, datatask_type=MOVER):
         Task.__init__(self, command='', type=TaskType.DATA)        
         self.__id__ = id
         self._datatask_type = None
+        self._src = vdo_src
+        self._dest = vdo_dest
+        self._batch = []
+        self._cached = False
+        self._replica = False
+        self._files = None
         if datatask_type == DataTask.PREPARER:
             self.params = [vdo_dest.abspath]
             self.command = "mkdir -p"
@@ -872,6 +1150,9 @@ class DataTask(Task):
             self.params = [vdo_src]
             self.command = "rm -rRf"
             self._datatask_type = DataTask.CLEANER
+        elif datatask_type == DataTask.BATCH:
+            self.params = []
+            self._datatask_type = DataTask.BATCH
 
 
     def get_datatask_id(self):
@@ -881,30 +1162,81 @@ class DataTask(Task):
     def datatask_type(self):
         return self._datatask_type
 
+    @property
+    def src(self):
+        return self._src
+
+    @property
+    def dest(self):
+        return self._dest
+
+    @property
+    def batch(self):
+        return self._batch
+
+    @batch.setter
+    def batch(self, datatasks):
+        self._batch = datatasks
+
+    @property
+    def cached(self):
+        return self._cached
+
+    @cached.setter
+    def cached(self, cached):
+        self._cached = cached
+
     """
-    data mover that copies data based on the storage tier
+    a replica is a physical copy of the data, which is never linked to its source
+    """
+    @property
+    def replica(self):
+        return self._replica
+
+    @replica.setter
+    def replica(self, replica):
+        self._replica = replica
+
+    """
+    the files (paths relative to the source directory) that the task copies; the other
+    files of the directory are linked to the source, and all the files are copied if None
+    """
+    @property
+    def files(self):
+        return self._files
+
+    @files.setter
+    def files(self, files):
+        self._files = files
+
+    """
+    data mover that copies data based on the storage tier: the command of the
+    transfer backend registered for the interfaces of the source and destination tiers
     """
     def _set_data_mover(self, vdo_src, vdo_dest):
-        # the default data mover is 'cp', however, it
-        # changes based on the source and destination
-        # storage/file systems
-        dest_directory = os.path.dirname(vdo_dest.abspath)
-        if vdo_src.storage_id == 'archive':
-            # hack: using ls -lrt at the end so that using
-            # vdo_src and vdo_dest params work in general
-            # through the execution manager, which appends
-            # the task inputs at the end of the command
-            command = 'mkdir -p {}; cd {}; hsi -q "prompt; mget {}"; ls'.format(dest_directory, vdo_dest.abspath, vdo_src.abspath)
-        elif vdo_dest.storage_id == 'archive':
-            src_dir = os.path.dirname(vdo_src.abspath)
-            filename = os.path.basename(vdo_dest.abspath)
-            command = 'cd {}; hsi -q "prompt; mkdir -p {}; cd {}; mput {}"; ls'.format(src_dir, dest_directory, dest_directory, filename)
-        else:
-            #command = 'mkdir -p {}; cp -R'.format(dest_directory)
-            #command = 'cp -R'.format(dest_directory)
-            command = 'cp -R'
+        return backends.get_transfer_backend(vdo_src, vdo_dest).command(vdo_src, vdo_dest)
 
-        return command
+    """
+    moves the data of the task from/to another VDO, e.g., when a cascaded transfer
+    adds an intermediate hop; the data mover is chosen for the new source and destination
+    """
+    def reroute(self, vdo_src=None, vdo_dest=None):
+        if vdo_src is not None:
+            self._src = vdo_src
+        if vdo_dest is not None:
+            self._dest = vdo_dest
+        if self._datatask_type == DataTask.MOVER:
+            self.params = [self._src, self._dest]
+            self.command = self._set_data_mover(self._src, self._dest)
+
+    """
+    the transfer backend that moves the data of the task
+    """
+    @property
+    def backend(self):
+        if self._datatask_type != DataTask.MOVER:
+            return None
+        return backends.get_transfer_backend(self._src, self._dest)
         
 ##########################################################################
 class CleanupTask(Task):
@@ -0,0 +1,273 @@
+"""
+`madats.management.cache_manager`
+====================================
+
+.. currentmodule:: madats.management.cache_manager
+
+:platform: Unix, Mac
+:synopsis: Module that manages a cache of staged-in data shared by workflows
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import os
+import errno
+import shutil
+import time
+import threading
+from madats.core import storage
+from madats.core.vds import DataTask
+from madats.management import transfer_manager
+from madats.utils.config import property_config
+from madats.utils.store import JsonStore
+
+LRU = 'lru'
+SIZE = 'size'
+
+# seconds between checks of the index while another workflow holds a copy; the
+# workflows of the same process are woken up as soon as a copy changes
+WAIT_INTERVAL = 1
+
+class DatasetCache(object):
+    """
+    A cache of the data staged in to the faster tiers, that is shared by concurrent
+    and consecutive workflows through an on-disk index
+    - every cached copy keeps the list of workflows that reference it; a workflow
+      takes a reference when it stages in the data and releases it instead of
+      removing the data when it is done
+    - when a tier runs out of cache space, unreferenced copies are evicted by the
+      eviction policy: least recently used (LRU) or largest first (SIZE)
+    """
+
+    def __init__(self, name='cache', eviction=LRU, size=None):
+        self._index = JsonStore(name)
+        self._eviction = eviction
+        self._size = size
+        self._changed = threading.Condition()
+
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def eviction(self):
+        return self._eviction
+
+    @eviction.setter
+    def eviction(self, eviction):
+        if eviction not in [LRU, SIZE]:
+            print("Invalid cache eviction policy ({})".format(eviction))
+            return
+        self._eviction = eviction
+
+    @property
+    def size(self):
+        return self._size
+
+    @size.setter
+    def size(self, size):
+        self._size = size
+
+    """
+    cache space of a tier: the configured cache size, or the capacity of the tier
+    """
+    def _limit(self, tier):
+        if self._size is not None:
+            return self._size
+        return storage.get_capacity(tier)
+
+    def _evict(self, data, tier, nbytes):
+        limit = self._limit(tier)
+        if limit is None:
+            return
+        entries = [(path, entry) for path, entry in data.items() if entry['tier'] == tier]
+        used = sum([entry['size'] for _, entry in entries])
+        if self._eviction == SIZE:
+            candidates = sorted(entries, key=lambda e: (-e[1]['size'], e[1]['last_used']))
+        else:
+            candidates = sorted(entries, key=lambda e: e[1]['last_used'])
+        for path, entry in candidates:
+            if used + nbytes <= limit:
+                break
+            if len(entry['refs']) > 0:
+                continue
+            print("Evicting cached copy {} ({} bytes)".format(path, entry['size']))
+            _remove(path)
+            del data[path]
+            used -= entry['size']
+        if used + nbytes > limit:
+            print("Cache on {} is full: {} bytes of {} are referenced".format(tier, used, limit))
+
+    """
+    takes a reference to the cached copy `dest` of `src` for `owner`
+    - returns True if a valid copy is cached, and False if the data has to be
+      staged in, in which case the cache space is made available
+    - waits while another workflow is staging in the same data, or still uses
+      an older version of it
+    - the cached copy is compared with the source outside of the index lock, and
+      the reference is only taken if the copy did not change in the meantime
+    """
+    def acquire(self, src, dest, tier, nbytes, owner):
+        while True:
+            snapshot = _version(self._index.get(dest, None))
+            same = snapshot is not None and snapshot[0] and storage.is_same(src, dest)
+            changed = []
+
+            def _acquire(data):
+                entry = data.get(dest, None)
+                if _version(entry) != snapshot:
+                    # the copy changed while it was compared: compare it again
+                    changed.append(dest)
+                    return None
+                if entry is not None:
+                    entry['refs'] = [ref for ref in entry['refs'] if _alive(ref)]
+                    others = [ref for ref in entry['refs'] if ref != owner]
+                    valid = same
+                    if not valid and len(others) > 0:
+                        return None
+                else:
+                    valid = False
+                if not valid:
+                    if entry is not None:
+                        del data[dest]
+                    self._evict(data, tier, nbytes)
+                    entry = {'src': src, 'tier': tier, 'size': nbytes, 'refs': [], 'staged': False}
+                    data[dest] = entry
+                entry['refs'].append(owner)
+                entry['last_used'] = time.time()
+                return valid
+
+            self._changed.acquire()
+            try:
+                valid = self._index.update(_acquire)
+                if valid is None and len(changed) == 0:
+                    self._changed.wait(WAIT_INTERVAL)
+            finally:
+                self._changed.release()
+            if valid is not None:
+                return valid
+
+    def _notify(self):
+        self._changed.acquire()
+        self._changed.notify_all()
+        self._changed.release()
+
+    """
+    marks a copy as staged in, with its actual size
+    """
+    def staged(self, dest, nbytes):
+        def _staged(data):
+            if dest in data:
+                data[dest]['staged'] = True
+                data[dest]['size'] = nbytes
+        self._index.update(_staged)
+        self._notify()
+
+    """
+    releases the reference of `owner` to a cached copy
+    - if the copy was not staged in completely, then it is dropped from the cache
+    """
+    def release(self, dest, owner):
+        def _release(data):
+            entry = data.get(dest, None)
+            if entry is None:
+                return
+            if owner in entry['refs']:
+                entry['refs'].remove(owner)
+            entry['last_used'] = time.time()
+            if not entry['staged'] and len(entry['refs']) == 0:
+                del data[dest]
+        self._index.update(_release)
+        self._notify()
+
+    """
+    returns the cached copies and their references
+    """
+    def entries(self):
+        return self._index.load()
+
+
+"""
+what identifies the version of a cached copy: it is staged in, its size and its source
+"""
+def _version(entry):
+    if entry is None:
+        return None
+    return (entry['staged'], entry['size'], entry['src'])
+
+
+"""
+removes a file or a directory
+"""
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+"""
+references are '<pid>:<workflow-id>'; the references of processes that are no
+longer running (on this node) are stale
+"""
+def _alive(ref):
+    try:
+        os.kill(int(ref.split(':', 1)[0]), 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    except ValueError:
+        return True
+    return True
+
+
+def _cache_size():
+    size = property_config.CACHE_SIZE
+    if size is None or str(size).strip() == '':
+        return None
+    return storage.parse_size(size)
+
+
+dataset_cache = DatasetCache(eviction=property_config.CACHE_EVICTION, size=_cache_size())
+
+"""
+check if a data task stages in data through the cache
+"""
+def is_cached_stage_in(task):
+    return isinstance(task, DataTask) and task.cached and task.datatask_type == DataTask.MOVER
+
+
+"""
+check if a data task releases a cached copy, instead of removing it
+"""
+def is_cached_release(task):
+    return isinstance(task, DataTask) and task.cached and task.datatask_type == DataTask.CLEANER
+
+
+"""
+stages in data through the cache: maps an already cached copy, or moves the data
+with the native data mover and adds it to the cache
+"""
+def stage_in(task, scheduler, owner, priority=0):
+    src = task.src.abspath
+    dest = task.dest.abspath
+    nbytes = transfer_manager.transfer_size(task)
+    if dataset_cache.acquire(src, dest, task.dest.storage_id, nbytes, owner):
+        print("Mapped cached copy {} of {}".format(dest, src))
+        now = time.time()
+        scheduler.record(task, 0, now, now)
+        return 'Mapped cached copy: {} -> {}'.format(src, dest)
+
+    result = transfer_manager.transfer(task, scheduler, priority)
+    if os.path.exists(dest) and storage.is_same(src, dest):
+        dataset_cache.staged(dest, transfer_manager.data_size(dest))
+    return result
+
+
+"""
+releases the reference of a workflow to a cached copy
+"""
+def release(task, owner):
+    dataset_cache.release(task.src.abspath, owner)
+    return 'Released cached copy: {}'.format(task.src.abspath)
+
@@ -11,8 +11,9 @@
 
 """
 
-from madats.utils.constants import Policy
+from madats.utils.constants import Policy, TaskType
 from madats.core import storage
+from madats.management import placement, locality_manager
 
 #__data_tasks__ = {}
 
@@ -132,34 +133,34 @@ between computation and data transfer steps.
 """
 def dm_workflow_aware(vds):   
     fast_tier = storage.get_selected_storage()
-    '''
-    create a shallow copy of the VDO list, because new VDOs will be added to VDS now
-    '''
-    vdos = [v for v in vds.vdos]
+    for vdo in workflow_aware_vdos(vds):
+        new_vdo = vds.copy(vdo, fast_tier)
+
+"""
+the VDOs moved to the fast tier by the workflow-aware policy
+- returns a shallow copy of the VDO list, because new VDOs will be added to VDS
+  when they are moved
+"""
+def workflow_aware_vdos(vds):
     '''
     if a VDO's consumer has predecessors, or if a VDO's producer has successors,
     then the VDO can be moved and used from another storage tier
     '''
-    for vdo in vdos:
+    vdos = []
+    for vdo in [v for v in vds.vdos]:
         #print("WFA: {} {} {}".format(vdo.abspath, len(vdo.producers), len(vdo.consumers)))
         # if it's an input: create data task for staging data in
         if len(vdo.producers) == 0 and len(vdo.consumers) > 0:
-            for task in vdo.consumers:
-                if len(task.predecessors) > 0:
-                    new_vdo = vds.copy(vdo, fast_tier)
-                    #vds.create_data_task(vdo, new_vdo)
-                    break            
+            if any([len(task.predecessors) > 0 for task in vdo.consumers]):
+                vdos.append(vdo)
         # if it's an output, create data task for staging data out
         elif len(vdo.consumers) == 0 and len(vdo.producers) > 0:
-            for task in vdo.producers:
-                if len(task.successors) > 0:
-                    new_vdo = vds.copy(vdo, fast_tier)
-                    #vds.create_data_task(vdo, new_vdo)
-                    break
+            if any([len(task.successors) > 0 for task in vdo.producers]):
+                vdos.append(vdo)
         # if it's intermediate data: generate/use data from fast tier
         else:
-            new_vdo = vds.copy(vdo, fast_tier)
-            #vds.create_data_task(vdo, new_vdo)
+            vdos.append(vdo)
+    return vdos
         
 
 """
@@ -178,6 +179,102 @@ def dm_storage_aware(vds):
         '''
         #vds.__create_data_task__(vdo, new_vdo)
 
+"""
+capacity-aware data management: data is placed on the storage tiers that save the most
+I/O time, within the capacity of the tiers over the course of the workflow; data is
+moved through intermediate tiers when that is cheaper than a direct move
+"""
+def dm_capacity_aware(vds):
+    '''
+    plan all the placements before creating the data tasks, since the data tasks
+    change the producers and consumers of the VDOs
+    '''
+    placements = placement.plan_capacity_aware(vds)
+    groups = {}
+    for p in placements:
+        if p.group is not None:
+            groups.setdefault(p.vdo, []).append(p)
+        else:
+            new_vdo = vds.cascade(p.vdo, p.tier, p.route)
+    # only the files of the groups that are placed are copied to the tier
+    for vdo, chosen in groups.items():
+        if len(chosen) == chosen[0].group.total:
+            new_vdo = vds.copy(vdo, chosen[0].tier)
+        else:
+            files = sorted([f for p in chosen for f in p.group.files])
+            new_vdo = vds.copy_files(vdo, chosen[0].tier, files)
+
+"""
+critical-path-aware data management: the fastest tiers are given to the data read
+and written by the tasks on the critical path of the workflow
+"""
+def dm_critical_path(vds):
+    placements = placement.plan_critical_path(vds)
+    for p in placements:
+        new_vdo = vds.copy(p.vdo, p.tier)
+
+"""
+node-local data management: the inputs are staged in to the node-local tiers of the
+nodes, balanced across the nodes, and the tasks reading them run on their nodes
+"""
+def dm_node_local(vds):
+    tiers = locality_manager.plan_node_local(vds)
+    for vdo in sorted(tiers, key=lambda v: v.abspath):
+        new_vdo = vds.copy(vdo, tiers[vdo])
+        locality_manager.pin(vds, new_vdo)
+
+"""
+the copy of a VDO that the compute tasks of the workflow read or write, or None if
+the VDO was not moved
+"""
+def working_copy(vds, vdo):
+    for copy in vdo.copy_to:
+        if not vds.vdo_exists(copy.__id__):
+            continue
+        if any([t.type == TaskType.COMPUTE for t in copy.producers + copy.consumers]):
+            return copy
+    return None
+
+"""
+moves the compute tasks added to a planned VDO to where the VDO was moved: the new
+consumers read its working copy, and the new producers write the working copy if the
+workflow writes the VDO there; the copy is not cleaned up before the new tasks
+"""
+def attach(vds, vdo, producers, consumers):
+    copy = working_copy(vds, vdo)
+    if copy is None:
+        return
+    moved = [t for t in consumers if t.type == TaskType.COMPUTE]
+    if any([t.type == TaskType.COMPUTE for t in copy.producers]):
+        moved += [t for t in producers if t.type == TaskType.COMPUTE and t not in moved]
+    for task in moved:
+        task.params = [copy if param is vdo else param for param in task.params]
+        if task in vdo.consumers:
+            vdo.consumers.remove(task)
+            copy.add_consumer(task)
+        if task in vdo.producers:
+            vdo.producers.remove(task)
+            copy.add_producer(task)
+        print('Using {} for the new task {}'.format(copy.abspath, task.name))
+    vdo_deleted = vds.datapaths.get(copy.abspath + '.deleted', None)
+    if vdo_deleted is not None:
+        for task in moved:
+            vdo_deleted.add_producer(task)
+
+"""
+incremental data management of a VDS that changed after its data movement was planned:
+the tasks added to the planned VDOs are attached to where these VDOs were moved, and
+only the VDOs added since are left to be planned, so that the rest of the VDS is not
+planned again
+- returns the VDOs to plan
+"""
+def replan(vds):
+    added, tasks = vds.changes()
+    for vdo, (producers, consumers) in tasks.items():
+        attach(vds, vdo, producers, consumers)
+    print('Re-planning {} new VDOs, {} changed VDOs'.format(len(added), len(tasks)))
+    return added
+
 '''
 def plan(vds):
     policy = vds.data_management_policy
@@ -187,4 +284,8 @@ def plan(vds):
         dm_workflow_aware(vds)
     elif policy == Policy.STORAGE_AWARE:
         dm_storage_aware(vds)
+    elif policy == Policy.CAPACITY_AWARE:
+        dm_capacity_aware(vds)
+    elif policy == Policy.CRITICAL_PATH:
+        dm_critical_path(vds)
 '''
@@ -0,0 +1,205 @@
+"""
+`madats.management.eviction_manager`
+====================================
+
+.. currentmodule:: madats.management.eviction_manager
+
+:platform: Unix, Mac
+:synopsis: Module that plans when data is evicted from the faster storage tiers during execution
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+from madats.core import storage
+from madats.core.vds import DataTask
+from madats.utils import dagman
+from madats.utils.constants import TaskType
+from madats.utils.config import property_config
+from madats.management import placement
+
+class OccupancyTimeline(object):
+    """
+    Bytes occupied on each storage tier at every level of the workflow execution
+    - a VDO occupies its tier from its first to its last use, for every segment
+      between its evictions
+    """
+
+    def __init__(self, num_levels):
+        self._num_levels = num_levels
+        self._usage = {}
+
+    @property
+    def usage(self):
+        return self._usage
+
+    def add(self, tier, size, start, end):
+        usage = self._usage.setdefault(tier, [0] * self._num_levels)
+        for level in range(start, end + 1):
+            usage[level] += size
+
+    """
+    the level at which a tier is the most occupied, and its occupancy
+    """
+    def peak(self, tier):
+        usage = self._usage.get(tier, [0])
+        peak = max(usage)
+        return (usage.index(peak), peak)
+
+    def report(self, title):
+        print('{}:'.format(title))
+        for tier in sorted(self._usage):
+            level, peak = self.peak(tier)
+            print('  {}: {} (peak {} bytes at level {})'.format(
+                tier, ' '.join([str(b) for b in self._usage[tier]]), peak, level))
+
+
+class Residency(object):
+    """
+    The uses of a VDO on a faster tier, i.e., the levels of the tasks that read or
+    write it, and the levels after which it is evicted until its next use
+    """
+
+    def __init__(self, vdo, size, uses):
+        self._vdo = vdo
+        self._size = size
+        self._uses = uses
+        self._evictions = []
+
+    @property
+    def vdo(self):
+        return self._vdo
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def uses(self):
+        return self._uses
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    """
+    levels during which the VDO occupies its tier, between its evictions
+    """
+    def segments(self):
+        segments = []
+        start = self._uses[0]
+        previous = start
+        for level in self._uses[1:]:
+            if previous in self._evictions:
+                segments.append((start, previous))
+                start = level
+            previous = level
+        segments.append((start, previous))
+        return segments
+
+    """
+    the previous and next use around a level the VDO is not used at, or None
+    """
+    def gap(self, level):
+        if level in self._uses:
+            return None
+        before = [l for l in self._uses if l < level]
+        after = [l for l in self._uses if l > level]
+        if len(before) == 0 or len(after) == 0:
+            return None
+        return (max(before), min(after))
+
+
+"""
+check if any storage tier has a capacity, i.e., if there is a peak occupancy to lower
+"""
+def capacity_bounded():
+    return any([storage.get_capacity(t) is not None for t in storage.get_storage_tiers()])
+
+
+"""
+the faster-tier copies of the VDOs that can be evicted between their uses: data
+moved to a non-archive tier, that is only used by compute tasks
+- data that is staged out or shared through the cache is kept until the end
+"""
+def residencies(vds, levels):
+    residents = []
+    for vdo in vds.vdos:
+        if vdo.copy_from is None or vdo.persist or vdo.non_movable:
+            continue
+        if storage.is_archive(vdo.storage_id) or vdo.storage_id == vdo.copy_from.storage_id:
+            continue
+        if any([t.type != TaskType.COMPUTE for t in vdo.consumers]):
+            continue
+        if any([isinstance(t, DataTask) and t.cached for t in vdo.producers]):
+            continue
+        uses = sorted(set([levels[t] for t in vdo.producers + vdo.consumers
+                           if t.type == TaskType.COMPUTE and t in levels]))
+        if len(uses) == 0:
+            continue
+        residents.append(Residency(vdo, placement.estimate_size(vdo), uses))
+    return residents
+
+
+def timeline(residents, num_levels):
+    occupancy = OccupancyTimeline(num_levels)
+    for resident in residents:
+        for start, end in resident.segments():
+            occupancy.add(resident.vdo.storage_id, resident.size, start, end)
+    return occupancy
+
+
+"""
+plans the evictions of the faster-tier copies of a VDS to minimize the peak occupancy
+of every tier
+- a copy is removed after its last use, and a copy that is used again more than
+  `reuse_distance` levels later is evicted after its last use before the most
+  occupied level of the tier, and restored before its next use
+- the largest copies are evicted first, until the peak of a tier cannot be lowered
+- returns the occupancy timeline of the tiers
+"""
+def plan_evictions(vds, reuse_distance=None):
+    if reuse_distance is None:
+        reuse_distance = int(property_config.EVICTION_REUSE_DISTANCE)
+    dag = vds.get_task_dag()
+    levels = dagman.task_levels(dag, counted=lambda t: t.type == TaskType.COMPUTE)
+    num_levels = max(levels.values()) + 1 if len(levels) > 0 else 1
+    residents = residencies(vds, levels)
+    timeline(residents, num_levels).report('Fast-tier occupancy by level, without evictions')
+
+    exhausted = set()
+    while True:
+        occupancy = timeline(residents, num_levels)
+        tiers = [t for t in occupancy.usage if t not in exhausted]
+        if len(tiers) == 0:
+            break
+        tier = max(tiers, key=lambda t: occupancy.peak(t)[1])
+        level, peak = occupancy.peak(tier)
+        best = None
+        for resident in residents:
+            if resident.vdo.storage_id != tier:
+                continue
+            gap = resident.gap(level)
+            if gap is None or gap[0] in resident.evictions or gap[1] - gap[0] < reuse_distance:
+                continue
+            if best is None or resident.size > best[0].size:
+                best = (resident, gap)
+        if best is None or best[0].size == 0:
+            exhausted.add(tier)
+            continue
+        resident, gap = best
+        resident.evictions.append(gap[0])
+
+    for resident in residents:
+        vdo = resident.vdo
+        users = [t for t in vdo.producers + vdo.consumers if t.type == TaskType.COMPUTE and t in levels]
+        for i, level in enumerate(sorted(resident.evictions)):
+            next_use = min([l for l in resident.uses if l > level])
+            released_by = [t for t in users if levels[t] <= level]
+            needed_by = [t for t in users if levels[t] >= next_use]
+            print('Evicting {} after level {} until level {}'.format(vdo.abspath, level, next_use))
+            vds.evict(vdo, released_by, needed_by, '' if i == 0 else '.' + str(i))
+
+    occupancy = timeline(residents, num_levels)
+    occupancy.report('Fast-tier occupancy by level, with evictions')
+    return occupancy
@@ -12,12 +12,16 @@
 """
 
 from madats.utils import dagman
+from madats.utils.store import store_dir
+from madats.utils.config import property_config
+from madats.management import transfer_manager, cache_manager, purge_manager, history_manager
 from madats.core.scheduler import Scheduler
 from madats.core.vds import VirtualDataObject, Task
 import time
 import os
 import threading
 import multiprocessing
+from multiprocessing.pool import ThreadPool
 try:
     import Queue as queue
 except:
@@ -30,6 +34,19 @@ import shutil
 result_list = []
 taskmap = {}
 lock = threading.Lock()
+_stageoutq = None
+_stageout_sequence = 0
+transfer_scheduler = None
+prefetch_scheduler = None
+deadline_scheduler = None
+# the copies left on the storage tiers by the data tasks, for the purge service
+placement_tracker = purge_manager.PlacementTracker()
+# the runtimes and data sizes observed in the run, for the run history
+run_recorder = history_manager.RunRecorder()
+prefetch_lookahead = int(property_config.PREFETCH_LOOKAHEAD)
+stageout_workers = int(property_config.STAGEOUT_WORKERS)
+# completion times of the last workflow run: start, compute_done, data_durable
+timings = {}
 
 _workflow_id = str(uuid.uuid4())
 outdir = os.path.expandvars('$MADATS_HOME/outdir')
@@ -41,7 +58,9 @@ def worker(taskq):
     while True:
         try:
             task = taskq.get()
-            job_script = generate_script(task)
+        except queue.Empty:
+            return
+        try:
             '''
             wait until all the dependencies of the task have finished
             '''
@@ -67,23 +86,169 @@ def worker(taskq):
                     param_list.append(param)
 
             params = " ".join(param_list)    
+            if transfer_manager.is_stage_in(task):
+                prefetch_scheduler.admit(task)
             print("** Submitted: {} {}".format(task.command, params))
-            result = submit(job_script, task.scheduler)
+            result = run_safely(task)
             print("** Finished: {} {}".format(task.command, params))
+            prefetch_scheduler.finished(task)
             #print("[Workflow-{}] Finished {} task-{}".format(_workflow_id, TaskType.name(task.type), task.__id__))
             
             '''
             once the task completes, notify the dependents
             '''
-            lock.acquire()
-            for succ in task.successors:
-                taskmap[succ.__id__] -= 1
-            result_list.append(result)
-            #print("Result: {}".format(result))
-            lock.release()
+            completed(task, result)
+        finally:
             taskq.task_done()
-        except queue.Empty:
-            return
+
+
+"""
+background workers staging out the workflow outputs
+- a stage-out is queued as soon as the output it moves is complete, and runs
+  while the rest of the workflow proceeds
+"""
+def stageout_worker(stageoutq):
+    while True:
+        _, _, task = stageoutq.get()
+        try:
+            print("** Staging out: {}".format(task.command))
+            result = run_safely(task)
+            completed(task, result)
+        finally:
+            stageoutq.task_done()
+
+
+"""
+runs a task, and turns an error raised while it runs into the result of a failed task,
+as `submit` does, so that the workflow goes on and its workers are not lost
+"""
+def run_safely(task):
+    try:
+        return run_task(task)
+    except Exception as e:
+        print("Task execution error:")
+        print(e)
+        return str(e)
+
+
+"""
+number of stage-out workers: the configured number, or one per stage-out if it is 0,
+so that every stage-out starts as soon as its output is complete
+"""
+def num_stageout_workers(num_stageouts):
+    if stageout_workers > 0:
+        return stageout_workers
+    return max(1, num_stageouts)
+
+
+"""
+marks a task as completed: notifies its dependents, queues the stage-outs that
+became ready and records the compute/stage-out completion times
+"""
+def completed(task, result):
+    lock.acquire()
+    now = time.time()
+    if transfer_manager.is_stage_out(task):
+        timings['data_durable'] = max(timings.get('data_durable', 0), now)
+    elif task.type == TaskType.COMPUTE:
+        timings['compute_done'] = max(timings.get('compute_done', 0), now)
+    placement_tracker.track(task)
+    for succ in task.successors:
+        taskmap[succ.__id__] -= 1
+        if taskmap[succ.__id__] == 0:
+            deadline_scheduler.check(succ, now)
+            if transfer_manager.is_stage_out(succ):
+                queue_stageout(succ)
+    result_list.append(result)
+    #print("Result: {}".format(result))
+    lock.release()
+
+
+"""
+queues a stage-out that is ready; the stage-outs leading to a deadline go first,
+by their slack
+"""
+def queue_stageout(task):
+    global _stageout_sequence
+    _stageout_sequence += 1
+    _stageoutq.put((deadline_scheduler.priority(task), _stageout_sequence, task))
+
+
+"""
+report when all the computations finished and when all the outputs were durable
+"""
+def report_timings():
+    start = timings['start']
+    compute_done = timings.get('compute_done', start)
+    data_durable = max(timings.get('data_durable', compute_done), compute_done)
+    timings['compute_done'] = compute_done
+    timings['data_durable'] = data_durable
+    print("[Workflow-{}] Compute done after {:.2f}s, data durable after {:.2f}s".format(
+        _workflow_id, compute_done - start, data_durable - start))
+    return timings
+
+
+"""
+run a task: data tasks that move data between posix tiers are run by the native
+data mover, all other tasks are submitted as job scripts
+- cached stage-ins go through the shared cache, and cached copies are released
+  instead of removed
+- data tasks share the transfer scheduler that enforces the storage transfer limits,
+  and the data tasks leading to a deadline acquire the transfer streams first
+"""
+def run_task(task):
+    priority = 0
+    if prefetch_scheduler is not None:
+        priority = prefetch_scheduler.priority(task)
+    if deadline_scheduler is not None:
+        deadline_scheduler.check(task)
+        priority = deadline_scheduler.priority(task, priority)
+    if cache_manager.is_cached_release(task):
+        return cache_manager.release(task, _cache_owner())
+    if cache_manager.is_cached_stage_in(task) and transfer_manager.is_native_transfer(task):
+        return cache_manager.stage_in(task, transfer_scheduler, _cache_owner(), priority)
+    if transfer_manager.is_native_transfer(task):
+        return transfer_manager.transfer(task, transfer_scheduler, priority)
+
+    job_script = generate_script(task)
+    if not transfer_manager.is_transfer(task):
+        start = time.time()
+        result = submit(job_script, task.scheduler)
+        if task.type == TaskType.COMPUTE:
+            run_recorder.observe(task, start, time.time())
+        return result
+
+    transfer_scheduler.acquire(task, priority)
+    start = time.time()
+    try:
+        result = submit(job_script, task.scheduler)
+    finally:
+        transfer_scheduler.release(task)
+    transfer_scheduler.record(task, transfer_manager.transfer_size(task), start, time.time())
+    return result
+
+
+"""
+the workflow's references to the copies in the shared cache
+"""
+def _cache_owner():
+    return '{}:{}'.format(os.getpid(), _workflow_id)
+
+
+"""
+report the achieved throughput of the data transfers and save the transfer manifest
+"""
+def report_transfers():
+    if len(transfer_scheduler.manifest) > 0:
+        manifest_file = os.path.join(store_dir, 'manifests', _workflow_id + '.json')
+        transfer_scheduler.write_manifest(manifest_file)
+        print("[Workflow-{}] Transfer manifest: {}".format(_workflow_id, manifest_file))
+    report = transfer_scheduler.report()
+    for (src, dest), stats in sorted(report.items()):
+        print("[Workflow-{}] Transfers {} -> {}: {} data tasks, {} bytes in {:.2f}s ({:.2f} MB/s)".format(
+            _workflow_id, src, dest, stats['tasks'], stats['bytes'], stats['seconds'],
+            stats['throughput'] / transfer_manager.MB))
+    return report
 
 
 """
@@ -143,10 +308,14 @@ def generate_script(task):
     with open(script, 'w') as f:        
         f.write("#!/bin/bash\n")
         if task.scheduler != Scheduler.NONE:
-            for opt in task.scheduler_opts:
+            scheduler_opts = dict(task.scheduler_opts)
+            # a task using node-local data runs on the node that holds the data
+            if task.node is not None:
+                scheduler_opts['nodelist'] = task.node
+            for opt in scheduler_opts:
                 directive = Scheduler.get_directive(task.scheduler, opt)
                 if directive != None:
-                    value = str(task.scheduler_opts[opt])
+                    value = str(scheduler_opts[opt])
                     directive_stmt = directive + '=' + value + '\n'
                     f.write(directive_stmt)
         f.write(command + ' ' + params + '\n')
@@ -164,32 +333,61 @@ Execute a workflow DAG: generate individual task scripts and then run
 - a task waits on the state to be changed
 """
 def dag_execution(dag):
-    global _script_dir
+    global _script_dir, transfer_scheduler, prefetch_scheduler, deadline_scheduler
     _script_dir = os.path.join(outdir, _workflow_id)
     if not os.path.exists(_script_dir):
         os.makedirs(_script_dir)
 
+    transfer_scheduler = transfer_manager.TransferScheduler()
+    prefetch_scheduler = transfer_manager.PrefetchScheduler(dag, prefetch_lookahead)
+    deadline_scheduler = transfer_manager.DeadlineScheduler(dag)
+
+    global _stageoutq, _stageout_sequence
     print("[Workflow-{}] Getting tasks".format(_workflow_id))
     execution_order = dagman.batch_execution_order(dag)
     taskq = queue.Queue()
+    _stageoutq = queue.PriorityQueue()
+    _stageout_sequence = 0
+    timings.clear()
+    timings['start'] = time.time()
 
     print("[Workflow-{}] Executing tasks".format(_workflow_id))
+    num_tasks = 0
+    num_stageouts = 0
     for task in execution_order:
-        taskq.put(task)
         taskmap[task.__id__] = len(task.predecessors)
+    for task in execution_order:
+        if not transfer_manager.is_stage_out(task):
+            taskq.put(task)
+            num_tasks += 1
+        else:
+            num_stageouts += 1
+            if taskmap[task.__id__] == 0:
+                queue_stageout(task)
         
     #print(taskmap)
 
-    for i in range(len(execution_order)):
+    for i in range(num_stageout_workers(num_stageouts)):
+        thread = threading.Thread(target=stageout_worker, args=(_stageoutq,))
+        thread.daemon = True
+        thread.start()
+
+    for i in range(num_tasks):
         thread = threading.Thread(target=worker, args=(taskq,))
         thread.daemon = True
         thread.start()
 
     taskq.join()
+    _stageoutq.join()
+    placement_tracker.flush(purge_manager.placement_index)
+    run_recorder.flush(history_manager.run_history)
     print("[Workflow-{}] Finished execution".format(_workflow_id))
     print("{}".format(result_list))
-    #shutil.rmtree(_script_dir)
-    shutil.rmtree(outdir)
+    report_transfers()
+    report_timings()
+    print("[Workflow-{}] Prefetched {} stage-in tasks ahead of their consumers".format(_workflow_id, prefetch_scheduler.prefetched))
+    # the journals of interrupted data tasks in the output directory are kept
+    shutil.rmtree(_script_dir)
 
 """
 execute a single task of the workflow
@@ -210,10 +408,14 @@ def execute_task(task):
 Execute a workflow DAG by combining independent tasks into 'Bins'
 """
 def bin_execution(dag):
-    global _script_dir
+    global _script_dir, transfer_scheduler, prefetch_scheduler, deadline_scheduler
     _script_dir = os.path.join(outdir, _workflow_id)
     if not os.path.exists(_script_dir):
         os.makedirs(_script_dir)
+    transfer_scheduler = transfer_manager.TransferScheduler()
+    # bins already stage data in just before it is used
+    prefetch_scheduler = None
+    deadline_scheduler = transfer_manager.DeadlineScheduler(dag)
 
     print("[Workflow-{}] Getting tasks".format(_workflow_id))
     task_bins = dagman.bin_execution_order(dag)
@@ -224,22 +426,68 @@ def bin_execution(dag):
         idx += 1
         
     result_list = []
+    timings.clear()
+    timings['start'] = time.time()
     print("[Workflow-{}] Executing tasks".format(_workflow_id))
+    # stage-outs do not wait for their bin, but run in the background once their inputs are complete
+    stageouts = [t for tasks in task_bins for t in tasks if transfer_manager.is_stage_out(t)]
+    stageouts.sort(key=lambda t: deadline_scheduler.priority(t))
+    stageout_pool = ThreadPool(processes=num_stageout_workers(len(stageouts)))
+    staging = {}
+    finished = set()
+
+    def run_bin_task(task):
+        result = run_safely(task)
+        lock.acquire()
+        if task.type == TaskType.COMPUTE:
+            timings['compute_done'] = time.time()
+        placement_tracker.track(task)
+        finished.add(task)
+        for stageout in stageouts:
+            if stageout not in staging and all([p in finished for p in stageout.predecessors]):
+                staging[stageout] = stageout_pool.apply_async(run_stageout, args=(stageout,))
+        lock.release()
+        return result
+
+    # the outputs are durable when each stage-out finishes, whatever order they finish in
+    def run_stageout(task):
+        result = run_safely(task)
+        lock.acquire()
+        timings['data_durable'] = max(timings.get('data_durable', 0), time.time())
+        placement_tracker.track(task)
+        lock.release()
+        return result
+
     for tasks in task_bins:
-        num_tasks = len(tasks)
-        pool = multiprocessing.Pool(processes=num_tasks)
-        job_args = []
+        tasks = [t for t in tasks if not transfer_manager.is_stage_out(t)]
+        if len(tasks) == 0:
+            continue
+        # tasks that depend on a stage-out (e.g., cleaners) wait for it to finish
         for task in tasks:
-            job_script = generate_script(task)
-            scheduler = task.scheduler
-            job_args.append((job_script, scheduler))
-
-        results = [pool.apply_async(submit, args=job_arg) for job_arg in job_args]
+            for pred in task.predecessors:
+                if pred in staging:
+                    staging[pred].wait()
+        num_tasks = len(tasks)
+        # threads, so that the data tasks of a bin share the transfer scheduler
+        pool = ThreadPool(processes=num_tasks)
+        results = [pool.apply_async(run_bin_task, args=(task,)) for task in tasks]
         for result in results:
             result_list.append(result.get())
+        pool.close()
+
+    for task in stageouts:
+        if task not in staging:
+            staging[task] = stageout_pool.apply_async(run_stageout, args=(task,))
+    for task in stageouts:
+        result_list.append(staging[task].get())
+    stageout_pool.close()
+    placement_tracker.flush(purge_manager.placement_index)
+    run_recorder.flush(history_manager.run_history)
             
     print("[Workflow-{}] Finished execution".format(_workflow_id))
     print("{}".format(result_list))
+    report_transfers()
+    report_timings()
 
 
 """
@@ -260,6 +508,8 @@ def dependency_execution(dag):
 abstracting the workflow manager execution modes
 """
 def execute(dag, mode=ExecutionMode.DAG):
+    # archive transfers on the same level of the workflow share one HSI session
+    dag = transfer_manager.batch_archive_transfers(dag)
     if mode == ExecutionMode.DAG:
         dag_execution(dag)
     elif mode == ExecutionMode.BIN:
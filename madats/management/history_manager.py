@@ -0,0 +1,222 @@
+"""
+`madats.management.history_manager`
+====================================
+
+.. currentmodule:: madats.management.history_manager
+
+:platform: Unix, Mac
+:synopsis: Module that records the observed runtimes and data sizes of workflow runs to predict the next runs
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import os
+import threading
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+from madats.core.vds import VirtualDataObject
+from madats.core.scheduler import Scheduler
+from madats.utils.store import JsonStore
+
+"""
+the data a VDO is a copy of, i.e., the VDO of the workflow description
+"""
+def origin(vdo):
+    while vdo.copy_from is not None:
+        vdo = vdo.copy_from
+    return vdo
+
+
+"""
+key of a task in the run history: its name and command; a task without a name of its
+own is identified by its command and parameters, with the data it reads and writes at
+the paths of the workflow description
+"""
+def task_key(task):
+    if task.named:
+        return '{}|{}'.format(task.name, task.command)
+    params = [origin(p).abspath if isinstance(p, VirtualDataObject) else str(p) for p in task.params]
+    return '|'.join([task.command] + params)
+
+
+def inputs(task):
+    return [p for p in task.params if isinstance(p, VirtualDataObject) and task in p.consumers]
+
+
+def outputs(task):
+    return [p for p in task.params if isinstance(p, VirtualDataObject) and task in p.producers]
+
+
+def _size(path):
+    if not os.path.exists(path):
+        return 0
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    nbytes = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            filepath = os.path.join(root, name)
+            if not os.path.islink(filepath):
+                nbytes += os.path.getsize(filepath)
+    return nbytes
+
+
+def _average(record, name, value, runs):
+    record[name] = record.get(name, value) + (value - record.get(name, value)) / float(runs)
+
+
+class RunHistory(object):
+    """
+    A store of what previous runs observed, shared by the runs of the workflows:
+    - tasks: for every task key, the number of runs and the average runtime (seconds)
+      of the `timed` runs, bytes read, bytes written and size of each output (by its position)
+    - vdos: for the path of every VDO of a workflow description, its average size
+    The history is loaded once, when it is first used to predict a run.
+    """
+
+    def __init__(self, name='history', directory=None):
+        self._store = JsonStore(name, directory)
+        self._records = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def records(self):
+        self._lock.acquire()
+        if self._records is None:
+            self._records = self._store.load()
+            self._records.setdefault('tasks', {})
+            self._records.setdefault('vdos', {})
+        self._lock.release()
+        return self._records
+
+    """
+    forgets the loaded history, so that the next prediction reads the store again
+    """
+    def reload(self):
+        self._lock.acquire()
+        self._records = None
+        self._lock.release()
+
+    """
+    adds the observations of a run ({'tasks': {key: observation}, 'vdos': {path: size}})
+    to the history
+    """
+    def record(self, observations):
+        def _record(data):
+            tasks = data.setdefault('tasks', {})
+            for key, observed in observations['tasks'].items():
+                record = tasks.setdefault(key, {'runs': 0, 'outputs': {}})
+                record['runs'] += 1
+                for name in ['read_bytes', 'write_bytes']:
+                    _average(record, name, observed[name], record['runs'])
+                if observed['runtime'] is not None:
+                    record['timed'] = record.get('timed', 0) + 1
+                    _average(record, 'runtime', observed['runtime'], record['timed'])
+                for position, size in observed['outputs'].items():
+                    _average(record['outputs'], position, size, record['runs'])
+            vdos = data.setdefault('vdos', {})
+            for path, size in observations['vdos'].items():
+                record = vdos.setdefault(path, {'runs': 0})
+                record['runs'] += 1
+                _average(record, 'size', size, record['runs'])
+        self._store.update(_record)
+        self.reload()
+
+    """
+    predicted runtime of a task in seconds, or None if it never ran
+    """
+    def predict_runtime(self, task):
+        record = self.records['tasks'].get(task_key(task), None)
+        if record is None:
+            return None
+        return record.get('runtime', None)
+
+    """
+    predicted size of a VDO in bytes, or None if it was never observed: the size of
+    the data at the same path, or of the same output of the task that writes it
+    """
+    def predict_size(self, vdo):
+        record = self.records['vdos'].get(origin(vdo).abspath, None)
+        if record is not None:
+            return int(record['size'])
+        for task in vdo.producers:
+            record = self.records['tasks'].get(task_key(task), None)
+            if record is None:
+                continue
+            position = str(outputs(task).index(vdo)) if vdo in outputs(task) else None
+            if position in record['outputs']:
+                return int(record['outputs'][position])
+        return None
+
+
+class RunRecorder(object):
+    """
+    Observations of the compute tasks of a workflow run, that are added to the run
+    history at once when the run ends
+    - the runtime of a task submitted to a batch scheduler includes its wait in the
+      queue, so only the runtimes of the tasks run without a scheduler are observed
+    - the data a task read and wrote is measured by a background thread, so that the
+      successors of the task do not wait for it; data that was removed before it was
+      measured (e.g., by a cleanup task) is not observed
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._vdos = {}
+        self._lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._measurer = None
+
+    """
+    records the runtime of a task and the paths of its data, which are measured later
+    """
+    def observe(self, task, start, end):
+        runtime = end - start if task.scheduler == Scheduler.NONE else None
+        paths = ([(origin(vdo).abspath, vdo.abspath) for vdo in inputs(task)],
+                 [(origin(vdo).abspath, vdo.abspath) for vdo in outputs(task)])
+        self._lock.acquire()
+        if self._measurer is None:
+            self._measurer = threading.Thread(target=self._measure)
+            self._measurer.daemon = True
+            self._measurer.start()
+        self._lock.release()
+        self._pending.put((task_key(task), runtime, paths))
+
+    def _measure(self):
+        while True:
+            key, runtime, (read_paths, written_paths) = self._pending.get()
+            try:
+                read = [(o, _size(p)) for o, p in read_paths if os.path.exists(p)]
+                written = [(i, o, _size(p)) for i, (o, p) in enumerate(written_paths) if os.path.exists(p)]
+                observation = {'runtime': runtime, 'read_bytes': sum([size for _, size in read]),
+                               'write_bytes': sum([size for _, _, size in written]),
+                               'outputs': dict((str(i), size) for i, _, size in written)}
+                self._lock.acquire()
+                self._tasks[key] = observation
+                for path, size in read + [(o, size) for _, o, size in written]:
+                    self._vdos[path] = size
+                self._lock.release()
+            finally:
+                self._pending.task_done()
+
+    """
+    adds the observations of the run to the history, once all its data is measured
+    """
+    def flush(self, history):
+        self._pending.join()
+        self._lock.acquire()
+        observations = {'tasks': self._tasks, 'vdos': self._vdos}
+        self._tasks, self._vdos = {}, {}
+        self._lock.release()
+        if len(observations['tasks']) > 0:
+            history.record(observations)
+
+
+run_history = RunHistory()
@@ -0,0 +1,136 @@
+"""
+`madats.management.locality_manager`
+====================================
+
+.. currentmodule:: madats.management.locality_manager
+
+:platform: Unix, Mac
+:synopsis: Module that places data on node-local storage tiers and runs its tasks on the nodes that hold it
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import os
+from madats.core import storage
+from madats.core.vds import DataTask
+from madats.core.scheduler import Scheduler
+from madats.utils.constants import TaskType
+from madats.management import placement
+
+"""
+the node-local tier used by the node-local policy: the fastest one
+- returns the node tiers of the tier, i.e., a dictionary {storage_id: node}
+"""
+def node_tiers(tier=None):
+    tiers = storage.get_node_tiers(tier)
+    names = sorted(set([storage.get_storage_tiers()[t]['tier'] for t in tiers]))
+    if tier is None and len(names) > 1:
+        tier = max(names, key=lambda name: max([placement.bandwidth(t) for t in storage.get_node_tiers(name)]))
+        tiers = storage.get_node_tiers(tier)
+    return tiers
+
+
+"""
+the inputs that can be staged in to a node-local tier: VDOs that are not produced by
+the workflow, that are only read by compute tasks, and that are on a slower tier
+"""
+def stage_in_candidates(vds, tier_bandwidth):
+    vdos = []
+    for vdo in vds.vdos:
+        if vdo.non_movable or len(vdo.producers) > 0 or len(vdo.consumers) == 0:
+            continue
+        if storage.is_node_local(vdo.storage_id) or placement.bandwidth(vdo.storage_id) >= tier_bandwidth:
+            continue
+        if all([t.type == TaskType.COMPUTE for t in vdo.consumers]):
+            vdos.append(vdo)
+    return vdos
+
+
+"""
+groups of inputs that must be on the same node, because some task reads all of them
+"""
+def input_groups(vdos):
+    parent = dict((vdo, vdo) for vdo in vdos)
+
+    def find(vdo):
+        while parent[vdo] is not vdo:
+            parent[vdo] = parent[parent[vdo]]
+            vdo = parent[vdo]
+        return vdo
+
+    readers = {}
+    for vdo in vdos:
+        for task in vdo.consumers:
+            if task in readers:
+                parent[find(vdo)] = find(readers[task])
+            else:
+                readers[task] = vdo
+
+    groups = []
+    roots = {}
+    for vdo in vdos:
+        root = find(vdo)
+        if root not in roots:
+            roots[root] = len(groups)
+            groups.append([])
+        groups[roots[root]].append(vdo)
+    return groups
+
+
+"""
+places the inputs of a workflow on the nodes of a node-local tier: the groups of
+inputs read by the same tasks are placed together, from the largest group to the
+smallest, on the node with the fewest bytes placed that has the capacity for them
+- returns the node tier of every VDO to stage in ({vdo: storage_id})
+"""
+def plan_node_local(vds, tier=None):
+    tiers = node_tiers(tier)
+    if len(tiers) == 0:
+        print('No node-local storage tiers configured')
+        return {}
+    tier_bandwidth = min([placement.bandwidth(t) for t in tiers])
+    load = dict((t, 0) for t in tiers)
+    groups = []
+    for group in input_groups(stage_in_candidates(vds, tier_bandwidth)):
+        groups.append((sum([placement.estimate_size(vdo) for vdo in group]), group))
+    groups.sort(key=lambda g: -g[0])
+
+    assignment = {}
+    for size, group in groups:
+        fits = [t for t in sorted(load) if storage.get_capacity(t) is None or load[t] + size <= storage.get_capacity(t)]
+        if len(fits) == 0:
+            print('No node has the capacity for {} ({} bytes)'.format(', '.join([v.abspath for v in group]), size))
+            continue
+        node_tier = min(fits, key=lambda t: load[t])
+        load[node_tier] += size
+        for vdo in group:
+            assignment[vdo] = node_tier
+    for node_tier in sorted(load):
+        print('Node {}: {} bytes staged in to {}'.format(tiers[node_tier], load[node_tier], node_tier))
+    return assignment
+
+
+"""
+runs the tasks that use a copy on a node-local tier on the node of the copy: its
+readers, and the data tasks that create its directory, move it and remove it, which are submitted to the
+scheduler of the readers when they have one
+"""
+def pin(vds, vdo):
+    node = storage.get_node(vdo.storage_id)
+    readers = [t for t in vdo.consumers if t.type == TaskType.COMPUTE]
+    for task in readers:
+        task.node = node
+    data_tasks = [t for t in vdo.producers if isinstance(t, DataTask)]
+    vdo_dir = vds.datapaths.get(os.path.dirname(vdo.abspath), None)
+    if vdo_dir is not None:
+        data_tasks += [t for t in vdo_dir.producers if isinstance(t, DataTask)]
+    vdo_deleted = vds.datapaths.get(vdo.abspath + '.deleted', None)
+    if vdo_deleted is not None:
+        data_tasks += [t for t in vdo_deleted.consumers if isinstance(t, DataTask)]
+    scheduled = [t for t in readers if t.scheduler != Scheduler.NONE]
+    for task in data_tasks:
+        task.node = node
+        if len(scheduled) > 0 and task.scheduler == Scheduler.NONE:
+            task.scheduler = scheduled[0].scheduler
+            task.scheduler_opts = scheduled[0].scheduler_opts
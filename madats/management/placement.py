@@ -0,0 +1,660 @@
+"""
+`madats.management.placement`
+====================================
+
+.. currentmodule:: madats.management.placement
+
+:platform: Unix, Mac
+:synopsis: Module that places virtual data objects on storage tiers by estimating the I/O time saved
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import os
+from madats.core import storage, backends
+from madats.utils import dagman
+from madats.utils.config import property_config
+from madats.management import history_manager
+try:
+    import pulp
+except ImportError:
+    pulp = None
+
+MB = 1024 * 1024
+GREEDY = 'greedy'
+ILP = 'ilp'
+# directory VDOs are placed as a whole, or split into groups of files by size class
+SPLIT_NONE = 'none'
+SPLIT_SIZE = 'size'
+SIZE_CLASSES = [MB, 1024 * MB]
+# placements on the critical path whose makespan is computed at every step of the
+# critical-path policy, from the ones that save the most I/O time on the path
+PATH_CANDIDATES = 4
+
+class Placement(object):
+    """
+    A candidate placement of a VDO on a storage tier:
+    - value: estimated I/O time (seconds) saved by using the tier instead of the
+      original location of the VDO, minus the data movement time that is not
+      overlapped with computation
+    - size: estimated bytes the VDO occupies on the tier
+    - start, end: workflow levels during which the VDO occupies the tier
+    - route: intermediate tiers the data is moved through, in the order it moves
+    - group: the group of files of a directory VDO that is placed, or None if the
+      whole VDO is placed
+    """
+
+    def __init__(self, vdo, tier, value, size, start, end, route=None, group=None):
+        self._vdo = vdo
+        self._tier = tier
+        self._value = value
+        self._size = size
+        self._start = start
+        self._end = end
+        self._route = route if route is not None else []
+        self._group = group
+
+    @property
+    def vdo(self):
+        return self._vdo
+
+    @property
+    def tier(self):
+        return self._tier
+
+    @property
+    def value(self):
+        return self._value
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def start(self):
+        return self._start
+
+    @property
+    def end(self):
+        return self._end
+
+    @property
+    def route(self):
+        return self._route
+
+    @property
+    def group(self):
+        return self._group
+
+    @property
+    def density(self):
+        return self._value / max(self._size, 1)
+
+
+class FileGroup(object):
+    """
+    A group of the files of a directory VDO (paths relative to the directory) that is
+    placed as one unit; `total` is the number of groups the directory is split into
+    """
+
+    def __init__(self, files, size, total):
+        self._files = files
+        self._size = size
+        self._total = total
+
+    @property
+    def files(self):
+        return self._files
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def total(self):
+        return self._total
+
+
+class CapacityProfile(object):
+    """
+    Space used on each storage tier at every level of the workflow, bounded by the
+    tier capacities; a tier without a configured capacity is unbounded
+    """
+
+    def __init__(self, tiers, num_levels):
+        self._capacity = {}
+        self._usage = {}
+        for tier in tiers:
+            self._capacity[tier] = storage.get_capacity(tier)
+            self._usage[tier] = [0] * num_levels
+
+    @property
+    def usage(self):
+        return self._usage
+
+    def capacity(self, tier):
+        return self._capacity.get(tier, None)
+
+    def fits(self, tier, size, start, end):
+        capacity = self._capacity.get(tier, None)
+        if capacity is None:
+            return True
+        usage = self._usage[tier]
+        return all([usage[level] + size <= capacity for level in range(start, end + 1)])
+
+    def reserve(self, tier, size, start, end):
+        usage = self._usage.setdefault(tier, [])
+        for level in range(start, end + 1):
+            usage[level] += size
+
+    def release(self, tier, size, start, end):
+        usage = self._usage[tier]
+        for level in range(start, end + 1):
+            usage[level] -= size
+
+
+"""
+bandwidth of a storage tier in MB/s, or 0 if it is unknown
+"""
+def bandwidth(tier):
+    return float(storage.get_storage_tiers().get(tier, {}).get('bandwidth', 0))
+
+
+"""
+estimated size of a VDO: its current size, or for data that does not exist yet, the
+size observed by the previous runs, or else the size of the data it is copied from, or
+of the largest input of the tasks producing it
+"""
+def estimate_size(vdo, visited=None):
+    if vdo.size > 0:
+        return vdo.size
+    predicted = history_manager.run_history.predict_size(vdo)
+    if predicted is not None:
+        return predicted
+    if visited is None:
+        visited = set()
+    visited.add(vdo)
+    if vdo.copy_from is not None and vdo.copy_from not in visited:
+        size = estimate_size(vdo.copy_from, visited)
+        if size > 0:
+            return size
+    size = 0
+    for task in vdo.producers:
+        for param in task.params:
+            if hasattr(param, 'size') and param not in visited:
+                size = max(size, estimate_size(param, visited))
+    return size
+
+
+"""
+splits the files of a directory into groups of files of the same size class (see
+SIZE_CLASSES), of at most `group_size` bytes each, unless a single file is larger
+"""
+def split_directory(path, group_size):
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            filepath = os.path.join(root, name)
+            if not os.path.islink(filepath):
+                files.append((os.path.relpath(filepath, path), os.path.getsize(filepath)))
+    size_class = lambda size: len([limit for limit in SIZE_CLASSES if size >= limit])
+    files.sort(key=lambda f: (size_class(f[1]), f[0]))
+
+    groups = []
+    for name, size in files:
+        if len(groups) == 0 or groups[-1][0] != size_class(size) or groups[-1][2] + size > group_size:
+            groups.append([size_class(size), [], 0])
+        groups[-1][1].append(name)
+        groups[-1][2] += size
+    return [FileGroup(names, size, len(groups)) for _, names, size in groups]
+
+
+"""
+workflow levels during which a VDO is used: from its first producer (or consumer,
+for inputs) to its last consumer (or producer, for outputs)
+- if the data is not cleaned up, it occupies the tier until the workflow ends
+"""
+def lifetime(vdo, levels, auto_cleanup=True):
+    used = [levels[t] for t in vdo.producers + vdo.consumers if t in levels]
+    if len(used) == 0:
+        return None
+    num_levels = max(levels.values()) + 1 if len(levels) > 0 else 1
+    end = max(used) if auto_cleanup else num_levels - 1
+    return (min(used), end)
+
+
+"""
+estimated time in seconds to move data directly from one tier to another: the
+estimate of the transfer backend, bounded by the rate limits (MB/s) of the tiers and
+of the link between them
+"""
+def hop_time(size, src_id, dest_id):
+    backend = backends.get_backend(backends.get_interface(src_id), backends.get_interface(dest_id))
+    seconds = backend.estimate(size, src_id, dest_id)
+    for max_streams, max_rate in storage.get_transfer_limits(src_id, dest_id).values():
+        if max_rate is not None and float(max_rate) > 0:
+            seconds = max(seconds, backend.latency + (float(size) / MB) / float(max_rate))
+    return seconds
+
+
+"""
+cheapest way to move data from one tier to another, directly or through other
+POSIX tiers (e.g., archive->scratch->burst when the archive link to the burst buffer
+is slow)
+- the intermediate copies are not reserved in the capacity of their tiers, so tiers with
+  a capacity are not used as intermediate tiers
+- returns the intermediate tiers, in the order the data moves, and the estimated time
+"""
+def route(size, src_id, dest_id):
+    tiers = [t for t in storage.get_storage_tiers() if not storage.is_archive(t) and not storage.is_node_local(t)
+             and storage.get_capacity(t) is None]
+    nodes = set(tiers + [src_id, dest_id])
+    seconds = dict((t, float('inf')) for t in nodes)
+    previous = {}
+    seconds[src_id] = 0.0
+    remaining = set(nodes)
+    while len(remaining) > 0:
+        tier = min(remaining, key=lambda t: seconds[t])
+        remaining.remove(tier)
+        if tier == dest_id or seconds[tier] == float('inf'):
+            break
+        for next_tier in remaining:
+            arrival = seconds[tier] + hop_time(size, tier, next_tier)
+            if arrival < seconds[next_tier]:
+                seconds[next_tier] = arrival
+                previous[next_tier] = tier
+    hops = []
+    tier = previous.get(dest_id, src_id)
+    while tier != src_id:
+        hops.insert(0, tier)
+        tier = previous[tier]
+    return (hops, seconds[dest_id])
+
+
+"""
+estimated I/O time saved by placing a VDO on a tier
+- every producer and consumer accesses the data once
+- staging data in or out costs the time of its cheapest route, unless it overlaps with
+  the computation: an input whose consumers all wait for other tasks, or an output
+  whose producers have successors
+- returns the value and the route of the data movement
+"""
+def placement_value(vdo, tier, size):
+    orig_bandwidth = bandwidth(vdo.storage_id)
+    tier_bandwidth = bandwidth(tier)
+    accesses = len(vdo.producers) + len(vdo.consumers)
+    io_saved = accesses * (float(size) / MB) * (1.0 / orig_bandwidth - 1.0 / tier_bandwidth)
+
+    movement = 0
+    hops = []
+    if len(vdo.producers) == 0:
+        hops, seconds = route(size, vdo.storage_id, tier)
+        overlapped = all([len(t.predecessors) > 0 for t in vdo.consumers])
+        if not overlapped:
+            movement = seconds
+    elif len(vdo.consumers) == 0 or vdo.persist:
+        hops, seconds = route(size, tier, vdo.storage_id)
+        overlapped = any([len(t.successors) > 0 for t in vdo.producers])
+        if not overlapped:
+            movement = seconds
+    return (io_saved - movement, hops)
+
+
+"""
+check if the files of a VDO can be placed separately on a tier: an input directory
+that is moved by the native data mover
+"""
+def splittable(vdo, tier):
+    if len(vdo.producers) > 0 or not os.path.isdir(vdo.abspath):
+        return False
+    return backends.get_backend(backends.get_interface(vdo.storage_id), backends.get_interface(tier)).native
+
+
+"""
+candidate placements of the VDOs on every POSIX tier that is faster than their
+original location, with a positive value
+- data on the archive is a candidate as well, when the archive bandwidth is known
+- with `split`, the groups of files of an input directory are candidates instead of
+  the whole directory, and they are moved directly to the tier
+"""
+def candidates(vds, levels, split=SPLIT_NONE, group_size=None):
+    tiers = storage.get_storage_tiers()
+    # the node-local tiers are used by the node-local policy only
+    fast_tiers = [t for t in tiers if not storage.is_archive(t) and not storage.is_node_local(t) and bandwidth(t) > 0]
+    placements = []
+    for vdo in vds.vdos:
+        if vdo.non_movable or bandwidth(vdo.storage_id) <= 0:
+            continue
+        interval = lifetime(vdo, levels, vds.auto_cleanup)
+        if interval is None:
+            continue
+        size = estimate_size(vdo)
+        groups = None
+        for tier in fast_tiers:
+            if tier == vdo.storage_id or bandwidth(tier) <= bandwidth(vdo.storage_id):
+                continue
+            if split != SPLIT_NONE and splittable(vdo, tier):
+                if groups is None:
+                    groups = split_directory(vdo.abspath, group_size)
+                for group in groups:
+                    value, hops = placement_value(vdo, tier, group.size)
+                    if value > 0 and len(hops) == 0:
+                        placements.append(Placement(vdo, tier, value, group.size, interval[0],
+                                                    interval[1], group=group))
+                continue
+            value, hops = placement_value(vdo, tier, size)
+            if value > 0:
+                placements.append(Placement(vdo, tier, value, size, interval[0], interval[1], hops))
+    return placements
+
+
+"""
+greedy knapsack: takes the placements by decreasing value per byte, as long as
+the VDO (or group of files) is not placed yet and fits in the capacity profile of
+the tier; the groups of files of a directory are all placed on the same tier
+"""
+def greedy_placement(placements, profile):
+    placed = {}
+    tiers = {}
+    for placement in sorted(placements, key=lambda p: (-p.density, -p.value)):
+        key = (placement.vdo, placement.group)
+        if key in placed or tiers.get(placement.vdo, placement.tier) != placement.tier:
+            continue
+        if profile.fits(placement.tier, placement.size, placement.start, placement.end):
+            profile.reserve(placement.tier, placement.size, placement.start, placement.end)
+            placed[key] = placement
+            tiers[placement.vdo] = placement.tier
+    return [p for p in placements if placed.get((p.vdo, p.group), None) is p]
+
+
+"""
+integer linear program maximizing the value of the placements, with at most one
+placement per VDO (or group of files), within the capacity of each tier at every level;
+the groups of files of a directory are all placed on the same tier
+"""
+def ilp_placement(placements, profile, num_levels):
+    problem = pulp.LpProblem('placement', pulp.LpMaximize)
+    x = [pulp.LpVariable('x{}'.format(i), cat='Binary') for i in range(len(placements))]
+    problem += pulp.lpSum([p.value * x[i] for i, p in enumerate(placements)])
+    keys = {}
+    directories = {}
+    for i, p in enumerate(placements):
+        keys.setdefault((p.vdo, p.group), []).append(i)
+        if p.group is not None:
+            directories.setdefault(p.vdo, {}).setdefault(p.tier, []).append(i)
+    for indices in keys.values():
+        problem += pulp.lpSum([x[i] for i in indices]) <= 1
+    for d, tiers in enumerate(directories.values()):
+        y = dict((tier, pulp.LpVariable('y{}_{}'.format(d, tier), cat='Binary')) for tier in tiers)
+        problem += pulp.lpSum(list(y.values())) <= 1
+        for tier, indices in tiers.items():
+            for i in indices:
+                problem += x[i] <= y[tier]
+    for tier in set([p.tier for p in placements]):
+        capacity = profile.capacity(tier)
+        if capacity is None:
+            continue
+        for level in range(num_levels):
+            used = [i for i, p in enumerate(placements) if p.tier == tier and p.start <= level <= p.end]
+            if len(used) > 0:
+                problem += pulp.lpSum([placements[i].size * x[i] for i in used]) <= capacity
+    problem.solve(pulp.PULP_CBC_CMD(msg=0))
+    chosen = [p for i, p in enumerate(placements) if x[i].value() is not None and x[i].value() > 0.5]
+    for p in chosen:
+        profile.reserve(p.tier, p.size, p.start, p.end)
+    return chosen
+
+
+"""
+plans the placement of the VDOs of a VDS on the storage tiers, maximizing the
+estimated I/O time saved within the tier capacities over time
+- with `split`, input directories can be partially placed, by groups of files of at
+  most `group_size` bytes ([placement] section of the configuration by default)
+- returns the list of chosen placements
+"""
+def plan_capacity_aware(vds, solver=None, split=None, group_size=None):
+    if solver is None:
+        solver = property_config.PLACEMENT_SOLVER
+    if split is None:
+        split = property_config.PLACEMENT_SPLIT
+    if group_size is None:
+        group_size = storage.parse_size(property_config.PLACEMENT_GROUP_SIZE)
+    dag = vds.get_task_dag()
+    levels = dagman.task_levels(dag)
+    num_levels = max(levels.values()) + 1 if len(levels) > 0 else 1
+    placements = candidates(vds, levels, split, group_size)
+    profile = CapacityProfile(storage.get_storage_tiers().keys(), num_levels)
+    if solver == ILP and pulp is None:
+        print('PuLP is not installed, using the greedy placement')
+        solver = GREEDY
+    if solver == ILP:
+        chosen = ilp_placement(placements, profile, num_levels)
+    else:
+        chosen = greedy_placement(placements, profile)
+    for p in chosen:
+        via = ' via {}'.format('->'.join(p.route)) if len(p.route) > 0 else ''
+        files = ' ({} files)'.format(len(p.group.files)) if p.group is not None else ''
+        print('Placing {}{} on {}{}: {:.3f}s I/O time saved'.format(p.vdo.abspath, files, p.tier, via, p.value))
+    return chosen
+
+
+"""
+compute time of a task in seconds: its expected runtime, or the runtime observed by the
+previous runs; a task that never ran without an expected runtime only does I/O
+"""
+def compute_time(task):
+    if task.runtime is None or task.runtime < 0:
+        runtime = history_manager.run_history.predict_runtime(task)
+        return float(runtime) if runtime is not None else 0.0
+    return float(task.runtime)
+
+
+"""
+estimated time in seconds to read or write a VDO once on a tier
+"""
+def io_time(size, tier):
+    tier_bandwidth = bandwidth(tier)
+    if tier_bandwidth <= 0:
+        return 0.0
+    return (float(size) / MB) / tier_bandwidth
+
+
+class CriticalPath(object):
+    """
+    Earliest finish times of the tasks of a workflow DAG, for a placement of its VDOs:
+    - a task takes its runtime plus the time to read and write its VDOs on their tiers
+    - a staged-in VDO is moved when the workflow starts, and its consumers wait for it
+    - a staged-out VDO is moved after its producers, and the workflow ends after it
+    - the critical path is the chain of tasks (and data movements) that determines
+      the makespan of the workflow
+    The predecessors of the tasks (`dagman.predecessor_map`), the tasks in level order
+    and the durations of the tasks whose VDOs keep their tiers can be passed, so that
+    the critical paths of the same DAG for different placements share them.
+    """
+
+    def __init__(self, dag, vdos, sizes, assignment, predecessors=None, order=None, durations=None):
+        self._dag = dag
+        if predecessors is None:
+            predecessors = dagman.predecessor_map(dag)
+        self._predecessors = predecessors
+        if order is None:
+            order = task_order(dag)
+        self._order = order
+        self._durations = durations if durations is not None else {}
+        self._vdos = vdos
+        self._sizes = sizes
+        self._assignment = assignment
+        self._finish = {}
+        self._parent = {}
+        self._makespan = 0.0
+        self._last = None
+        self._compute()
+
+    @property
+    def makespan(self):
+        return self._makespan
+
+    @property
+    def finish(self):
+        return self._finish
+
+    """
+    tasks on the critical path, from the first to the last
+    """
+    @property
+    def tasks(self):
+        path = []
+        task = self._last
+        while task is not None:
+            path.insert(0, task)
+            task = self._parent.get(task, None)
+        return path
+
+    """
+    time a task takes once it starts: its runtime and the I/O on its VDOs
+    """
+    def duration(self, task):
+        if task in self._durations:
+            return self._durations[task]
+        duration = compute_time(task)
+        for vdo in self._vdos.get(task, []):
+            duration += io_time(self._sizes[vdo], self._tier(vdo))
+        self._durations[task] = duration
+        return duration
+
+    def _tier(self, vdo):
+        return self._assignment.get(vdo, vdo.storage_id)
+
+    def _movement(self, vdo):
+        tier = self._tier(vdo)
+        if tier == vdo.storage_id:
+            return 0.0
+        if len(vdo.producers) == 0:
+            src_id, dest_id = vdo.storage_id, tier
+        else:
+            src_id, dest_id = tier, vdo.storage_id
+        backend = backends.get_backend(backends.get_interface(src_id), backends.get_interface(dest_id))
+        return backend.estimate(self._sizes[vdo], src_id, dest_id)
+
+    def _compute(self):
+        for task in self._order:
+            start = 0.0
+            parent = None
+            for vdo in self._vdos.get(task, []):
+                if task in vdo.consumers and len(vdo.producers) == 0:
+                    start = max(start, self._movement(vdo))
+            for pred in self._predecessors.get(task, []):
+                if self._finish.get(pred, 0.0) > start:
+                    start = self._finish[pred]
+                    parent = pred
+            self._finish[task] = start + self.duration(task)
+            self._parent[task] = parent
+
+            end = self._finish[task]
+            for vdo in self._vdos.get(task, []):
+                if task in vdo.producers and (len(vdo.consumers) == 0 or vdo.persist):
+                    end = max(end, self._finish[task] + self._movement(vdo))
+            if self._last is None or end > self._makespan:
+                self._makespan = end
+                self._last = task
+
+
+"""
+tasks of a DAG in the order of their levels
+"""
+def task_order(dag):
+    levels = dagman.task_levels(dag)
+    return sorted(levels, key=lambda t: levels[t])
+
+
+"""
+plans the placement of the VDOs of a VDS by following the critical path of its DAG
+- the VDOs read or written by the critical-path tasks get the fastest tier that fits,
+  as long as it shortens the workflow; the critical path is recomputed after each
+  placement, since a shorter path may no longer be critical
+- at every step, the makespan is only computed for the PATH_CANDIDATES placements
+  that save the most I/O time on the tasks of the critical path, so that the cost of
+  a step grows with the size of the DAG, not with the square of it
+- returns the list of chosen placements, with the makespan reduction as their value
+"""
+def plan_critical_path(vds):
+    dag = vds.get_task_dag()
+    levels = dagman.task_levels(dag)
+    num_levels = max(levels.values()) + 1 if len(levels) > 0 else 1
+    tiers = storage.get_storage_tiers()
+    fast_tiers = sorted([t for t in tiers if not storage.is_archive(t) and not storage.is_node_local(t) and bandwidth(t) > 0],
+                        key=lambda t: -bandwidth(t))
+    profile = CapacityProfile(tiers.keys(), num_levels)
+
+    vdos = {}
+    sizes = {}
+    intervals = {}
+    for vdo in vds.vdos:
+        for task in vdo.producers + vdo.consumers:
+            if vdo not in vdos.setdefault(task, []):
+                vdos[task].append(vdo)
+        sizes[vdo] = estimate_size(vdo)
+        intervals[vdo] = lifetime(vdo, levels, vds.auto_cleanup)
+
+    assignment = {}
+    chosen = []
+    predecessors = dagman.predecessor_map(dag)
+    order = sorted(levels, key=lambda t: levels[t])
+    # durations of the tasks for the chosen placements; a candidate placement only
+    # changes the durations of the tasks of its VDO
+    durations = {}
+
+    def critical_path(vdo=None):
+        if vdo is None:
+            return CriticalPath(dag, vdos, sizes, assignment, predecessors, order, durations)
+        trial = durations.copy()
+        for task in vdo.producers + vdo.consumers:
+            trial.pop(task, None)
+        return CriticalPath(dag, vdos, sizes, assignment, predecessors, order, trial)
+
+    path = critical_path()
+    while True:
+        # the fastest tier that fits every VDO of the path, with the I/O time it saves on the path
+        candidates = {}
+        for task in path.tasks:
+            for vdo in vdos.get(task, []):
+                if vdo in candidates:
+                    candidates[vdo][0] += io_time(sizes[vdo], vdo.storage_id) - io_time(sizes[vdo], candidates[vdo][1])
+                    continue
+                if vdo in assignment or vdo.non_movable or storage.is_archive(vdo.storage_id):
+                    continue
+                if intervals[vdo] is None or bandwidth(vdo.storage_id) <= 0:
+                    continue
+                start, end = intervals[vdo]
+                for tier in fast_tiers:
+                    if bandwidth(tier) <= bandwidth(vdo.storage_id):
+                        break
+                    if not profile.fits(tier, sizes[vdo], start, end):
+                        continue
+                    candidates[vdo] = [io_time(sizes[vdo], vdo.storage_id) - io_time(sizes[vdo], tier), tier]
+                    break
+
+        best = None
+        ranked = sorted(candidates.items(), key=lambda c: -c[1][0])
+        for vdo, (_, tier) in ranked[:PATH_CANDIDATES]:
+            assignment[vdo] = tier
+            makespan = critical_path(vdo).makespan
+            del assignment[vdo]
+            if makespan < path.makespan and (best is None or makespan < best[2]):
+                best = (vdo, tier, makespan)
+        if best is None:
+            break
+        vdo, tier, makespan = best
+        start, end = intervals[vdo]
+        profile.reserve(tier, sizes[vdo], start, end)
+        assignment[vdo] = tier
+        chosen.append(Placement(vdo, tier, path.makespan - makespan, sizes[vdo], start, end))
+        for task in vdo.producers + vdo.consumers:
+            durations.pop(task, None)
+        path = critical_path()
+
+    for p in chosen:
+        print('Placing {} on {}: {:.3f}s shorter critical path'.format(p.vdo.abspath, p.tier, p.value))
+    print('Estimated makespan: {:.3f}s'.format(path.makespan))
+    return chosen
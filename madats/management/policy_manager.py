@@ -0,0 +1,249 @@
+"""
+`madats.management.policy_manager`
+====================================
+
+.. currentmodule:: madats.management.policy_manager
+
+:platform: Unix, Mac
+:synopsis: Module that registers the data management policies, including the policies of site plugins
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import copy
+import inspect
+from madats.core import storage
+from madats.utils import dagman
+from madats.utils.constants import Policy
+from madats.management import data_manager, placement, locality_manager
+
+# packages provide policies as entry points of this group, named after the policy
+ENTRY_POINT_GROUP = 'madats.policies'
+
+class PolicyContext(object):
+    """
+    What a data management policy can read about a workflow, taken before the policy
+    changes its VDS:
+    - the storage tiers (a copy of their configuration), the fast tier selected for the
+      workflow, and the bandwidth (MB/s) and capacity (bytes) of every tier
+    - the estimated size of every VDO and the estimated runtime of every task
+    - the task DAG, the level of every task and the critical path of the workflow with
+      its data where it is
+    """
+
+    def __init__(self, vds):
+        self._vds = vds
+        self._vdos = [v for v in vds.vdos]
+        self._dag = vds.get_task_dag()
+        self._levels = None
+        self._sizes = {}
+        self._critical_path = None
+
+    @property
+    def tiers(self):
+        return copy.deepcopy(storage.get_storage_tiers())
+
+    @property
+    def selected_tier(self):
+        return storage.get_selected_storage()
+
+    def bandwidth(self, tier):
+        return placement.bandwidth(tier)
+
+    def capacity(self, tier):
+        return storage.get_capacity(tier)
+
+    @property
+    def vdos(self):
+        return [v for v in self._vdos]
+
+    def size(self, vdo):
+        if vdo not in self._sizes:
+            self._sizes[vdo] = placement.estimate_size(vdo)
+        return self._sizes[vdo]
+
+    def runtime(self, task):
+        return placement.compute_time(task)
+
+    @property
+    def dag(self):
+        return dict((task, list(succ)) for task, succ in self._dag.items())
+
+    def predecessors(self, task):
+        return dagman.predecessors(self._dag, task)
+
+    def successors(self, task):
+        return dagman.successors(self._dag, task)
+
+    @property
+    def levels(self):
+        if self._levels is None:
+            self._levels = dagman.task_levels(self._dag)
+        return dict(self._levels)
+
+    '''
+    the critical path of the workflow (a `placement.CriticalPath`), with its tasks,
+    their earliest finish times and the makespan
+    '''
+    @property
+    def critical_path(self):
+        if self._critical_path is None:
+            vdos = {}
+            for vdo in self._vdos:
+                for task in vdo.producers + vdo.consumers:
+                    if vdo not in vdos.setdefault(task, []):
+                        vdos[task].append(vdo)
+            sizes = dict((vdo, self.size(vdo)) for vdo in self._vdos)
+            self._critical_path = placement.CriticalPath(self._dag, vdos, sizes, {})
+        return self._critical_path
+
+
+class DataManagementPolicy(object):
+    """
+    Interface of a data management policy, that decides which VDOs of a workflow are
+    moved to which storage tiers:
+    - `manage` copies VDOs of the VDS to the tiers (e.g., with `vds.copy(vdo, tier)`),
+      which creates the data tasks; by default no data is moved
+    - `placement` returns the tier of every VDO it would move ({vdo: tier}) without
+      changing the VDS, so that the policy can be simulated; a policy that cannot tell
+      returns None
+    """
+
+    def manage(self, vds, context):
+        pass
+
+    def placement(self, vds, context):
+        return None
+
+
+class FunctionPolicy(DataManagementPolicy):
+    """
+    A data management policy made of functions: `manage(vds, context)` and, optionally,
+    `placement(vds, context)`
+    """
+
+    def __init__(self, manage, placement=None):
+        self._manage = manage
+        self._placement = placement
+
+    def manage(self, vds, context):
+        self._manage(vds, context)
+
+    def placement(self, vds, context):
+        if self._placement is None:
+            return None
+        return self._placement(vds, context)
+
+
+__policies__ = {}
+__discovered__ = []
+
+"""
+registers a data management policy under a name, which can then be used as the
+strategy of a VDS and on the command line; a registered name is replaced
+- `policy` is a DataManagementPolicy, a subclass of it, or a function `manage(vds, context)`
+- returns the policy type
+"""
+def register(name, policy, placement=None):
+    if inspect.isclass(policy):
+        policy = policy()
+    elif not isinstance(policy, DataManagementPolicy):
+        policy = FunctionPolicy(policy, placement)
+    policy_type = Policy.register(name)
+    __policies__[policy_type] = policy
+    return policy_type
+
+
+def unregister(name):
+    __policies__.pop(Policy.policy_type.get(name, None), None)
+
+
+"""
+registers the policies that installed packages provide as entry points of the
+`madats.policies` group, the first time the policies are looked up
+"""
+def discover():
+    if len(__discovered__) > 0:
+        return
+    __discovered__.append(True)
+    for entry_point in __entry_points__():
+        try:
+            register(entry_point.name, entry_point.load())
+        except Exception as e:
+            print("Failed to load data management policy {}: {}".format(entry_point.name, e))
+
+
+def __entry_points__():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        try:
+            from pkg_resources import iter_entry_points
+        except ImportError:
+            return []
+        return list(iter_entry_points(ENTRY_POINT_GROUP))
+    entry_points = entry_points()
+    if hasattr(entry_points, 'select'):
+        return list(entry_points.select(group=ENTRY_POINT_GROUP))
+    return list(entry_points.get(ENTRY_POINT_GROUP, []))
+
+
+"""
+the registered policy of a policy type or name
+- raises ValueError for a policy that is not registered
+"""
+def get(policy):
+    discover()
+    policy_type = policy
+    if not isinstance(policy_type, int):
+        policy_type = Policy.policy_type.get(policy, None)
+    if policy_type not in __policies__:
+        raise ValueError("Unknown data management policy: {}".format(Policy.name(policy_type) or policy))
+    return __policies__[policy_type]
+
+
+"""
+names of the registered policies
+"""
+def names():
+    discover()
+    return [Policy.name(p) for p in sorted(__policies__)]
+
+
+"""
+manages the data of a VDS with a registered policy
+"""
+def apply(vds, policy):
+    get(policy).manage(vds, PolicyContext(vds))
+
+
+"""
+the tier of every VDO that a registered policy moves, without changing the VDS; a
+policy that cannot tell is simulated as if it moved nothing
+"""
+def placement_of(vds, policy):
+    tiers = get(policy).placement(vds, PolicyContext(vds))
+    if tiers is None:
+        print("Policy {} cannot be simulated: no data is moved".format(Policy.name(policy)))
+        return {}
+    return tiers
+
+
+def __capacity_placement__(vds, context):
+    return dict((p.vdo, p.tier) for p in placement.plan_capacity_aware(vds))
+
+
+def __critical_path_placement__(vds, context):
+    return dict((p.vdo, p.tier) for p in placement.plan_critical_path(vds))
+
+
+register('none', lambda vds, context: None, lambda vds, context: {})
+register('wfa', lambda vds, context: data_manager.dm_workflow_aware(vds),
+         lambda vds, context: dict((vdo, context.selected_tier) for vdo in data_manager.workflow_aware_vdos(vds)))
+register('sta', lambda vds, context: data_manager.dm_storage_aware(vds),
+         lambda vds, context: dict((vdo, context.selected_tier) for vdo in context.vdos))
+register('cap', lambda vds, context: data_manager.dm_capacity_aware(vds), __capacity_placement__)
+register('cpa', lambda vds, context: data_manager.dm_critical_path(vds), __critical_path_placement__)
+register('nla', lambda vds, context: data_manager.dm_node_local(vds),
+         lambda vds, context: locality_manager.plan_node_local(vds))
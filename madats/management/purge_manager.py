@@ -0,0 +1,237 @@
+"""
+`madats.management.purge_manager`
+====================================
+
+.. currentmodule:: madats.management.purge_manager
+
+:platform: Unix, Mac
+:synopsis: Module that purges the copies of data that outlived their persistence
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import os
+import shutil
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from madats.core import storage
+from madats.core.vds import DataTask, VirtualDataObject
+from madats.management import transfer_manager
+from madats.utils.config import property_config
+from madats.utils.constants import Persistence
+from madats.utils.store import JsonStore
+
+DELETE = 'delete'
+DEMOTE = 'demote'
+KEEP = 'keep'
+
+class PlacementIndex(object):
+    """
+    An on-disk index of the copies that data tasks leave on the storage tiers across
+    workflow runs: for every copy, its tier, size, creation time, lifetime (seconds)
+    and the data it is a copy of
+    - the copies are recorded in bulk at the end of a workflow run, and the copies
+      removed by cleanup tasks are dropped from the index
+    """
+
+    def __init__(self, name='placements'):
+        self._index = JsonStore(name)
+
+    @property
+    def index(self):
+        return self._index
+
+    def entries(self):
+        return self._index.load()
+
+    """
+    adds the copies in `placed` ({path: entry}) and drops the paths in `removed`
+    """
+    def update(self, placed, removed):
+        def _update(data):
+            data.update(placed)
+            for path in removed:
+                data.pop(path, None)
+        self._index.update(_update)
+
+    def remove(self, paths):
+        self.update({}, paths)
+
+
+class PlacementTracker(object):
+    """
+    Copies written and removed by the data tasks of a workflow run, that are written
+    to the placement index at once when the run ends
+    """
+
+    def __init__(self):
+        self._placed = {}
+        self._removed = set()
+        self._lock = threading.Lock()
+
+    """
+    records the copy that a finished data task leaves on a tier, or that a cleanup
+    task removed, and the intermediate copies that a finished compute task writes
+    straight to a tier, which no data task moves
+    """
+    def track(self, task):
+        if not isinstance(task, DataTask):
+            self._track_outputs(task)
+            return
+        if task.datatask_type == DataTask.BATCH:
+            for datatask in task.batch:
+                self.track(datatask)
+            return
+        self._lock.acquire()
+        try:
+            if task.datatask_type == DataTask.CLEANER:
+                self._placed.pop(task.src.abspath, None)
+                self._removed.add(task.src.abspath)
+            elif task.datatask_type == DataTask.MOVER and not task.cached:
+                vdo = task.src if transfer_manager.is_stage_out(task) else task.dest
+                if vdo.copy_from is not None and not storage.is_archive(vdo.storage_id) \
+                        and os.path.exists(vdo.abspath):
+                    self._placed[vdo.abspath] = placement_entry(vdo)
+                    self._removed.discard(vdo.abspath)
+        finally:
+            self._lock.release()
+
+    def _track_outputs(self, task):
+        for vdo in task.params:
+            if not isinstance(vdo, VirtualDataObject) or task not in vdo.producers:
+                continue
+            if any([isinstance(t, DataTask) for t in vdo.producers]):
+                continue
+            if vdo.copy_from is not None and not storage.is_archive(vdo.storage_id) \
+                    and os.path.exists(vdo.abspath):
+                self._lock.acquire()
+                self._placed[vdo.abspath] = placement_entry(vdo)
+                self._removed.discard(vdo.abspath)
+                self._lock.release()
+
+    """
+    writes the tracked copies to the placement index, and drops the fingerprints of
+    the removed copies, so that new data at their paths is not taken for them
+    """
+    def flush(self, index):
+        self._lock.acquire()
+        placed, removed = self._placed, self._removed
+        self._placed, self._removed = {}, set()
+        self._lock.release()
+        if len(placed) > 0 or len(removed) > 0:
+            index.update(placed, removed)
+        storage.remove_fingerprints(sorted(removed))
+
+
+"""
+lifetime of a copy in seconds: the persistence of the VDO, or of the data it is a copy
+of, or else the persistence of its storage tier (`persist` in the storage configuration)
+"""
+def lifetime(vdo):
+    for v in [vdo, vdo.copy_from]:
+        if v is not None and v.persistence != Persistence.NONE:
+            return v.persistence
+    persist = str(storage.get_storage_tiers().get(vdo.storage_id, {}).get('persist', 'None'))
+    return __tier_lifetimes__.get(persist.lower(), Persistence.NONE)
+
+
+__tier_lifetimes__ = {'shortterm': Persistence.SHORT_TERM, 'longterm': Persistence.LONG_TERM,
+                      'fixedterm': Persistence.FIXED_TERM}
+
+
+def placement_entry(vdo):
+    return {'tier': vdo.storage_id, 'size': transfer_manager.data_size(vdo.abspath),
+            'created': time.time(), 'lifetime': lifetime(vdo),
+            'origin': vdo.copy_from.abspath}
+
+
+"""
+what to do with an expired copy: a copy of data that still exists elsewhere is deleted,
+while the only copy of the data is demoted to where it came from (e.g., an output that
+was never staged out); the only copy is kept if it came from an archive
+"""
+def purge_action(entry):
+    origin = entry.get('origin', None)
+    if origin is None or os.path.exists(origin):
+        return DELETE
+    if storage.is_archive(storage.get_path_elements(origin)[0]):
+        return KEEP
+    return DEMOTE
+
+
+def _purge(path, action, origin):
+    try:
+        if action == DELETE:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            elif os.path.lexists(path):
+                os.remove(path)
+        elif action == DEMOTE:
+            directory = os.path.dirname(origin)
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            shutil.move(path, origin)
+        return True
+    except (IOError, OSError) as e:
+        print("Failed to {} {}: {}".format(action, path, e))
+        return False
+
+
+"""
+purges the copies in the placement index whose lifetime has expired
+- `tiers` restricts the purge to some storage tiers
+- copies are deleted, or demoted to where they came from, by `workers` threads
+- with `dry_run`, nothing is purged, and only the report is returned
+- returns the report: one dictionary per expired copy, with its path, tier, size,
+  expiry time and the action taken
+"""
+def purge(dry_run=False, tiers=None, workers=None, now=None, index=None):
+    if now is None:
+        now = time.time()
+    if workers is None:
+        workers = int(property_config.PURGE_WORKERS)
+    if index is None:
+        index = placement_index
+
+    report = []
+    gone = []
+    for path, entry in sorted(index.entries().items()):
+        if tiers is not None and entry['tier'] not in tiers:
+            continue
+        if not os.path.lexists(path):
+            gone.append(path)
+            continue
+        expires = entry['created'] + entry['lifetime']
+        if expires > now:
+            continue
+        report.append({'path': path, 'tier': entry['tier'], 'size': entry['size'],
+                       'expired': expires, 'action': purge_action(entry),
+                       'origin': entry.get('origin', None)})
+
+    for item in report:
+        print("{}{} {} ({} bytes on {}, expired {:.0f}s ago)".format(
+            '[dry-run] ' if dry_run else '', item['action'].capitalize(), item['path'],
+            item['size'], item['tier'], now - item['expired']))
+    if dry_run:
+        return report
+
+    purged = [item for item in report if item['action'] != KEEP]
+    if len(purged) > 0:
+        pool = ThreadPool(processes=max(1, min(workers, len(purged))))
+        results = pool.map(lambda item: _purge(item['path'], item['action'], item['origin']), purged)
+        pool.close()
+        for item, done in zip(purged, results):
+            if not done:
+                item['action'] = KEEP
+    done = [item for item in purged if item['action'] != KEEP]
+    index.remove(gone + [item['path'] for item in done])
+    # the fingerprints of the purged copies, and of the data a copy is demoted over
+    storage.remove_fingerprints(gone + [item['path'] for item in done] +
+                                [item['origin'] for item in done if item['action'] == DEMOTE])
+    print("Purged {} expired copies ({} bytes)".format(len(done), sum([item['size'] for item in done])))
+    return report
+
+
+placement_index = PlacementIndex()
@@ -0,0 +1,73 @@
+"""
+`madats.management.replication_manager`
+====================================
+
+.. currentmodule:: madats.management.replication_manager
+
+:platform: Unix, Mac
+:synopsis: Module that replicates the inputs read by many tasks to spread their reads
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+from madats.core import storage
+from madats.core.vds import DataTask
+from madats.utils.constants import TaskType
+from madats.utils.config import property_config
+
+"""
+number of copies of a VDO that its compute consumers read: its `replication`, or the
+`replication` of the data it is copied from, or else one copy for every `fanout`
+consumers
+"""
+def replicas(vdo, consumers, fanout):
+    replication = vdo.replication
+    if replication <= 0 and vdo.copy_from is not None:
+        replication = vdo.copy_from.replication
+    if replication <= 0:
+        replication = (len(consumers) + fanout - 1) // fanout
+    return max(1, min(int(replication), len(consumers)))
+
+
+"""
+check if a VDO is a staged copy: a copy that a data task moved to a tier that is not
+an archive, and that no compute task produces
+"""
+def is_staged_copy(vdo):
+    if storage.is_archive(vdo.storage_id):
+        return False
+    if any([not isinstance(t, DataTask) for t in vdo.producers]):
+        return False
+    return any([t.datatask_type == DataTask.MOVER and not t.replica and t.dest is vdo
+                for t in vdo.producers])
+
+
+"""
+replicates the staged copies of the inputs of a VDS that are read by many compute
+tasks, and spreads their consumers over the copy and its replicas in a round-robin order
+- inputs that were not moved are not replicated, so that no data is written next
+  to the original data or to an archive
+- the replicas are physical copies on the tier of the staged copy, so that the reads
+  are spread over the storage targets of the tier, and they are removed after their
+  last use
+- returns the replicas created for every VDO
+"""
+def plan_replicas(vds, fanout=None):
+    if fanout is None:
+        fanout = int(property_config.REPLICATION_FANOUT)
+    fanout = max(1, fanout)
+    replicated = {}
+    for vdo in [v for v in vds.vdos]:
+        if vdo.non_movable or not is_staged_copy(vdo):
+            continue
+        consumers = [t for t in vdo.consumers if t.type == TaskType.COMPUTE]
+        num_replicas = replicas(vdo, consumers, fanout)
+        if num_replicas <= 1:
+            continue
+        print('Replicating {} {} times for {} tasks'.format(vdo.abspath, num_replicas - 1, len(consumers)))
+        replicated[vdo] = []
+        for i in range(1, num_replicas):
+            readers = [t for j, t in enumerate(consumers) if j % num_replicas == i]
+            replicated[vdo].append(vds.replicate(vdo, readers, str(i)))
+    return replicated
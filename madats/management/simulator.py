@@ -0,0 +1,336 @@
+"""
+`madats.management.simulator`
+====================================
+
+.. currentmodule:: madats.management.simulator
+
+:platform: Unix, Mac
+:synopsis: Module that predicts the makespan of a workflow under different data management policies
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import heapq
+from madats.core import storage, backends
+from madats.utils import dagman
+from madats.utils.constants import Policy
+from madats.utils.config import property_config
+from madats.management import placement, policy_manager
+
+COMPUTE = 0
+STAGE_IN = 1
+STAGE_OUT = 2
+
+class SimulationResult(object):
+    """
+    Predicted execution of a workflow with a data management policy:
+    - makespan: seconds until all the tasks finished and all the outputs were staged out
+    - compute_done: seconds until all the compute tasks finished
+    - bytes_moved: bytes moved between every pair of tiers, keyed by 'src->dest'
+    - occupancy: (time, bytes) changes of the data moved or produced on every tier
+    - peak_occupancy: the most bytes on every tier at any time
+    """
+
+    def __init__(self, policy):
+        self._policy = policy
+        self._makespan = 0.0
+        self._compute_done = 0.0
+        self._bytes_moved = {}
+        self._transfers = 0
+        self._occupancy = {}
+        self._peak_occupancy = {}
+
+    @property
+    def policy(self):
+        return self._policy
+
+    @property
+    def makespan(self):
+        return self._makespan
+
+    @property
+    def compute_done(self):
+        return self._compute_done
+
+    @property
+    def bytes_moved(self):
+        return self._bytes_moved
+
+    @property
+    def transfers(self):
+        return self._transfers
+
+    @property
+    def occupancy(self):
+        return self._occupancy
+
+    @property
+    def peak_occupancy(self):
+        return self._peak_occupancy
+
+    def _moved(self, src_id, dest_id, nbytes):
+        key = src_id + '->' + dest_id
+        self._bytes_moved[key] = self._bytes_moved.get(key, 0) + nbytes
+        self._transfers += 1
+
+    def _occupy(self, now, tier, used):
+        self._occupancy.setdefault(tier, []).append((now, used))
+        self._peak_occupancy[tier] = max(self._peak_occupancy.get(tier, 0), used)
+
+
+"""
+the tier of every VDO that a policy moves, without changing the VDS
+- the VDS must not be managed yet, i.e., it has only the compute tasks
+"""
+def policy_placement(vds, policy):
+    return policy_manager.placement_of(vds, policy)
+
+
+"""
+default concurrency limits: any number of compute tasks and stage-ins run at a time,
+as in the DAG execution mode, and the stage-outs are run by the stage-out workers,
+if their number is bounded
+"""
+def default_limits():
+    stageout_workers = int(property_config.STAGEOUT_WORKERS)
+    return {COMPUTE: None, STAGE_IN: None, STAGE_OUT: stageout_workers if stageout_workers > 0 else None}
+
+
+class WorkflowModel(object):
+    """
+    The compute tasks of a VDS indexed in their level order, with the VDOs they read
+    and write and the estimated size of every VDO; it does not depend on the policy,
+    so it is built once for all the simulated policies
+    """
+
+    def __init__(self, vds):
+        dag = vds.get_task_dag()
+        levels = dagman.task_levels(dag)
+        self.tasks = sorted(levels, key=lambda t: levels[t])
+        index = dict((task, i) for i, task in enumerate(self.tasks))
+        self.levels = [levels[task] for task in self.tasks]
+        self.successors = [[index[s] for s in dag.get(task, [])] for task in self.tasks]
+        self.runtimes = [placement.compute_time(task) for task in self.tasks]
+        self.inputs = [[] for _ in self.tasks]
+        self.outputs = [[] for _ in self.tasks]
+        self.vdos = []
+        for vdo in vds.vdos:
+            consumers = [index[t] for t in vdo.consumers if t in index]
+            producers = [index[t] for t in vdo.producers if t in index]
+            for i in consumers:
+                self.inputs[i].append(vdo)
+            for i in producers:
+                self.outputs[i].append(vdo)
+            self.vdos.append((vdo, producers, consumers))
+
+        # sizes of the data as the planners estimate them, with the sizes observed by the
+        # previous runs for the data that does not exist yet
+        self.sizes = dict((vdo, placement.estimate_size(vdo)) for vdo, _, _ in self.vdos)
+
+
+"""
+simulates the execution of a VDS with a data management policy
+- a task runs for its runtime plus the time to read and write its VDOs on their tiers
+- a staged-in VDO is moved before its consumers run, in the order of their levels, when
+  its tier has the capacity for it; a staged-out VDO is moved after its producers
+- transfers take the time estimated by their transfer backend, i.e., they share the
+  tier bandwidths only through the concurrency limits
+- with `auto_cleanup`, the data moved to a tier is removed after its last use
+"""
+def simulate_policy(vds, policy, limits=None, auto_cleanup=None, model=None):
+    if auto_cleanup is None:
+        auto_cleanup = vds.auto_cleanup
+    slots = default_limits()
+    if limits is not None:
+        slots.update(limits)
+    if model is None:
+        model = WorkflowModel(vds)
+    tiers = policy_placement(vds, policy)
+    result = SimulationResult(policy)
+    sizes = model.sizes
+    num_tasks = len(model.tasks)
+
+    # nodes: the compute tasks followed by the data transfers
+    seconds_per_byte = {}
+    for tier in storage.get_storage_tiers():
+        seconds_per_byte[tier] = placement.io_time(1, tier)
+    kind = [COMPUTE] * num_tasks
+    priority = list(model.levels)
+    successors = [list(succ) for succ in model.successors]
+    waiting = [0] * num_tasks
+    for i in range(num_tasks):
+        for j in successors[i]:
+            waiting[j] += 1
+    duration = list(model.runtimes)
+    for i in range(num_tasks):
+        for vdo in model.inputs[i] + model.outputs[i]:
+            duration[i] += sizes[vdo] * seconds_per_byte.get(tiers.get(vdo, vdo.storage_id), 0.0)
+
+    # the data moved or produced on a tier: where it is, the nodes that allocate it,
+    # and how many nodes use it before it can be removed
+    transfers = {}
+    resident = {}
+    users = {}
+    allocates = {}
+    releases = {}
+    for vdo, producers, consumers in model.vdos:
+        tier = tiers.get(vdo, vdo.storage_id)
+        moved = tier != vdo.storage_id and not vdo.non_movable
+        if not moved:
+            tier = vdo.storage_id
+        staged_out = False
+        if moved and len(producers) == 0 and len(consumers) > 0:
+            node = len(kind)
+            kind.append(STAGE_IN)
+            transfers[node] = (vdo, vdo.storage_id, tier)
+            priority.append(min([priority[c] for c in consumers]))
+            successors.append(consumers)
+            waiting.append(0)
+            for c in consumers:
+                waiting[c] += 1
+            writers = [node]
+        elif len(producers) > 0:
+            writers = producers
+            if moved and (len(consumers) == 0 or vdo.persist):
+                staged_out = True
+                node = len(kind)
+                kind.append(STAGE_OUT)
+                transfers[node] = (vdo, tier, vdo.storage_id)
+                priority.append(0)
+                successors.append([])
+                waiting.append(len(producers))
+                for p in producers:
+                    successors[p].append(node)
+                allocates.setdefault(node, []).append((vdo, vdo.storage_id))
+                releases.setdefault(node, []).append(vdo)
+        else:
+            continue
+        resident[vdo] = (tier, moved and auto_cleanup and not vdo.persist)
+        users[vdo] = len(consumers) + (1 if staged_out else 0)
+        for writer in writers:
+            allocates.setdefault(writer, []).append((vdo, None))
+        for c in consumers:
+            releases.setdefault(c, []).append(vdo)
+    backend_of = {}
+    for node in range(num_tasks, len(kind)):
+        vdo, src_id, dest_id = transfers[node]
+        if (src_id, dest_id) not in backend_of:
+            backend_of[(src_id, dest_id)] = backends.get_backend(backends.get_interface(src_id),
+                                                                 backends.get_interface(dest_id))
+        duration.append(backend_of[(src_id, dest_id)].estimate(sizes[vdo], src_id, dest_id))
+
+    used = {}
+    allocated = set()
+    def occupy(now, tier, nbytes):
+        used[tier] = used.get(tier, 0) + nbytes
+        result._occupy(now, tier, used[tier])
+
+    def fits(node):
+        vdo, _, tier = transfers[node]
+        capacity = storage.get_capacity(tier)
+        return capacity is None or used.get(tier, 0) + sizes[vdo] <= capacity
+
+    ready = {COMPUTE: [], STAGE_IN: [], STAGE_OUT: []}
+    running = {COMPUTE: 0, STAGE_IN: 0, STAGE_OUT: 0}
+    events = []
+    sequence = 0
+    for node in range(len(kind)):
+        if waiting[node] == 0:
+            heapq.heappush(ready[kind[node]], (priority[node], node))
+
+    now = 0.0
+    while True:
+        # stage-ins start last, once the nodes that can free their tier are running
+        for k in [COMPUTE, STAGE_OUT, STAGE_IN]:
+            queue = ready[k]
+            limit = slots[k]
+            while len(queue) > 0 and (limit is None or running[k] < limit):
+                node = queue[0][1]
+                # a stage-in waits for capacity only while other nodes are running
+                if k == STAGE_IN and len(events) > 0 and not fits(node):
+                    break
+                heapq.heappop(queue)
+                running[k] += 1
+                for vdo, tier in allocates.get(node, []):
+                    if tier is not None:
+                        occupy(now, tier, sizes[vdo])
+                    elif vdo not in allocated:
+                        allocated.add(vdo)
+                        occupy(now, resident[vdo][0], sizes[vdo])
+                sequence += 1
+                heapq.heappush(events, (now + duration[node], sequence, node))
+        if len(events) == 0:
+            break
+        now, _, node = heapq.heappop(events)
+        running[kind[node]] -= 1
+        if node < num_tasks:
+            result._compute_done = now
+        else:
+            vdo, src_id, dest_id = transfers[node]
+            result._moved(src_id, dest_id, sizes[vdo])
+        for vdo in releases.get(node, []):
+            users[vdo] -= 1
+            tier, removed = resident[vdo]
+            if users[vdo] == 0 and removed:
+                occupy(now, tier, -sizes[vdo])
+        for succ in successors[node]:
+            waiting[succ] -= 1
+            if waiting[succ] == 0:
+                heapq.heappush(ready[kind[succ]], (priority[succ], succ))
+        result._makespan = now
+
+    if any([w > 0 for w in waiting]):
+        print('Simulation of {} stopped with tasks waiting on data that is never produced'.format(Policy.name(policy)))
+    return result
+
+
+"""
+simulates the execution of a VDS with every policy
+- the VDS is not changed, so it can be managed with the best policy afterwards
+- returns a dictionary {policy: SimulationResult}
+"""
+def simulate(vds, policies=None, limits=None, auto_cleanup=None):
+    if policies is None:
+        policies = [Policy.NONE, Policy.WORKFLOW_AWARE, Policy.STORAGE_AWARE]
+    model = WorkflowModel(vds)
+    results = {}
+    for policy in policies:
+        results[policy] = simulate_policy(vds, policy, limits, auto_cleanup, model)
+    return results
+
+
+"""
+selects the policy with the shortest simulated makespan for a VDS, among the
+`candidates` ([auto] section of the configuration by default)
+- logs the estimated gain of every candidate over no data management
+"""
+def select_policy(vds, candidates=None):
+    if candidates is None:
+        # the candidates can name the policies of plugins
+        policy_manager.discover()
+        candidates = [Policy.type(name.strip()) for name in property_config.AUTO_CANDIDATES.split(',')]
+    candidates = [p for p in candidates if p != Policy.AUTO]
+    if Policy.NONE not in candidates:
+        candidates.insert(0, Policy.NONE)
+    results = simulate(vds, candidates)
+    baseline = results[Policy.NONE].makespan
+    best = min(candidates, key=lambda p: (results[p].makespan, candidates.index(p)))
+    for policy in candidates:
+        makespan = results[policy].makespan
+        gain = 100.0 * (baseline - makespan) / baseline if baseline > 0 else 0.0
+        print('Policy {}: estimated makespan {:.3f}s ({:+.1f}% vs none)'.format(Policy.name(policy), makespan, gain))
+    print('Selected data management policy: {}'.format(Policy.name(best)))
+    return best
+
+
+"""
+prints the predicted makespan, bytes moved and peak tier occupancy of every policy
+"""
+def report(results):
+    print('{:<8} {:>12} {:>14} {:>14}  {}'.format('policy', 'makespan(s)', 'compute(s)', 'moved(bytes)', 'peak occupancy (bytes)'))
+    for policy in sorted(results, key=lambda p: results[p].makespan):
+        result = results[policy]
+        moved = sum(result.bytes_moved.values())
+        peaks = ', '.join(['{}={}'.format(tier, nbytes) for tier, nbytes in sorted(result.peak_occupancy.items())])
+        print('{:<8} {:>12.3f} {:>14.3f} {:>14}  {}'.format(Policy.name(policy), result.makespan, result.compute_done, moved, peaks))
@@ -0,0 +1,1510 @@
+"""
+`madats.management.transfer_manager`
+====================================
+
+.. currentmodule:: madats.management.transfer_manager
+
+:platform: Unix, Mac
+:synopsis: Module that manages how data tasks move data between storage tiers
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import os
+import errno
+import fcntl
+import json
+import hashlib
+import shutil
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from madats.core import storage, backends
+from madats.core.scheduler import Scheduler
+from madats.core.vds import DataTask
+from madats.utils import dagman, hsi, compression
+from madats.utils.config import property_config
+from madats.utils.constants import TaskType
+from madats.management import placement
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+MB = 1024 * 1024
+CHUNK_SIZE = 4 * MB
+# files of at least PREALLOCATE_SIZE bytes are preallocated at the destination
+PREALLOCATE_SIZE = MB
+# bytes copied between two progress entries of a transfer journal
+JOURNAL_INTERVAL = 64 * MB
+journal_dir = os.path.expandvars('$MADATS_HOME/outdir/journal')
+# data moved to a slower tier is compressed; a file is only compressed if a sample
+# of it compresses to less than COMPRESSIBLE_RATIO of its size
+COMPRESS = 'compress'
+DECOMPRESS = 'decompress'
+COMPRESSIBLE_RATIO = 0.9
+# ways of moving data between tiers on the same device without copying it
+RENAME = 'rename'
+REFLINK = 'reflink'
+HARDLINK = 'hardlink'
+FICLONE = 0x40049409
+
+"""
+path locality key: orders archive requests by their path, so that files of the same
+directory (that are likely to be on the same tape) are recalled together
+"""
+def path_locality_key(path):
+    return (os.path.dirname(path), os.path.basename(path))
+
+
+class VolumeLocalityKey(object):
+    """
+    Default locality key, that orders archive requests by their tape volume and position
+    on the tape. The volumes of all the recalls of a session are looked up in one HSI
+    query before ordering; requests whose volume is not known (e.g., if the query fails)
+    fall back to their path order.
+    """
+
+    def __init__(self):
+        self._volumes = {}
+
+    def prepare(self, paths):
+        unknown = [p for p in paths if p not in self._volumes]
+        self._volumes.update(hsi.query_volumes(unknown))
+
+    def __call__(self, path):
+        volume, section, offset = self._volumes.get(path, ('', 0, 0))
+        return (volume, section, offset, path_locality_key(path))
+
+
+_locality_key = VolumeLocalityKey()
+
+"""
+plug in the locality key used to order archive requests within an HSI session
+- a key is a callable that takes an archive path and returns a sortable value
+- a key can optionally define `prepare(paths)`, which is called with all the archive
+  paths of a session before they are ordered
+"""
+def set_locality_key(key):
+    global _locality_key
+    _locality_key = key
+
+
+def get_locality_key():
+    return _locality_key
+
+
+"""
+check if a task is a data task that moves data to or from the archive
+"""
+def is_archive_transfer(task):
+    if not isinstance(task, DataTask) or task.datatask_type != DataTask.MOVER:
+        return False
+    return isinstance(task.backend, backends.HsiBackend)
+
+
+"""
+returns the HSI request (operation, local path, archive path) of an archive data task
+"""
+def archive_request(task):
+    if storage.is_archive(task.src.storage_id):
+        return (hsi.GET, task.dest.abspath, task.src.abspath)
+    else:
+        return (hsi.PUT, task.src.abspath, task.dest.abspath)
+
+
+"""
+orders the archive requests by the locality key
+- only the archive paths of the recalls are passed to the `prepare` of the key, since
+  the data that is put does not exist on the archive yet
+"""
+def order_requests(requests, key=None):
+    if key is None:
+        key = _locality_key
+    if hasattr(key, 'prepare'):
+        key.prepare([archive_path for op, _, archive_path in requests if op == hsi.GET])
+    return sorted(requests, key=lambda request: key(request[2]))
+
+
+"""
+groups all the archive data tasks on the same level of a workflow DAG into a single
+data task that runs all of their requests, ordered by locality, in one HSI session
+- the batched task inherits the dependencies of the data tasks it replaces
+"""
+def batch_archive_transfers(dag):
+    levels = dagman.task_levels(dag)
+    sessions = {}
+    for task in dag:
+        if is_archive_transfer(task):
+            sessions.setdefault(levels[task], []).append(task)
+
+    for level in sorted(sessions):
+        datatasks = sessions[level]
+        requests = order_requests([archive_request(t) for t in datatasks])
+        batch_id = storage.get_data_id(''.join([t.__id__ for t in datatasks]))
+        batch_task = DataTask(batch_id, None, None, DataTask.BATCH)
+        batch_task.command = hsi.session_command(requests)
+        batch_task.batch = datatasks
+        _replace_tasks(dag, datatasks, batch_task)
+        print('Archive session created for {} data tasks on level {}'.format(len(datatasks), level))
+
+    return dag
+
+
+"""
+replaces a set of independent tasks in the DAG with a single task
+"""
+def _replace_tasks(dag, tasks, new_task):
+    for task in tasks:
+        for pred in task.predecessors:
+            if pred not in tasks:
+                new_task.add_predecessor(pred)
+        for succ in task.successors:
+            if succ not in tasks:
+                new_task.add_successor(succ)
+        del dag[task]
+
+    for pred in new_task.predecessors:
+        pred.successors = [s for s in pred.successors if s not in tasks]
+        pred.add_successor(new_task)
+        dag[pred] = [s for s in dag.get(pred, []) if s not in tasks]
+        dag[pred].append(new_task)
+
+    for succ in new_task.successors:
+        succ.predecessors = [p for p in succ.predecessors if p not in tasks]
+        succ.add_predecessor(new_task)
+
+    dag[new_task] = [s for s in new_task.successors]
+
+
+class TokenBucket(object):
+    """
+    Token bucket that limits the rate (bytes/sec) of all the transfers that share it
+    """
+
+    def __init__(self, rate, capacity=None):
+        self._rate = float(rate)
+        if capacity is None:
+            capacity = max(self._rate, CHUNK_SIZE)
+        self._capacity = float(capacity)
+        self._tokens = self._capacity
+        self._timestamp = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def consume(self, nbytes):
+        self._lock.acquire()
+        now = time.time()
+        self._tokens = min(self._capacity, self._tokens + (now - self._timestamp) * self._rate)
+        self._timestamp = now
+        # the tokens can go negative: the debt is paid by sleeping outside the lock
+        self._tokens -= nbytes
+        delay = 0
+        if self._tokens < 0:
+            delay = -self._tokens / self._rate
+        self._lock.release()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class TransferScheduler(object):
+    """
+    Scheduler shared by all the data tasks of a workflow that enforces the transfer limits
+    of the storage tiers (see `storage.get_transfer_limits`):
+      - a data task acquires a stream on its source tier, destination tier and the link
+        between them, all at once, before it starts moving data; a data task that moves
+        data over parallel streams also takes the streams that are free, up to its own
+      - data tasks waiting for the same resources acquire them in the order of their
+        priority (lower first; any comparable value, e.g., a tuple), and in their
+        arrival order for the same priority
+      - the bytes moved by native transfers are throttled by a token bucket per resource
+    It also records the achieved throughput of the transfers between each pair of tiers.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._active = {}
+        self._peak = {}
+        self._buckets = {}
+        self._stats = {}
+        self._manifest = []
+        self._waiting = []
+        self._sequence = 0
+        self._granted = {}
+
+    @property
+    def peak_streams(self):
+        return self._peak
+
+    @property
+    def manifest(self):
+        return self._manifest
+
+    def _get_limits(self, task):
+        limits = {}
+        for src, dest in transfer_tiers(task):
+            limits.update(storage.get_transfer_limits(src, dest))
+        return limits
+
+    def _available(self, limits):
+        for resource, (max_streams, _) in limits.items():
+            if max_streams is not None and self._active.get(resource, 0) >= max_streams:
+                return False
+        return True
+
+    def _preceded(self, waiter):
+        priority, sequence, limits = waiter
+        for other in self._waiting:
+            if (other[0], other[1]) >= (priority, sequence):
+                continue
+            for resource, (max_streams, _) in other[2].items():
+                if max_streams is not None and resource in limits:
+                    return True
+        return False
+
+    '''
+    waits for a stream on the tiers of a data task, and returns the number of streams
+    it acquired: at least one, and at most `streams`
+    '''
+    def acquire(self, task, priority=0, streams=1):
+        limits = self._get_limits(task)
+        self._cond.acquire()
+        self._sequence += 1
+        waiter = (priority, self._sequence, limits)
+        self._waiting.append(waiter)
+        while not self._available(limits) or self._preceded(waiter):
+            self._cond.wait()
+        self._waiting.remove(waiter)
+        for resource, (max_streams, _) in limits.items():
+            if max_streams is not None:
+                streams = min(streams, max_streams - self._active.get(resource, 0))
+        streams = max(1, streams)
+        for resource in limits:
+            self._active[resource] = self._active.get(resource, 0) + streams
+            self._peak[resource] = max(self._peak.get(resource, 0), self._active[resource])
+        self._granted[task] = streams
+        self._cond.notify_all()
+        self._cond.release()
+        return streams
+
+    def release(self, task):
+        limits = self._get_limits(task)
+        self._cond.acquire()
+        streams = self._granted.pop(task, 1)
+        for resource in limits:
+            self._active[resource] -= streams
+        self._cond.notify_all()
+        self._cond.release()
+
+    def throttle(self, task, nbytes):
+        for resource, (_, max_rate) in self._get_limits(task).items():
+            if max_rate is None:
+                continue
+            self._cond.acquire()
+            if resource not in self._buckets:
+                self._buckets[resource] = TokenBucket(max_rate * MB)
+            bucket = self._buckets[resource]
+            self._cond.release()
+            bucket.consume(nbytes)
+
+    def record(self, task, nbytes, start, end, digest=None, compressed_bytes=None, method=None):
+        if task.datatask_type == DataTask.BATCH:
+            for datatask in task.batch:
+                self.record(datatask, transfer_size(datatask), start, end)
+            return
+        pair = (task.src.storage_id, task.dest.storage_id)
+        self._cond.acquire()
+        entry = {'datatask': task.__id__, 'src': task.src.abspath, 'dest': task.dest.abspath,
+                 'bytes': nbytes, 'start': start, 'seconds': end - start,
+                 'digest': None, 'algorithm': None}
+        if digest is not None:
+            entry['digest'], entry['algorithm'] = digest
+        if end > start:
+            entry['throughput'] = nbytes / (end - start)
+        if method is not None:
+            # the data was renamed or linked instead of copied
+            entry['method'] = method
+        if compressed_bytes is not None:
+            # bytes stored on the slower tier, and their ratio to the bytes moved
+            entry['compression'] = 'zstd'
+            entry['compressed_bytes'] = compressed_bytes
+            entry['compression_ratio'] = float(compressed_bytes) / nbytes if nbytes > 0 else 1.0
+        self._manifest.append(entry)
+        stats = self._stats.setdefault(pair, {'tasks': 0, 'bytes': 0, 'start': start, 'end': end})
+        stats['tasks'] += 1
+        stats['bytes'] += nbytes
+        stats['start'] = min(stats['start'], start)
+        stats['end'] = max(stats['end'], end)
+        self._cond.release()
+
+    """
+    writes the transfer manifest: the bytes, time and content digest of every data task
+    """
+    def write_manifest(self, manifest_file):
+        directory = os.path.dirname(manifest_file)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(manifest_file, 'w') as f:
+            json.dump(self._manifest, f, indent=2)
+
+    """
+    achieved throughput between each pair of tiers: the bytes moved over the
+    time the transfers between the two tiers were active
+    """
+    def report(self):
+        report = {}
+        for pair, stats in self._stats.items():
+            seconds = stats['end'] - stats['start']
+            throughput = stats['bytes'] / seconds if seconds > 0 else 0
+            report[pair] = {'tasks': stats['tasks'], 'bytes': stats['bytes'],
+                            'seconds': seconds, 'throughput': throughput}
+        return report
+
+
+class PrefetchScheduler(object):
+    """
+    Scheduler that hides the stage-in of data behind the computation of a workflow:
+      - data tasks are prioritized by the level (of compute tasks) of their earliest consumer
+      - a stage-in to a tier with a capacity is started once its earliest consumer is at
+        most `lookahead` levels ahead of the lowest level with unfinished compute tasks; a
+        negative lookahead does not hold back any stage-in
+      - stage-ins ahead of the current level are only started while the staged-in data that
+        is still in use fits within the capacity of the destination tier
+      - stage-ins to tiers without a capacity are started right away
+    """
+
+    def __init__(self, dag, lookahead=1):
+        self._lookahead = lookahead
+        self._levels = dagman.task_levels(dag, counted=lambda t: t.type == TaskType.COMPUTE)
+        self._pending = {}
+        for task, level in self._levels.items():
+            if task.type == TaskType.COMPUTE:
+                self._pending[level] = self._pending.get(level, 0) + 1
+        self._in_use = {}
+        self._staged = {}
+        self._prefetched = 0
+        self._cond = threading.Condition()
+
+    @property
+    def prefetched(self):
+        return self._prefetched
+
+    def priority(self, task):
+        consumers = [t for t in task.successors if t.type == TaskType.COMPUTE]
+        if len(consumers) > 0:
+            return min([self._levels.get(t, 0) for t in consumers])
+        return self._levels.get(task, 0)
+
+    def _frontier(self):
+        levels = [level for level, count in self._pending.items() if count > 0]
+        if len(levels) == 0:
+            return float('inf')
+        return min(levels)
+
+    def _admissible(self, level, staged_bytes):
+        frontier = self._frontier()
+        if level <= frontier:
+            return True
+        if all([storage.get_capacity(tier) is None for tier in staged_bytes]):
+            return True
+        if self._lookahead >= 0 and level > frontier + self._lookahead:
+            return False
+        for tier, nbytes in staged_bytes.items():
+            capacity = storage.get_capacity(tier)
+            in_use = self._in_use.get(tier, 0)
+            if capacity is not None and in_use > 0 and in_use + nbytes > capacity:
+                return False
+        return True
+
+    """
+    blocks until a stage-in data task can be started
+    """
+    def admit(self, task):
+        level = self.priority(task)
+        staged_bytes = staged_in_bytes(task)
+        self._cond.acquire()
+        while not self._admissible(level, staged_bytes):
+            self._cond.wait()
+        if level > self._frontier():
+            self._prefetched += 1
+        for tier, nbytes in staged_bytes.items():
+            self._in_use[tier] = self._in_use.get(tier, 0) + nbytes
+        consumers = [t for t in task.successors if t.type == TaskType.COMPUTE]
+        self._staged[task] = (staged_bytes, set(consumers))
+        self._cond.release()
+
+    """
+    updates the level of the workflow and the staged-in data in use when a task finishes
+    """
+    def finished(self, task):
+        if task.type != TaskType.COMPUTE:
+            return
+        self._cond.acquire()
+        level = self._levels.get(task, 0)
+        self._pending[level] = self._pending.get(level, 0) - 1
+        for stagein in list(self._staged.keys()):
+            staged_bytes, consumers = self._staged[stagein]
+            consumers.discard(task)
+            if len(consumers) == 0:
+                for tier, nbytes in staged_bytes.items():
+                    self._in_use[tier] -= nbytes
+                del self._staged[stagein]
+        self._cond.notify_all()
+        self._cond.release()
+
+
+class DeadlineScheduler(object):
+    """
+    Scheduler that orders the tasks of a workflow by their slack to the deadlines of the
+    data they lead to (`VirtualDataObject.deadline`, epoch time in ms):
+      - a task must finish by the earliest deadline of the data it writes, and before
+        the latest start time of each of its successors
+      - the duration of a task is its runtime, or the estimated time of its transfer
+        between the storage tiers
+      - tasks that lead to a deadline go first, by their latest start time, and then
+        the other tasks by their own priority
+      - a warning is raised as soon as a deadline cannot be met: before the execution,
+        if the tasks leading to it cannot finish in time even without waiting, and
+        during the execution, when one of these tasks becomes ready or starts too late
+    """
+
+    def __init__(self, dag, now=None):
+        if now is None:
+            now = time.time()
+        self._duration = {}
+        self._finish_by = {}
+        self._target = {}
+        self._warned = {}
+        self._lock = threading.Lock()
+
+        levels = dagman.task_levels(dag)
+        order = sorted(levels, key=lambda t: levels[t])
+        preds = dict((task, []) for task in order)
+        for task in order:
+            self._duration[task] = task_duration(task)
+            for succ in dagman.successors(dag, task):
+                preds[succ].append(task)
+
+        for task in reversed(order):
+            for vdo in produced_vdos(task):
+                if vdo.deadline > 0:
+                    self._bound(task, vdo.deadline / 1000.0, vdo)
+            for succ in dagman.successors(dag, task):
+                if succ in self._finish_by:
+                    self._bound(task, self.latest_start(succ), self._target[succ])
+
+        # the earliest finish of every task, if no task ever waits for a resource
+        earliest = {}
+        for task in order:
+            start = max([earliest[pred] for pred in preds[task]] + [now])
+            earliest[task] = start + self._duration[task]
+            if task in self._finish_by and earliest[task] > self._finish_by[task]:
+                self._warn(task, earliest[task])
+
+    def _bound(self, task, finish_by, vdo):
+        if task not in self._finish_by or finish_by < self._finish_by[task]:
+            self._finish_by[task] = finish_by
+            self._target[task] = vdo
+
+    def _warn(self, task, finish):
+        vdo = self._target[task]
+        self._lock.acquire()
+        if vdo not in self._warned:
+            self._warned[vdo] = finish - self._finish_by[task]
+            print("** WARNING: the deadline of {} cannot be met, it is estimated to be {:.2f}s late".format(
+                vdo.abspath, self._warned[vdo]))
+        self._lock.release()
+
+    """
+    the data whose deadlines cannot be met, and by how many seconds they are estimated
+    to be late
+    """
+    @property
+    def infeasible(self):
+        return self._warned
+
+    """
+    latest time (epoch seconds) a task can start for the data it leads to meet its
+    deadline, or None if it does not lead to a deadline
+    """
+    def latest_start(self, task):
+        if task not in self._finish_by:
+            return None
+        return self._finish_by[task] - self._duration[task]
+
+    def slack(self, task, now=None):
+        latest_start = self.latest_start(task)
+        if latest_start is None:
+            return None
+        if now is None:
+            now = time.time()
+        return latest_start - now
+
+    def priority(self, task, priority=0):
+        latest_start = self.latest_start(task)
+        if latest_start is None:
+            return (1, priority)
+        return (0, latest_start)
+
+    """
+    warns if a task that is ready or starting can no longer finish before the deadline
+    it leads to
+    """
+    def check(self, task, now=None):
+        slack = self.slack(task, now)
+        if slack is not None and slack < 0:
+            self._warn(task, self._finish_by[task] - slack)
+
+
+"""
+the data that a task writes
+"""
+def produced_vdos(task):
+    if isinstance(task, DataTask):
+        if task.datatask_type == DataTask.BATCH:
+            return [t.dest for t in task.batch]
+        if task.datatask_type == DataTask.MOVER:
+            return [task.dest]
+        return []
+    return [p for p in task.params if hasattr(p, 'producers') and task in p.producers]
+
+
+"""
+estimated duration of a task in seconds: the runtime of a compute task, or the time
+to move the data of a data task between its tiers
+"""
+def task_duration(task):
+    if not isinstance(task, DataTask):
+        return placement.compute_time(task)
+    if task.datatask_type == DataTask.BATCH:
+        return sum([task_duration(t) for t in task.batch])
+    if task.datatask_type != DataTask.MOVER:
+        return 0.0
+    return placement.hop_time(placement.estimate_size(task.src), task.src.storage_id, task.dest.storage_id)
+
+
+"""
+the data that a data task moves originates from: a hop of a cascaded transfer moves
+the copy made by the previous hop
+"""
+def origin(vdo):
+    while len(vdo.producers) == 1 and isinstance(vdo.producers[0], DataTask) and \
+            vdo.producers[0].datatask_type == DataTask.MOVER:
+        vdo = vdo.producers[0].src
+    return vdo
+
+
+"""
+check if a data task stages in data, i.e., moves data that is not produced by the workflow
+"""
+def is_stage_in(task):
+    if not isinstance(task, DataTask):
+        return False
+    if task.datatask_type == DataTask.BATCH:
+        return any([is_stage_in(t) for t in task.batch])
+    return task.datatask_type == DataTask.MOVER and len(origin(task.src).producers) == 0
+
+
+"""
+check if a data task stages out data produced by the workflow
+"""
+def is_stage_out(task):
+    if not isinstance(task, DataTask):
+        return False
+    if task.datatask_type == DataTask.BATCH:
+        return all([is_stage_out(t) for t in task.batch])
+    return task.datatask_type == DataTask.MOVER and len(origin(task.src).producers) > 0
+
+
+"""
+bytes staged in by a data task on each destination tier
+"""
+def staged_in_bytes(task):
+    staged_bytes = {}
+    datatasks = task.batch if task.datatask_type == DataTask.BATCH else [task]
+    for datatask in datatasks:
+        if is_stage_in(datatask):
+            tier = datatask.dest.storage_id
+            staged_bytes[tier] = staged_bytes.get(tier, 0) + transfer_size(datatask)
+    return staged_bytes
+
+
+"""
+returns the (source tier, destination tier) pairs of the data moved by a data task
+"""
+def transfer_tiers(task):
+    if not isinstance(task, DataTask):
+        return []
+    if task.datatask_type == DataTask.MOVER:
+        return [(task.src.storage_id, task.dest.storage_id)]
+    elif task.datatask_type == DataTask.BATCH:
+        pairs = []
+        for datatask in task.batch:
+            for pair in transfer_tiers(datatask):
+                if pair not in pairs:
+                    pairs.append(pair)
+        return pairs
+    return []
+
+
+"""
+check if a task moves data between storage tiers
+"""
+def is_transfer(task):
+    return len(transfer_tiers(task)) > 0
+
+
+"""
+check if a data task is run by the native data mover, i.e., in the workflow
+process instead of through a job script: only transfers between posix tiers
+that are not submitted to a batch scheduler
+"""
+def is_native_transfer(task):
+    if not isinstance(task, DataTask) or task.datatask_type != DataTask.MOVER:
+        return False
+    if task.scheduler != Scheduler.NONE:
+        return False
+    return task.backend.native
+
+
+"""
+estimated number of bytes moved by a data task
+"""
+def transfer_size(task):
+    if task.datatask_type == DataTask.BATCH:
+        return sum([transfer_size(t) for t in task.batch])
+    if task.files is not None:
+        paths = [os.path.join(task.src.abspath, f) for f in task.files]
+        return sum([os.path.getsize(p) for p in paths if os.path.exists(p)])
+    return task.src.size
+
+
+_digest_algorithm = 'blake2b'
+
+"""
+select the content digest computed by the native data mover: blake2b (default),
+xxh64 (requires the xxhash package) or any algorithm supported by hashlib
+"""
+def set_digest_algorithm(algorithm):
+    global _digest_algorithm
+    if algorithm == 'xxh64' and xxhash is None:
+        print('xxhash is not installed, using blake2b digests')
+        algorithm = 'blake2b'
+    _digest_algorithm = algorithm
+
+
+def get_digest_algorithm():
+    return _digest_algorithm
+
+
+def _new_digest():
+    if _digest_algorithm == 'xxh64':
+        return xxhash.xxh64()
+    return hashlib.new(_digest_algorithm)
+
+
+_compression = property_config.COMPRESSION_MODE
+_compression_bandwidth_ratio = float(property_config.COMPRESSION_BANDWIDTH_RATIO)
+_compression_level = int(property_config.COMPRESSION_LEVEL)
+
+"""
+sets when data is compressed while it is moved: 'auto', 'always' or 'never'
+"""
+def set_compression(mode, bandwidth_ratio=None):
+    global _compression, _compression_bandwidth_ratio
+    if mode not in ['auto', 'always', 'never']:
+        print("Invalid compression mode ({})".format(mode))
+        return
+    _compression = mode
+    if bandwidth_ratio is not None:
+        _compression_bandwidth_ratio = float(bandwidth_ratio)
+
+
+def get_compression():
+    return _compression
+
+
+"""
+check if a copy is only read back by MaDaTS, i.e., all its readers are data tasks
+that move it, such as the restore task of an evicted VDO
+"""
+def is_read_back(vdo):
+    if len(vdo.consumers) == 0 or not all([isinstance(t, DataTask) for t in vdo.consumers]):
+        return False
+    return any([t.datatask_type == DataTask.MOVER for t in vdo.consumers])
+
+
+"""
+decides whether a native data task compresses the data it moves to a slower tier
+(COMPRESS), decompresses the data it moves from a slower tier (DECOMPRESS), or neither
+- in 'auto' mode, compression pays off only if the bandwidth of the faster tier is at
+  least `bandwidth_ratio` times the bandwidth of the slower tier; in 'always' mode,
+  data is compressed whenever it is moved to a slower tier
+- only the copies that MaDaTS reads back itself are compressed: the data staged out
+  to its final location is left as the workflow wrote it
+"""
+def compression_mode(task):
+    if _compression == 'never' or not is_native_transfer(task) or not compression.available():
+        return None
+    tiers = storage.get_storage_tiers()
+    src_bandwidth = float(tiers.get(task.src.storage_id, {}).get('bandwidth', 0))
+    dest_bandwidth = float(tiers.get(task.dest.storage_id, {}).get('bandwidth', 0))
+    if src_bandwidth <= 0 or dest_bandwidth <= 0:
+        return None
+    bandwidth_ratio = 1.0 if _compression == 'always' else _compression_bandwidth_ratio
+    if src_bandwidth > dest_bandwidth and src_bandwidth >= bandwidth_ratio * dest_bandwidth:
+        return COMPRESS if is_read_back(task.dest) else None
+    if dest_bandwidth > src_bandwidth and dest_bandwidth >= bandwidth_ratio * src_bandwidth:
+        return DECOMPRESS
+    return None
+
+
+_fast_path = property_config.FAST_PATH.lower() == 'true'
+
+"""
+enables or disables moving data between tiers on the same device without copying it
+"""
+def set_fast_path(enabled):
+    global _fast_path
+    _fast_path = enabled
+
+
+def get_fast_path():
+    return _fast_path
+
+
+"""
+check if the data and the destination path are on the same device
+"""
+def same_device(src, dest):
+    path = os.path.abspath(dest)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return os.stat(src).st_dev == os.stat(path).st_dev
+
+
+"""
+returns the ways a data task can move data between two tiers on the same device
+without copying it, in order of preference
+- a stage-out renames the output, if no other task reads it and it is removed
+  by a cleanup task afterwards anyway
+- files are cloned (reflink) where the file system supports it
+- immutable data is hard linked
+- a replica is always copied, since it spreads the reads of its source
+"""
+def fast_path_methods(task):
+    if not _fast_path or not is_native_transfer(task) or task.replica:
+        return []
+    src = task.src.abspath
+    if not os.path.exists(src) or not same_device(src, task.dest.abspath):
+        return []
+    methods = []
+    readers = [t for t in task.src.consumers if t is not task]
+    cleaners = [t for t in task.successors if isinstance(t, DataTask) and
+                t.datatask_type == DataTask.CLEANER and t.src is task.src and not t.cached]
+    if is_stage_out(task) and not task.src.persist and len(readers) == 0 and len(cleaners) > 0:
+        methods.append(RENAME)
+    methods.append(REFLINK)
+    if not task.src.mutable or not task.dest.mutable:
+        methods.append(HARDLINK)
+    return methods
+
+
+class FastPath(object):
+    """
+    Links files to their destination by the first of the given methods (reflink,
+    hardlink) that works, and counts the files moved by every method; the files
+    that cannot be linked are counted as copies
+    """
+
+    def __init__(self, methods):
+        self._methods = methods
+        self._used = {}
+        self._lock = threading.Lock()
+
+    @property
+    def methods(self):
+        return self._methods
+
+    @property
+    def used(self):
+        return self._used
+
+    def _count(self, method):
+        self._lock.acquire()
+        self._used[method] = self._used.get(method, 0) + 1
+        self._lock.release()
+
+    def link(self, src, dest):
+        if os.path.lexists(dest) and not os.path.isdir(dest):
+            os.remove(dest)
+        if REFLINK in self._methods:
+            try:
+                with open(src, 'rb') as fsrc:
+                    with open(dest, 'wb') as fdest:
+                        fcntl.ioctl(fdest.fileno(), FICLONE, fsrc.fileno())
+                shutil.copymode(src, dest)
+                self._count(REFLINK)
+                return REFLINK
+            except Exception:
+                if os.path.exists(dest):
+                    os.remove(dest)
+        if HARDLINK in self._methods:
+            try:
+                os.link(src, dest)
+                self._count(HARDLINK)
+                return HARDLINK
+            except OSError:
+                pass
+        self._count('copy')
+        return None
+
+
+"""
+size of a file or a directory tree in bytes
+"""
+def data_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    nbytes = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            filepath = os.path.join(root, name)
+            if not os.path.islink(filepath):
+                nbytes += os.path.getsize(filepath)
+    return nbytes
+
+
+"""
+returns the (src file, dest file) pairs of the files of a data object
+"""
+def _file_pairs(src, dest):
+    if not os.path.isdir(src):
+        return [(src, dest)]
+    pairs = []
+    for root, _, names in os.walk(src):
+        for name in names:
+            src_file = os.path.join(root, name)
+            pairs.append((src_file, os.path.join(dest, os.path.relpath(src_file, src))))
+    return pairs
+
+
+"""
+copies the files of a directory that are in `files` (paths relative to the directory),
+and links the other files to the source, so that the destination has all the files
+- a later copy to the destination replaces the links instead of writing through them
+"""
+def copy_partial(src, dest, files, throttle=None, digests=None, journal=None, fast_path=None):
+    selected = set(files)
+    if not os.path.exists(dest):
+        os.makedirs(dest)
+    nbytes = 0
+    for src_file, dest_file in _file_pairs(src, dest):
+        if os.path.relpath(src_file, src) in selected:
+            nbytes += copy(src_file, dest_file, throttle, digests, journal, None, fast_path)
+            continue
+        dest_dir = os.path.dirname(dest_file)
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+        if os.path.lexists(dest_file):
+            os.remove(dest_file)
+        os.symlink(os.path.abspath(src_file), dest_file)
+    return nbytes
+
+
+"""
+removes a destination that a copy would write through to other data: a symbolic link
+(e.g., a file that `copy_partial` linked to its source), a hard link or a file that
+is not a regular file
+"""
+def _unlink_dest(dest):
+    try:
+        stat = os.lstat(dest)
+    except OSError:
+        return
+    if os.path.isdir(dest) and not os.path.islink(dest):
+        return
+    if not os.path.isfile(dest) or os.path.islink(dest) or stat.st_nlink > 1:
+        os.remove(dest)
+
+
+"""
+renames the data to the destination path, replacing an existing destination
+- the data is first renamed to a sibling of the destination, so that the destination
+  is kept and the data is still at its source if the rename fails (e.g., EXDEV)
+- a file replaces the destination file atomically; a directory, or data replacing a
+  directory, is swapped with the destination, which is removed afterwards
+"""
+def _rename(src, dest):
+    dest_dir = os.path.dirname(dest)
+    if not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+    suffix = '.{}.{}'.format(os.getpid(), threading.current_thread().ident)
+    tmp = dest + suffix + '.tmp'
+    os.rename(src, tmp)
+    try:
+        if os.path.lexists(dest) and (os.path.isdir(tmp) or (os.path.isdir(dest) and not os.path.islink(dest))):
+            old = dest + suffix + '.old'
+            os.rename(dest, old)
+            try:
+                os.rename(tmp, dest)
+            except OSError:
+                os.rename(old, dest)
+                raise
+            if os.path.isdir(old) and not os.path.islink(old):
+                shutil.rmtree(old)
+            else:
+                os.remove(old)
+        else:
+            os.rename(tmp, dest)
+    except OSError:
+        # the data is moved back to its source, from where it is copied instead
+        os.rename(tmp, src)
+        raise
+
+
+"""
+digest of a file from its recorded fingerprint, if it was computed by the current algorithm
+"""
+def _fingerprint_digest(datapath, fingerprints):
+    fingerprint = storage.get_fingerprint(datapath, fingerprints)
+    if fingerprint is None or fingerprint[1] != _digest_algorithm:
+        return None
+    return fingerprint[0]
+
+
+"""
+journal of a data task that is being moved by the native data mover
+- lists the files that have been copied, and the offset up to which the
+  file being copied is durable at the destination
+- a data task that is restarted after an interruption skips the copied files
+  and resumes the partially copied file from its offset
+"""
+class TransferJournal(object):
+    """
+    The journal is an append-only file of JSON entries:
+    {'file': src, 'dest': dest, 'size': .., 'mtime': .., 'digest': .., 'stored': ..} for a copied file,
+    where `stored` is the size of the destination file, which differs if it is compressed
+    {'partial': src, 'dest': dest, 'size': .., 'mtime': .., 'offset': ..} for a file being copied
+    """
+
+    def __init__(self, journal_file):
+        self._journal_file = journal_file
+        self._files = {}
+        self._partials = {}
+        if os.path.exists(journal_file):
+            with open(journal_file, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the last entry may be incomplete if the transfer was interrupted
+                        continue
+                    if 'file' in entry:
+                        self._files[entry['file']] = entry
+                        self._partials.pop(entry['file'], None)
+                    elif 'partial' in entry:
+                        self._partials[entry['partial']] = entry
+        self._journal = None
+        self._lock = threading.Lock()
+
+    @property
+    def journal_file(self):
+        return self._journal_file
+
+    def _append(self, entry):
+        self._lock.acquire()
+        try:
+            self._write(entry)
+        finally:
+            self._lock.release()
+
+    def _write(self, entry):
+        if self._journal is None:
+            directory = os.path.dirname(self._journal_file)
+            if not os.path.exists(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    pass
+            self._journal = open(self._journal_file, 'a')
+        self._journal.write(json.dumps(entry) + '\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _matches(self, entry, src, dest):
+        stat = os.stat(src)
+        return entry['dest'] == dest and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime
+
+    """
+    check if a file was completely copied
+    """
+    def copied(self, src, dest):
+        entry = self._files.get(src, None)
+        if entry is None or not self._matches(entry, src, dest):
+            return False
+        return os.path.isfile(dest) and os.path.getsize(dest) == entry.get('stored', entry['size'])
+
+    """
+    returns the digest of a copied file, or None if it was not computed
+    """
+    def digest(self, src):
+        entry = self._files.get(src, None)
+        if entry is None:
+            return None
+        return entry['digest']
+
+    """
+    returns the offset up to which a file was copied before an interruption
+    """
+    def offset(self, src, dest):
+        entry = self._partials.get(src, None)
+        if entry is None or not self._matches(entry, src, dest):
+            return 0
+        if not os.path.isfile(dest) or os.path.getsize(dest) < entry['offset']:
+            return 0
+        return entry['offset']
+
+    def progress(self, src, dest, offset):
+        stat = os.stat(src)
+        self._append({'partial': src, 'dest': dest, 'size': stat.st_size,
+                      'mtime': stat.st_mtime, 'offset': offset})
+
+    def complete(self, src, dest, digest):
+        stat = os.stat(src)
+        entry = {'file': src, 'dest': dest, 'size': stat.st_size,
+                 'mtime': stat.st_mtime, 'digest': digest, 'stored': os.path.getsize(dest)}
+        self._files[src] = entry
+        self._append(entry)
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    """
+    removes the journal once the data task has finished
+    """
+    def remove(self):
+        self.close()
+        if os.path.exists(self._journal_file):
+            os.remove(self._journal_file)
+
+
+"""
+verifies the tail of a partially copied file against the source, and returns the
+offset to resume the copy from, or 0 if the copy starts over
+- only the last chunk before the offset is read, so the data copied before it is
+  not read again; the digest of a resumed file is therefore not computed
+"""
+def _resume(src, dest, offset):
+    tail = max(0, offset - CHUNK_SIZE)
+    with open(dest, 'rb') as fdest:
+        fdest.seek(tail)
+        dest_tail = fdest.read(offset - tail)
+    with open(src, 'rb') as fsrc:
+        fsrc.seek(tail)
+        src_tail = fsrc.read(offset - tail)
+    if len(dest_tail) != offset - tail or src_tail != dest_tail:
+        return 0
+    return offset
+
+
+"""
+check if a file has holes: it uses fewer blocks than its size
+"""
+def is_sparse(datapath):
+    stat = os.stat(datapath)
+    if not hasattr(stat, 'st_blocks'):
+        return False
+    return stat.st_blocks * 512 < stat.st_size
+
+
+"""
+returns the (start, end) ranges of a file after `offset` that contain data
+- holes are found with SEEK_DATA/SEEK_HOLE; if the file system does not report
+  holes, the rest of the file is one range
+"""
+def data_ranges(fd, offset, size):
+    if not hasattr(os, 'SEEK_DATA'):
+        return [(offset, size)]
+    ranges = []
+    position = offset
+    while position < size:
+        try:
+            start = os.lseek(fd, position, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # no more data: the file ends with a hole
+                break
+            return [(offset, size)]
+        if start >= size:
+            break
+        end = min(os.lseek(fd, start, os.SEEK_HOLE), size)
+        ranges.append((start, end))
+        position = end
+    return ranges
+
+
+"""
+allocates the extents of a file before it is written, where the file system supports it
+"""
+def preallocate(fd, offset, length):
+    if length < PREALLOCATE_SIZE or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(fd, offset, length)
+    except OSError:
+        pass
+
+
+"""
+adds the zeros of a hole of a sparse file to its digest, without reading them, so that
+the digest of a file only depends on its content, not on how it is allocated
+"""
+def _update_zeros(digest, length):
+    zeros = b'\0' * min(CHUNK_SIZE, length)
+    while length > 0:
+        digest.update(zeros[:min(len(zeros), length)])
+        length -= len(zeros)
+
+
+"""
+native data mover: copies a file or a directory tree to the destination path
+- the data is streamed in chunks and every chunk is passed to `throttle`
+- the content digest of every file is computed while it is streamed and
+  appended to `digests` as (src file, dest file, digest)
+- with a `journal`, the copied files and the progress of the file being copied
+  are journaled, and a copy that was interrupted resumes from the journal; the
+  digest of a resumed file is None, since the data copied before is not read again
+- with `compress`, files are stored compressed with a .zst suffix (COMPRESS), or
+  compressed files are restored without the suffix (DECOMPRESS)
+- with a `fast_path`, files are linked instead of copied where possible; the
+  digests of the linked files are None, since their data is not read
+- the holes of sparse files are preserved, and the destination of other files is
+  preallocated to limit its fragmentation; the holes are not read, but they are part
+  of the digest as zeros, so that the digest is of the content of the file
+- with multiple `streams`, the files of a directory tree are copied in parallel
+- unlike `cp -R`, a directory is always copied *to* the destination path, even
+  if it already exists
+"""
+def copy(src, dest, throttle=None, digests=None, journal=None, compress=None, fast_path=None, streams=1):
+    if os.path.isdir(src) and streams > 1:
+        return _copy_parallel(src, dest, throttle, digests, journal, compress, fast_path, streams)
+    if os.path.isdir(src):
+        if not os.path.exists(dest):
+            os.makedirs(dest)
+        nbytes = 0
+        for name in sorted(os.listdir(src)):
+            src_path = os.path.join(src, name)
+            dest_path = _dest_path(src_path, os.path.join(dest, name), compress)
+            if os.path.islink(src_path):
+                _copy_link(src_path, dest_path)
+            else:
+                nbytes += copy(src_path, dest_path, throttle, digests, journal, compress, fast_path)
+        shutil.copymode(src, dest)
+        return nbytes
+
+    if fast_path is not None:
+        dest_dir = os.path.dirname(dest)
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+        if fast_path.link(src, dest) is not None:
+            if digests is not None:
+                digests.append((src, dest, None))
+            return os.path.getsize(dest)
+
+    if compress is not None:
+        nbytes = _copy_compressed(src, dest, compress, throttle, digests, journal)
+        if nbytes is not None:
+            return nbytes
+
+    if journal is not None:
+        if journal.copied(src, dest):
+            if digests is not None:
+                digests.append((src, dest, journal.digest(src)))
+            return 0
+
+    dest_dir = os.path.dirname(dest)
+    if not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+    nbytes = 0
+    digest = _new_digest()
+    offset = 0
+    if journal is not None:
+        offset = journal.offset(src, dest)
+        if offset > 0:
+            offset = _resume(src, dest, offset)
+            if offset > 0:
+                print('Resuming {} from byte {}'.format(src, offset))
+                digest = None
+    if offset == 0:
+        _unlink_dest(dest)
+    with open(src, 'rb') as fsrc:
+        size = os.fstat(fsrc.fileno()).st_size
+        sparse = is_sparse(src)
+        with open(dest, 'r+b' if offset > 0 else 'wb') as fdest:
+            fdest.seek(offset)
+            fdest.truncate()
+            if sparse:
+                ranges = data_ranges(fsrc.fileno(), offset, size)
+            else:
+                ranges = [(offset, size)]
+                preallocate(fdest.fileno(), offset, size - offset)
+            position = offset
+            journaled = offset
+            for start, end in ranges:
+                # holes are not written, but their zeros are part of the digest
+                if digest is not None:
+                    _update_zeros(digest, start - position)
+                fsrc.seek(start)
+                fdest.seek(start)
+                position = start
+                while position < end:
+                    chunk = fsrc.read(min(CHUNK_SIZE, end - position))
+                    if not chunk:
+                        break
+                    if throttle is not None:
+                        throttle(len(chunk))
+                    fdest.write(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+                    nbytes += len(chunk)
+                    position += len(chunk)
+                    if journal is not None and position - journaled >= JOURNAL_INTERVAL:
+                        # the journaled offset must not be ahead of the durable data
+                        fdest.flush()
+                        os.fsync(fdest.fileno())
+                        journaled = position
+                        journal.progress(src, dest, journaled)
+                if position < end:
+                    # the file was truncated while it was copied
+                    size = position
+                    break
+            if digest is not None:
+                _update_zeros(digest, size - position)
+            # a trailing hole, or the preallocated space past a truncated file
+            fdest.truncate(size)
+            if journal is not None:
+                fdest.flush()
+                os.fsync(fdest.fileno())
+    shutil.copymode(src, dest)
+    hexdigest = digest.hexdigest() if digest is not None else None
+    if journal is not None:
+        journal.complete(src, dest, hexdigest)
+    if digests is not None:
+        digests.append((src, dest, hexdigest))
+    return nbytes
+
+
+"""
+destination path of a file: a compressed file is restored without its suffix
+"""
+def _dest_path(src_path, dest_path, compress):
+    if compress == DECOMPRESS and src_path.endswith(compression.SUFFIX) and \
+            not os.path.exists(src_path[:-len(compression.SUFFIX)]):
+        return dest_path[:-len(compression.SUFFIX)]
+    return dest_path
+
+
+def _copy_link(src_path, dest_path):
+    if os.path.lexists(dest_path):
+        os.remove(dest_path)
+    os.symlink(os.readlink(src_path), dest_path)
+
+
+"""
+copies the files of a directory tree over parallel streams
+"""
+def _copy_parallel(src, dest, throttle, digests, journal, compress, fast_path, streams):
+    directories = []
+    files = []
+    for root, dirnames, filenames in os.walk(src):
+        dest_root = os.path.join(dest, os.path.relpath(root, src)) if root != src else dest
+        if not os.path.exists(dest_root):
+            os.makedirs(dest_root)
+        directories.append((root, dest_root))
+        for name in dirnames + filenames:
+            src_path = os.path.join(root, name)
+            dest_path = _dest_path(src_path, os.path.join(dest_root, name), compress)
+            if os.path.islink(src_path):
+                _copy_link(src_path, dest_path)
+            elif name in filenames:
+                files.append((src_path, dest_path))
+
+    def _copy_file(paths):
+        return copy(paths[0], paths[1], throttle, digests, journal, compress, fast_path)
+
+    pool = ThreadPool(processes=min(streams, max(1, len(files))))
+    try:
+        nbytes = sum(pool.map(_copy_file, files))
+    finally:
+        pool.close()
+    for src_dir, dest_dir in reversed(directories):
+        shutil.copymode(src_dir, dest_dir)
+    return nbytes
+
+
+"""
+compresses or decompresses a file while it is moved, and returns the number of
+uncompressed bytes; returns None if the file is to be copied as is
+- a file that the journal records as compressed or decompressed is skipped
+"""
+def _copy_compressed(src, dest, compress, throttle, digests, journal=None):
+    if compress == COMPRESS:
+        with open(src, 'rb') as f:
+            sample = f.read(CHUNK_SIZE)
+        if compression.ratio(sample, _compression_level) >= COMPRESSIBLE_RATIO:
+            # a stale compressed copy would hide the uncompressed one
+            if os.path.exists(dest + compression.SUFFIX):
+                os.remove(dest + compression.SUFFIX)
+            return None
+        stored = dest + compression.SUFFIX
+    elif src.endswith(compression.SUFFIX) and not dest.endswith(compression.SUFFIX):
+        stored = dest
+    else:
+        return None
+
+    if journal is not None:
+        if journal.copied(src, stored):
+            if digests is not None:
+                digests.append((src, stored, journal.digest(src)))
+            return 0
+
+    dest_dir = os.path.dirname(stored)
+    if not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+    _unlink_dest(stored)
+    digest = _new_digest()
+    if compress == COMPRESS:
+        nbytes = compression.compress_file(src, stored, _compression_level, throttle, digest)
+        # a stale uncompressed copy would hide the compressed one
+        if os.path.exists(dest):
+            os.remove(dest)
+    else:
+        nbytes = compression.decompress_file(src, stored, throttle, digest)
+    shutil.copymode(src, stored)
+    if journal is not None:
+        journal.complete(src, stored, digest.hexdigest())
+    if digests is not None:
+        digests.append((src, stored, digest.hexdigest()))
+    return nbytes
+
+
+"""
+combines the file digests of a transfer into the digest of the data object:
+the digest of a file, or the digest of the sorted (relative path, digest) list of a directory
+"""
+def combine_digests(src, digests):
+    if len(digests) == 1 and digests[0][0] == src:
+        return digests[0][2]
+    digest = _new_digest()
+    for src_file, _, file_digest in sorted(digests):
+        relative_path = os.path.relpath(src_file, src)
+        digest.update('{} {}\n'.format(relative_path, file_digest).encode('utf-8'))
+    return digest.hexdigest()
+
+
+"""
+runs a data task through the native data mover within the limits of the transfer scheduler
+- the transfer is journaled under the output directory, and resumes from the journal if
+  the data task was interrupted before
+- the content digests computed during the transfer are recorded in the transfer manifest
+  and the fingerprint store, so that the copies can be verified without reading them again
+- data moved between tiers on the same device is renamed or linked instead of copied,
+  and keeps the fingerprints of the source data
+- the transfer backend of the task sets the number of parallel streams, within the
+  streams the transfer scheduler grants, and may throttle the transfer
+"""
+def transfer(task, scheduler, priority=0):
+    backend = task.backend
+    streams = scheduler.acquire(task, priority, backend.streams)
+    start = time.time()
+    nbytes = 0
+    digest = None
+    compressed_bytes = None
+    method = None
+    journal = None
+    src = task.src.abspath
+    dest = task.dest.abspath
+    try:
+        compress = compression_mode(task)
+        if not os.path.exists(src) and os.path.exists(src + compression.SUFFIX):
+            # the data was stored compressed when it was moved to the slower tier
+            src = src + compression.SUFFIX
+            compress = DECOMPRESS
+
+        def throttle(nbytes):
+            scheduler.throttle(task, nbytes)
+            backend.throttle(nbytes)
+
+        methods = fast_path_methods(task)
+        fast_path = None
+        if len(methods) > 0:
+            # compressing data on the same device does not pay off
+            compress = None
+            fast_path = FastPath([m for m in methods if m != RENAME])
+        journal = TransferJournal(os.path.join(journal_dir, task.__id__ + '.journal'))
+        digests = None
+        if RENAME in methods:
+            fingerprints = storage.load_fingerprints()
+            pairs = _file_pairs(src, dest)
+            nbytes = data_size(src)
+            try:
+                _rename(src, dest)
+                digests = [(s, d, _fingerprint_digest(s, fingerprints)) for s, d in pairs]
+                method = RENAME
+            except OSError as e:
+                print("Renaming {} failed ({}), copying it".format(src, e))
+        if digests is None and task.files is not None:
+            # the directory is partially copied, so it has no digest of its own
+            digests = []
+            nbytes = copy_partial(src, dest, task.files, throttle, digests, journal, fast_path)
+            compress = None
+        elif digests is None:
+            digests = []
+            nbytes = copy(src, dest, throttle, digests, journal, compress, fast_path, streams)
+            if fast_path is not None:
+                method = '+'.join(sorted(fast_path.used.keys()))
+                fingerprints = storage.load_fingerprints()
+                digests = [(s, d, h if h is not None else _fingerprint_digest(s, fingerprints))
+                           for s, d, h in digests]
+        # digests and fingerprints are of the uncompressed data
+        if any([h is None for _, _, h in digests]) or task.files is not None:
+            digest = None
+        elif compress == DECOMPRESS:
+            digest = (combine_digests(dest, [(d, s, h) for s, d, h in digests]), _digest_algorithm)
+        else:
+            digest = (combine_digests(src, digests), _digest_algorithm)
+        fingerprints = {}
+        for src_file, dest_file, file_digest in digests:
+            if file_digest is None:
+                continue
+            if not src_file.endswith(compression.SUFFIX) or dest_file.endswith(compression.SUFFIX):
+                fingerprints[src_file] = (file_digest, _digest_algorithm)
+            if not dest_file.endswith(compression.SUFFIX) or src_file.endswith(compression.SUFFIX):
+                fingerprints[dest_file] = (file_digest, _digest_algorithm)
+        storage.record_fingerprints(fingerprints)
+        if compress is not None:
+            stored_files = [d if compress == COMPRESS else s for s, d, _ in digests]
+            compressed_bytes = sum([os.path.getsize(f) for f in stored_files])
+        if method == RENAME:
+            result = 'Renamed {} bytes: {} -> {}'.format(nbytes, src, dest)
+        else:
+            result = 'Moved {} bytes: {} -> {}'.format(nbytes, src, dest)
+        journal.remove()
+    except Exception as e:
+        # the journal is kept, so that the data task resumes when it is restarted
+        print("Data transfer error:")
+        print(e)
+        result = str(e)
+    finally:
+        if journal is not None:
+            journal.close()
+        scheduler.release(task)
+    scheduler.record(task, nbytes, start, time.time(), digest, compressed_bytes, method)
+    return result
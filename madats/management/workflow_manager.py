@@ -48,7 +48,11 @@ def parse_tasks(tasks):
         if 'name' in info:
             task.name = info['name']
         else:
+            # the name is only displayed: it is the same in every workflow
             task.name = 'task' + str(idx)
+            task.named = False
+        if 'runtime' in info:
+            task.runtime = float(info['runtime'])
         param_vdo_map = {}
         if 'vin' in info:
             for input in info['vin']:
@@ -0,0 +1,119 @@
+"""
+`madats.utils.compression`
+====================================
+
+.. currentmodule:: madats.utils.compression
+
+:platform: Unix, Mac
+:synopsis: Utility module for streaming (de)compression of files with zstd
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import subprocess
+try:
+    from shutil import which
+except ImportError:
+    from distutils.spawn import find_executable as which
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SUFFIX = '.zst'
+CHUNK_SIZE = 4 * 1024 * 1024
+
+"""
+zstd is used through the zstandard module if it is installed, otherwise through
+the zstd command; both use all the cores of the node
+"""
+def available():
+    return zstandard is not None or which('zstd') is not None
+
+
+"""
+ratio of the compressed to the uncompressed size of a data sample
+"""
+def ratio(sample, level=3):
+    if len(sample) == 0:
+        return 1.0
+    if zstandard is not None:
+        compressed = zstandard.ZstdCompressor(level=level).compress(sample)
+    else:
+        proc = subprocess.Popen(['zstd', '-q', '-c', '-' + str(level)],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        compressed, _ = proc.communicate(sample)
+    return float(len(compressed)) / len(sample)
+
+
+"""
+compresses a file into `dest`
+- every chunk of uncompressed data is passed to `throttle` and added to `digest`
+- returns the number of uncompressed bytes
+"""
+def compress_file(src, dest, level=3, throttle=None, digest=None):
+    nbytes = 0
+    with open(src, 'rb') as fsrc:
+        with open(dest, 'wb') as fdest:
+            if zstandard is not None:
+                compressor = zstandard.ZstdCompressor(level=level, threads=-1).compressobj()
+                proc = None
+            else:
+                proc = subprocess.Popen(['zstd', '-T0', '-q', '-c', '-' + str(level)],
+                                        stdin=subprocess.PIPE, stdout=fdest)
+            while True:
+                chunk = fsrc.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if throttle is not None:
+                    throttle(len(chunk))
+                if digest is not None:
+                    digest.update(chunk)
+                if proc is None:
+                    fdest.write(compressor.compress(chunk))
+                else:
+                    proc.stdin.write(chunk)
+                nbytes += len(chunk)
+            if proc is None:
+                fdest.write(compressor.flush())
+            else:
+                proc.stdin.close()
+                if proc.wait() != 0:
+                    raise IOError('zstd failed to compress {}'.format(src))
+    return nbytes
+
+
+"""
+decompresses a file into `dest`
+- every chunk of decompressed data is passed to `throttle` and added to `digest`
+- returns the number of decompressed bytes
+"""
+def decompress_file(src, dest, throttle=None, digest=None):
+    nbytes = 0
+    with open(dest, 'wb') as fdest:
+        if zstandard is not None:
+            fsrc = open(src, 'rb')
+            reader = zstandard.ZstdDecompressor().stream_reader(fsrc)
+            proc = None
+        else:
+            proc = subprocess.Popen(['zstd', '-d', '-q', '-c', src], stdout=subprocess.PIPE)
+            reader = proc.stdout
+        try:
+            while True:
+                chunk = reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if throttle is not None:
+                    throttle(len(chunk))
+                if digest is not None:
+                    digest.update(chunk)
+                fdest.write(chunk)
+                nbytes += len(chunk)
+        finally:
+            reader.close()
+            if proc is None:
+                fsrc.close()
+        if proc is not None and proc.wait() != 0:
+            raise IOError('zstd failed to decompress {}'.format(src))
+    return nbytes
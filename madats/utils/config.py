@@ -25,9 +25,11 @@ class Config():
     def __init__(self, config_file):
         self.__config_file__ = config_file
         
-    def get(self, section, key):
+    def get(self, section, key, default=None):
         config = configparser.ConfigParser()
         config.read(self.__config_file__)
+        if default is not None and not config.has_option(section, key):
+            return default
         value = str(config.get(section, key))
         return value
 
@@ -50,6 +52,21 @@ class PropertyConfig():
         self._short_term = config.get('persistence', 'shortterm')
         self._long_term = config.get('persistence', 'longterm')
         self._fixed_term = config.get('persistence', 'fixedterm')
+        self._prefetch_lookahead = config.get('prefetch', 'lookahead', '1')
+        self._stageout_workers = config.get('stageout', 'workers', '0')
+        self._compression_mode = config.get('compression', 'mode', 'never')
+        self._compression_bandwidth_ratio = config.get('compression', 'bandwidth_ratio', '10')
+        self._compression_level = config.get('compression', 'level', '3')
+        self._cache_eviction = config.get('cache', 'eviction', 'lru')
+        self._cache_size = config.get('cache', 'size', '')
+        self._fast_path = config.get('transfer', 'fast_path', 'true')
+        self._placement_solver = config.get('placement', 'solver', 'greedy')
+        self._placement_split = config.get('placement', 'split', 'none')
+        self._placement_group_size = config.get('placement', 'group_size', '1G')
+        self._eviction_reuse_distance = config.get('eviction', 'reuse_distance', '2')
+        self._auto_candidates = config.get('auto', 'candidates', 'none,wfa,sta,cap')
+        self._replication_fanout = config.get('replication', 'fanout', '64')
+        self._purge_workers = config.get('purge', 'workers', '8')
 
     @property
     def SHORT_TERM(self):
@@ -63,6 +80,66 @@ class PropertyConfig():
     def FIXED_TERM(self):
         return self._fixed_term
 
+    @property
+    def PREFETCH_LOOKAHEAD(self):
+        return self._prefetch_lookahead
+
+    @property
+    def STAGEOUT_WORKERS(self):
+        return self._stageout_workers
+
+    @property
+    def COMPRESSION_MODE(self):
+        return self._compression_mode
+
+    @property
+    def COMPRESSION_BANDWIDTH_RATIO(self):
+        return self._compression_bandwidth_ratio
+
+    @property
+    def COMPRESSION_LEVEL(self):
+        return self._compression_level
+
+    @property
+    def CACHE_EVICTION(self):
+        return self._cache_eviction
+
+    @property
+    def CACHE_SIZE(self):
+        return self._cache_size
+
+    @property
+    def FAST_PATH(self):
+        return self._fast_path
+
+    @property
+    def PLACEMENT_SOLVER(self):
+        return self._placement_solver
+
+    @property
+    def PLACEMENT_SPLIT(self):
+        return self._placement_split
+
+    @property
+    def PLACEMENT_GROUP_SIZE(self):
+        return self._placement_group_size
+
+    @property
+    def EVICTION_REUSE_DISTANCE(self):
+        return self._eviction_reuse_distance
+
+    @property
+    def AUTO_CANDIDATES(self):
+        return self._auto_candidates
+
+    @property
+    def REPLICATION_FANOUT(self):
+        return self._replication_fanout
+
+    @property
+    def PURGE_WORKERS(self):
+        return self._purge_workers
+
     @SHORT_TERM.setter
     def SHORT_TERM(self):
         self._short_term = config.get('persistence', 'shortterm')
@@ -99,6 +176,9 @@ class SchedulerConfig():
         self._directives['memory'] = self._directive_(config, 'directives', 'memory')
         self._directives['cpus'] = self._directive_(config, 'directives', 'cpus')
         self._directives['queue'] = self._directive_(config, 'directives', 'queue')
+        # optional: the scheduler configurations written before node-local tiers have no node list
+        if config.get('directives', 'nodelist', '') != '':
+            self._directives['nodelist'] = self._directive_(config, 'directives', 'nodelist')
         self._directives['error'] = self._directive_(config, 'monitoring', 'error')
         self._directives['output'] = self._directive_(config, 'monitoring', 'output')
         self._directives['jobname'] = self._directive_(config, 'monitoring', 'jobname')
@@ -87,12 +87,18 @@ class Policy(object):
     NONE = 0
     WORKFLOW_AWARE = 1
     STORAGE_AWARE = 2
+    CAPACITY_AWARE = 3
+    CRITICAL_PATH = 4
+    AUTO = 5 # selects the policy with the shortest estimated makespan
+    NODE_LOCAL = 6 # stages in data to the node-local tiers of the nodes that read it
 
     policy_name = {NONE: 'none', WORKFLOW_AWARE: 'wfa',
-                   STORAGE_AWARE: 'sta'}
+                   STORAGE_AWARE: 'sta', CAPACITY_AWARE: 'cap',
+                   CRITICAL_PATH: 'cpa', AUTO: 'auto', NODE_LOCAL: 'nla'}
 
     policy_type = {'none': NONE, 'wfa': WORKFLOW_AWARE,
-                   'sta': STORAGE_AWARE}
+                   'sta': STORAGE_AWARE, 'cap': CAPACITY_AWARE,
+                   'cpa': CRITICAL_PATH, 'auto': AUTO, 'nla': NODE_LOCAL}
 
     @staticmethod
     def name(policy):
@@ -106,6 +112,18 @@ class Policy(object):
     def policies():
         return Policy.policy_name
 
+    '''
+    adds a policy name (e.g., of a site-specific policy) and returns its type; a name
+    that is already known keeps its type
+    '''
+    @staticmethod
+    def register(name):
+        if name not in Policy.policy_type:
+            policy = max(Policy.policy_name.keys()) + 1
+            Policy.policy_name[policy] = name
+            Policy.policy_type[name] = policy
+        return Policy.policy_type[name]
+
 
 """
 test main
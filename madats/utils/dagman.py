@@ -25,6 +25,18 @@ def predecessors(dag, task):
     return pred
 
 
+"""
+returns the predecessors of every task in the workflow DAG ({task: [predecessors]}),
+in the order of `predecessors`
+"""
+def predecessor_map(dag):
+    pred = dict((task, []) for task in dag)
+    for k in dag.keys():
+        for v in dag[k]:
+            pred.setdefault(v, []).append(k)
+    return pred
+
+
 """
 returns the list of successors of a task in the workflow DAG
 """
@@ -140,3 +152,32 @@ def __readjust_bins__(dag, task, max_bins, bins_dict):
         bins_dict[task.bin].append(task)
     else:
         bins_dict[task.bin] = [task]
+
+
+"""
+assigns a level to every task in the workflow DAG: a task's level is the length
+of the longest dependency chain leading to it, so tasks on the same level never
+depend on each other
+- if `counted` is given, only the tasks for which `counted(task)` is true add to
+  the length of a chain (e.g., to count only the compute tasks)
+"""
+def task_levels(dag, counted=None):
+    indegree = {}
+    for task in dag:
+        indegree.setdefault(task, 0)
+        for succ in dag[task]:
+            indegree[succ] = indegree.get(succ, 0) + 1
+
+    levels = dict((task, 0) for task in indegree)
+    ready = deque([task for task in indegree if indegree[task] == 0])
+    while len(ready) != 0:
+        task = ready.popleft()
+        for succ in successors(dag, task):
+            step = 1
+            if counted is not None and not counted(task):
+                step = 0
+            levels[succ] = max(levels[succ], levels[task] + step)
+            indegree[succ] -= 1
+            if indegree[succ] == 0:
+                ready.append(succ)
+    return levels
@@ -0,0 +1,95 @@
+"""
+`madats.utils.hsi`
+====================================
+
+.. currentmodule:: madats.utils.hsi
+
+:platform: Unix, Mac
+:synopsis: Utility module for building and querying HSI (HPSS archive) sessions
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import os
+import subprocess
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+GET = 'get'
+PUT = 'put'
+
+"""
+quotes a path for an HSI command, so that spaces and separators stay in the path
+"""
+def quote_path(path):
+    return '"{}"'.format(path.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+"""
+builds the shell command that runs an HSI session, with the session quoted for the shell
+"""
+def hsi_command(session):
+    return 'hsi -q {}'.format(quote('; '.join(session)))
+
+
+"""
+builds a shell command that runs a list of archive requests in a single HSI session
+- each request is a tuple (operation, local path, archive path)
+- requests are issued in the given order, so the caller decides the recall order
+- gets and puts are recursive, so that directory VDOs are copied with all their files
+"""
+def session_command(requests):
+    local_dirs = []
+    session = ['prompt']
+    for op, local_path, archive_path in requests:
+        if op == GET:
+            local_dir = os.path.dirname(local_path)
+            if local_dir not in local_dirs:
+                local_dirs.append(local_dir)
+            session.append('get -R {} : {}'.format(quote_path(local_path), quote_path(archive_path)))
+        elif op == PUT:
+            session.append('mkdir -p {}'.format(quote_path(os.path.dirname(archive_path))))
+            session.append('put -R {} : {}'.format(quote_path(local_path), quote_path(archive_path)))
+
+    command = hsi_command(session)
+    if len(local_dirs) > 0:
+        command = 'mkdir -p {}; {}'.format(' '.join([quote(d) for d in local_dirs]), command)
+    return command
+
+
+"""
+queries the tape volume and position of archive files in a single HSI session
+- returns a dictionary {path: (volume, section, offset)}; files that are not on
+  tape (or if the archive can not be queried) are left out
+"""
+def query_volumes(paths):
+    volumes = {}
+    if len(paths) == 0:
+        return volumes
+
+    command = hsi_command(['ls -P {}'.format(' '.join([quote_path(p) for p in paths]))])
+    try:
+        output = subprocess.check_output([command], shell=True, stderr=subprocess.STDOUT)
+    except Exception as e:
+        print("HSI volume query error:")
+        print(e)
+        return volumes
+
+    if not isinstance(output, str):
+        output = output.decode('utf-8', 'replace')
+    for line in output.splitlines():
+        # FILE <path> <size> <bytes-at-level> <section>+<offset> <volume> ...
+        fields = line.split()
+        if len(fields) < 6 or fields[0] != 'FILE':
+            continue
+        position = fields[4].split('+')
+        try:
+            section = int(position[0])
+            offset = int(position[1]) if len(position) > 1 else 0
+        except ValueError:
+            continue
+        volumes[fields[1]] = (fields[5], section, offset)
+    return volumes
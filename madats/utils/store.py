@@ -0,0 +1,106 @@
+"""
+`madats.utils.store`
+====================================
+
+.. currentmodule:: madats.utils.store
+
+:platform: Unix, Mac
+:synopsis: Utility module providing persistent stores shared across workflow runs
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import os
+import json
+import fcntl
+import threading
+
+store_dir = os.path.expandvars('$MADATS_HOME/store')
+
+class JsonStore(object):
+    """
+    A dictionary that is persisted as a JSON file under $MADATS_HOME/store, or under
+    another `directory`
+    - updates are serialized through a file lock, so that concurrent workflows
+      (and threads of the same workflow) can share the store
+    """
+
+    def __init__(self, name, directory=None):
+        if directory is None:
+            directory = store_dir
+        self._path = os.path.join(directory, name + '.json')
+        self._lock_path = self._path + '.lock'
+        self._thread_lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path
+
+    def _lock(self, mode):
+        directory = os.path.dirname(self._path)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # created by another workflow in the meantime
+                pass
+        lock_file = open(self._lock_path, 'a')
+        fcntl.flock(lock_file, mode)
+        return lock_file
+
+    def _unlock(self, lock_file):
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+    def _read(self):
+        if not os.path.exists(self._path):
+            return {}
+        with open(self._path, 'r') as f:
+            try:
+                return json.load(f)
+            except ValueError:
+                print('Invalid store {}, resetting it'.format(self._path))
+                return {}
+
+    def _write(self, data):
+        tmp_path = self._path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp_path, self._path)
+
+    """
+    returns a snapshot of the store
+    """
+    def load(self):
+        self._thread_lock.acquire()
+        lock_file = self._lock(fcntl.LOCK_SH)
+        try:
+            return self._read()
+        finally:
+            self._unlock(lock_file)
+            self._thread_lock.release()
+
+    def get(self, key, default=None):
+        return self.load().get(key, default)
+
+    """
+    atomically updates the store: `update_func` gets the current dictionary,
+    modifies it in place and can return a value that is passed back to the caller
+    """
+    def update(self, update_func):
+        self._thread_lock.acquire()
+        lock_file = self._lock(fcntl.LOCK_EX)
+        try:
+            data = self._read()
+            result = update_func(data)
+            self._write(data)
+            return result
+        finally:
+            self._unlock(lock_file)
+            self._thread_lock.release()
+
+    def put(self, key, value):
+        def _put(data):
+            data[key] = value
+        self.update(_put)
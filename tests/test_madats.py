@@ -17,6 +17,8 @@ import os
 import sys
 import shutil
 import madats
+from madats.core import storage
+from madats.management import history_manager
 import random
 import string
 import yaml
@@ -42,6 +44,9 @@ class Tester():
             os.makedirs(self.archive)
 
         self.__setup_storage_config__()
+        # the test runs are recorded in a run history of their own
+        self.run_history = history_manager.run_history
+        history_manager.run_history = history_manager.RunHistory(directory=os.path.join(self.workdir, 'store'))
         
 
     def __setup_storage_config__(self):
@@ -60,6 +65,7 @@ class Tester():
 
 
     def teardown(self):
+        history_manager.run_history = self.run_history
         if os.path.exists(self.workdir):
             shutil.rmtree(self.workdir)
         pass
@@ -529,6 +535,9 @@ class Tester():
         output = self.__get_file_data__(files[3])
         input = ''.join(strdata)
         assert("{}".format(input) == output)
+        # the fingerprints of the removed copies are dropped
+        fingerprints = storage.load_fingerprints()
+        assert(stagein1 not in fingerprints and stagein2 not in fingerprints)
 
     
     '''
@@ -1013,3 +1022,50 @@ class Tester():
         #print(input_strs, output)
         assert("{}".format(input) == output)
 
+
+
+    '''
+    TEST-16: Plan only the tasks and VDOs added to a VDS after its data movement was planned
+    '''
+    def test_incremental_planning(self):
+        test_name = 'test_incremental_planning'
+        datadir = os.path.join(self.scratch, test_name)
+        if not os.path.exists(datadir):
+            os.makedirs(datadir)
+        files = [os.path.join(datadir, f) for f in ['in1', 'inout1', 'out1']]
+        strdata = self.__get_random_string__()
+        self.__create_file__(files[0], strdata)
+
+        vds = madats.VirtualDataSpace()
+        vds.strategy = madats.Policy.STORAGE_AWARE
+        vdo1 = vds.map(files[0])
+        vdo2 = vds.map(files[1])
+        task1 = madats.Task(command='cat')
+        task1.params = [vdo1, '>', vdo2]
+        vdo1.add_consumer(task1)
+        vdo2.add_producer(task1)
+        madats.get_workflow_dag(vds)
+        assert(vds.planned)
+        assert(vds.lookup('data_movements') == 2)
+
+        # a task is added to the planned workflow, reading a planned VDO
+        vdo3 = vds.map(files[2])
+        task2 = madats.Task(command='cat')
+        task2.params = [vds.map(files[1]), '>', vdo3]
+        vds.map(files[1]).add_consumer(task2)
+        vdo3.add_producer(task2)
+        added, tasks = vds.changes()
+        assert(added == [vdo3])
+        assert(list(tasks.keys()) == [vdo2])
+
+        madats.manage(vds)
+        intfile = os.path.join(self.burst, test_name, 'inout1')
+        finalout = os.path.join(self.burst, test_name, 'out1')
+        # the new task reads the intermediate data from the burst buffer, and only its
+        # output is newly staged out
+        assert(task2.params[0].abspath == intfile)
+        assert(task2.params[2].abspath == finalout)
+        assert(vds.lookup('data_movements') == 3)
+        assert(vds.changes() == ([], {}))
+        assert(os.path.exists(finalout))
+        assert(self.__get_file_data__(files[2]) == strdata)
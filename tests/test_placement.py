@@ -0,0 +1,617 @@
+"""
+`tests.test_placement`
+====================================
+
+.. currentmodule:: tests.test_placement
+
+:platform: Unix, Mac
+:synopsis: Unit test module for placing data on storage tiers
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import pytest
+import os
+import sys
+import shutil
+import madats
+import random
+import string
+import yaml
+from madats.core import storage
+from madats.utils.constants import TaskType
+from madats.utils.config import property_config
+from madats.management import placement, eviction_manager, transfer_manager, replication_manager, execution_manager
+from madats.management import history_manager
+from madats.core.scheduler import Scheduler
+
+class Tester():
+    def setup(self):
+        if 'MADATS_HOME' in os.environ:
+            pass
+        else:
+            print('MADATS_HOME is not set!')
+            sys.exit()
+        madats_home = os.path.expandvars('$MADATS_HOME')
+        self.workdir = os.path.join(madats_home, '_tmp')
+        self.scratch = os.path.join(self.workdir, 'scratch')
+        self.burst = os.path.join(self.workdir, 'burst')
+        self.archive = os.path.join(self.workdir, 'archive')
+
+        if not os.path.exists(self.scratch):
+            os.makedirs(self.scratch)
+        if not os.path.exists(self.burst):
+            os.makedirs(self.burst)
+        if not os.path.exists(self.archive):
+            os.makedirs(self.archive)
+
+        self.__setup_storage_config__()
+        # the test runs are recorded in a run history of their own
+        self.run_history = history_manager.run_history
+        history_manager.run_history = history_manager.RunHistory(directory=os.path.join(self.workdir, 'store'))
+
+
+    def __setup_storage_config__(self):
+        storage_config = {'system': 'test'}
+        storage_config['test'] = {}
+        storage_tiers = {'scratch': [self.scratch, 'ShortTerm', 700],
+                         'burst': [self.burst, 'None', 1600],
+                         'archive': [self.archive, 'LongTerm', 1]}
+        for k in storage_tiers:
+            storage_config['test'][k] = {'mount': storage_tiers[k][0],
+                                         'persist': storage_tiers[k][1],
+                                         'bandwidth': storage_tiers[k][2]}
+
+        storage_yaml = os.path.expandvars('$MADATS_HOME/config/storage.yaml')
+        self.__write_yaml__(storage_config, storage_yaml)
+
+
+    def teardown(self):
+        history_manager.run_history = self.run_history
+        storage.get_storage_tiers()['burst'].pop('capacity', None)
+        if os.path.exists(self.workdir):
+            shutil.rmtree(self.workdir)
+        pass
+
+
+    def __create_file__(self, filepath, size):
+        with open(filepath, 'w') as f:
+            f.write(''.join([random.choice(string.ascii_letters) for n in range(size)]))
+
+
+    def __write_yaml__(self, data, yaml_file):
+        with open(yaml_file, 'w') as f:
+            yaml.dump(data, f, default_flow_style=False)
+
+
+    def __create_vds__(self, test_name):
+        '''
+        inputs on scratch that are read by independent tasks:
+        - A: 4KB read by 3 tasks
+        - B: 4KB read by 1 task, which is not worth staging in
+        - C: 2KB read by 4 tasks
+        '''
+        datadir = os.path.join(self.scratch, test_name)
+        if not os.path.exists(datadir):
+            os.makedirs(datadir)
+        inputs = {'A': (4096, 3), 'B': (4096, 1), 'C': (2048, 4)}
+
+        vds = madats.VirtualDataSpace()
+        vdos = {}
+        for name in sorted(inputs):
+            size, readers = inputs[name]
+            path = os.path.join(datadir, name)
+            self.__create_file__(path, size)
+            vdo = madats.VirtualDataObject(path)
+            for i in range(readers):
+                vdo_out = madats.VirtualDataObject(os.path.join(datadir, '{}.out{}'.format(name, i)))
+                task = madats.Task(command='cat')
+                task.params = [vdo, '>', vdo_out]
+                vdo.consumers.append(task)
+                vdo_out.producers = [task]
+                vds.add(vdo_out)
+            vds.add(vdo)
+            vdos[name] = vdo
+        return vds, vdos
+
+    '''
+    TEST-1: Place the data that saves the most I/O time per byte within the capacity of a tier
+    '''
+    def test_capacity_aware_placement(self):
+        vds, vdos = self.__create_vds__('test_capacity_aware_placement')
+        storage.get_storage_tiers()['burst']['capacity'] = 5 * 1024
+
+        chosen = placement.plan_capacity_aware(vds, solver=placement.GREEDY)
+        placed = [p.vdo for p in chosen]
+        assert(vdos['C'] in placed)
+        assert(vdos['A'] not in placed)
+        assert(vdos['B'] not in placed)
+        assert(all([p.tier == 'burst' for p in chosen]))
+
+
+    '''
+    TEST-2: Place all the data worth moving when a tier has no capacity limit
+    '''
+    def test_unbounded_placement(self):
+        vds, vdos = self.__create_vds__('test_unbounded_placement')
+
+        chosen = placement.plan_capacity_aware(vds, solver=placement.GREEDY)
+        placed = [p.vdo for p in chosen]
+        assert(vdos['A'] in placed)
+        assert(vdos['C'] in placed)
+        assert(vdos['B'] not in placed)
+
+
+    '''
+    TEST-3: Share the capacity of a tier between data used at different times
+    '''
+    def test_capacity_over_time(self):
+        profile = placement.CapacityProfile(['burst'], 3)
+        profile._capacity['burst'] = 4096
+        profile.reserve('burst', 4096, 0, 1)
+        assert(not profile.fits('burst', 1024, 1, 2))
+        assert(profile.fits('burst', 4096, 2, 2))
+        profile.release('burst', 4096, 0, 1)
+        assert(profile.fits('burst', 4096, 0, 2))
+
+
+    '''
+    TEST-4: Manage a workflow with the capacity-aware policy
+    '''
+    def test_capacity_aware_policy(self):
+        test_name = 'test_capacity_aware_policy'
+        vds, vdos = self.__create_vds__(test_name)
+        vds.strategy = madats.Policy.CAPACITY_AWARE
+        storage.get_storage_tiers()['burst']['capacity'] = 5 * 1024
+
+        madats.manage(vds)
+
+        datadir = os.path.join(self.scratch, test_name)
+        for name, readers in [('A', 3), ('B', 1), ('C', 4)]:
+            for i in range(readers):
+                assert(os.path.exists(os.path.join(datadir, '{}.out{}'.format(name, i))))
+        assert(os.path.exists(os.path.join(self.burst, test_name, 'C')))
+        assert(not os.path.exists(os.path.join(self.burst, test_name, 'A')))
+        assert(not os.path.exists(os.path.join(self.burst, test_name, 'B')))
+
+
+    def __create_chain__(self, vds, datadir, name, size, runtime):
+        '''
+        a chain of two tasks: `<name>.0` runs for 1s, and then `<name>.1` reads the
+        input <name> and runs for `runtime` seconds
+        '''
+        path = os.path.join(datadir, name)
+        with open(path, 'w') as f:
+            f.write('x' * size)
+        vdo = madats.VirtualDataObject(path)
+        first = madats.Task(command='touch')
+        first.runtime = 1
+        vdo_tmp = madats.VirtualDataObject(os.path.join(datadir, name + '.tmp'))
+        first.params = [vdo_tmp]
+        vdo_tmp.producers = [first]
+        second = madats.Task(command='cat')
+        second.runtime = runtime
+        vdo_out = madats.VirtualDataObject(os.path.join(datadir, name + '.out'))
+        second.params = [vdo, vdo_tmp, '>', vdo_out]
+        vdo.consumers = [second]
+        vdo_tmp.consumers = [second]
+        vdo_out.producers = [second]
+        for v in [vdo, vdo_tmp, vdo_out]:
+            vds.add(v)
+        return vdo, first, second
+
+    '''
+    TEST-5: Give the fastest tier to the data of the critical path first
+    '''
+    def test_critical_path_placement(self):
+        datadir = os.path.join(self.scratch, 'test_critical_path_placement')
+        os.makedirs(datadir)
+        vds = madats.VirtualDataSpace()
+        vdo_a, _, _ = self.__create_chain__(vds, datadir, 'A', 64 * 1024, 5)
+        vdo_b, _, _ = self.__create_chain__(vds, datadir, 'B', 64 * 1024, 1)
+        storage.get_storage_tiers()['burst']['capacity'] = 64 * 1024
+
+        chosen = placement.plan_critical_path(vds)
+        assert([p.vdo for p in chosen] == [vdo_a])
+        assert(chosen[0].tier == 'burst')
+        assert(chosen[0].value > 0)
+
+
+    '''
+    TEST-6: Recompute the critical path after each placement
+    '''
+    def test_critical_path_recompute(self):
+        datadir = os.path.join(self.scratch, 'test_critical_path_recompute')
+        os.makedirs(datadir)
+        vds = madats.VirtualDataSpace()
+        vdo_a, _, _ = self.__create_chain__(vds, datadir, 'A', 2 * 1024 * 1024, 1)
+        vdo_b, _, _ = self.__create_chain__(vds, datadir, 'B', 1536 * 1024, 1)
+
+        chosen = placement.plan_critical_path(vds)
+        # A is on the critical path until it is placed, and then B is
+        assert([p.vdo for p in chosen] == [vdo_a, vdo_b])
+
+
+    def __create_reuse_workflow__(self, datadir):
+        '''
+        a chain of tasks that read the input A at the first and the last level:
+        cat A > O1; cat O1 > O2; cat O2 > O3; cat A O3 > O4
+        '''
+        path = os.path.join(datadir, 'A')
+        self.__create_file__(path, 4096)
+        vds = madats.VirtualDataSpace()
+        vdo_a = madats.VirtualDataObject(path)
+        vds.add(vdo_a)
+        previous = None
+        for i in range(1, 5):
+            vdo_out = madats.VirtualDataObject(os.path.join(datadir, 'O' + str(i)))
+            task = madats.Task(command='cat')
+            inputs = [v for v in [vdo_a if i in [1, 4] else None, previous] if v is not None]
+            task.params = inputs + ['>', vdo_out]
+            for vdo in inputs:
+                vdo.consumers.append(task)
+            vdo_out.producers = [task]
+            vds.add(vdo_out)
+            previous = vdo_out
+        return vds, vdo_a
+
+    '''
+    TEST-7: Evict data that is used again much later before the peak occupancy of a tier
+    '''
+    def test_reuse_distance_eviction(self):
+        datadir = os.path.join(self.scratch, 'test_reuse_distance_eviction')
+        os.makedirs(datadir)
+        vds, vdo_a = self.__create_reuse_workflow__(datadir)
+        vds.auto_cleanup = True
+        madats.dm_storage_aware(vds)
+
+        occupancy = eviction_manager.plan_evictions(vds, reuse_distance=2)
+        # A is evicted from the burst buffer while O1, O2 and O3 are used
+        assert(occupancy.usage['burst'][:4] == [8192, 8192, 8192, 8192])
+
+        # a VDO is not evicted at a level that uses it
+        resident = eviction_manager.Residency(vdo_a, 4096, [0, 1, 5])
+        assert(resident.gap(1) is None)
+        assert(resident.gap(3) == (1, 5))
+
+
+    '''
+    TEST-8: Restore evicted data before its next use
+    '''
+    def test_eviction_restore(self):
+        datadir = os.path.join(self.scratch, 'test_eviction_restore')
+        os.makedirs(datadir)
+        vds, vdo_a = self.__create_reuse_workflow__(datadir)
+        vds.auto_cleanup = True
+        vds.strategy = madats.Policy.STORAGE_AWARE
+        with open(vdo_a.abspath, 'r') as f:
+            data = f.read()
+
+        # data is only evicted between its uses from tiers with a capacity
+        burst = storage.get_storage_tiers()['burst']
+        burst['capacity'] = 1024 * 1024 * 1024
+        try:
+            madats.manage(vds)
+        finally:
+            del burst['capacity']
+
+        with open(os.path.join(datadir, 'O4'), 'r') as f:
+            assert(f.read() == data + data)
+        assert(not os.path.exists(os.path.join(self.burst, 'test_eviction_restore', 'A')))
+
+
+    '''
+    TEST-9: Move data through an intermediate tier when the direct link is slower
+    '''
+    def test_cascaded_route(self):
+        tiers = storage.get_storage_tiers()
+        assert(placement.route(4 * 1024 * 1024, 'archive', 'burst')[0] == [])
+        tiers['archive']['links'] = {'burst': {'max_rate': 0.1}}
+        try:
+            hops, seconds = placement.route(4 * 1024 * 1024, 'archive', 'burst')
+            direct = placement.hop_time(4 * 1024 * 1024, 'archive', 'burst')
+            # the intermediate copy would not be reserved on a tier with a capacity
+            tiers['scratch']['capacity'] = 1024 * 1024 * 1024
+            assert(placement.route(4 * 1024 * 1024, 'archive', 'burst')[0] == [])
+        finally:
+            tiers['archive'].pop('links')
+            tiers['scratch'].pop('capacity', None)
+        assert(hops == ['scratch'])
+        assert(seconds < direct)
+
+
+    '''
+    TEST-10: Chain the data tasks of a cascaded stage-in and stage-out
+    '''
+    def test_cascaded_transfers(self):
+        datadir = os.path.join(self.archive, 'test_cascaded_transfers')
+        os.makedirs(datadir)
+        path = os.path.join(datadir, 'A')
+        self.__create_file__(path, 1024)
+        vds = madats.VirtualDataSpace()
+        vdo_a = madats.VirtualDataObject(path)
+        vdo_out = madats.VirtualDataObject(os.path.join(datadir, 'A.out'))
+        task = madats.Task(command='cat')
+        task.params = [vdo_a, '>', vdo_out]
+        vdo_a.consumers = [task]
+        vdo_out.producers = [task]
+        vds.add(vdo_a)
+        vds.add(vdo_out)
+
+        vdo_in = vds.cascade(vdo_a, 'burst', ['scratch'])
+        vdo_res = vds.cascade(vdo_out, 'burst', ['scratch'])
+        assert(task.params == [vdo_in, '>', vdo_res])
+        stage_in = vdo_in.producers[0]
+        assert(stage_in.src.storage_id == 'scratch' and stage_in.dest is vdo_in)
+        assert(stage_in.src.producers[0].src is vdo_a)
+        stage_out = vdo_out.producers[0]
+        assert(stage_out.src.storage_id == 'scratch' and stage_out.dest is vdo_out)
+        assert(stage_out.src.producers[0].src is vdo_res)
+        assert(all([transfer_manager.is_stage_in(t) for t in [stage_in, stage_in.src.producers[0]]]))
+        assert(all([transfer_manager.is_stage_out(t) for t in [stage_out, stage_out.src.producers[0]]]))
+
+
+    '''
+    TEST-11: Place hot data on the fastest tier and warm data on a slower tier when
+    the fastest tier is full
+    '''
+    def test_multi_tier_placement(self):
+        test_name = 'test_multi_tier_placement'
+        datadir = os.path.join(self.archive, test_name)
+        os.makedirs(datadir)
+        input_path = os.path.join(self.scratch, test_name, 'I')
+        os.makedirs(os.path.dirname(input_path))
+        self.__create_file__(input_path, 4096)
+        vds = madats.VirtualDataSpace()
+        vdo_i = madats.VirtualDataObject(input_path)
+        vds.add(vdo_i)
+        # T0 writes the hot data H, read by 3 tasks, and the warm data W, read by 1 task
+        vdo_h = madats.VirtualDataObject(os.path.join(datadir, 'H'))
+        vdo_w = madats.VirtualDataObject(os.path.join(datadir, 'W'))
+        task = madats.Task(command='cp')
+        task.params = [vdo_i, vdo_h, ';', 'cp', vdo_i, vdo_w]
+        vdo_i.consumers = [task]
+        vdo_h.producers = [task]
+        vdo_w.producers = [task]
+        for name, vdo, readers in [('H', vdo_h, 3), ('W', vdo_w, 1)]:
+            for i in range(readers):
+                vdo_out = madats.VirtualDataObject(os.path.join(self.scratch, test_name, '{}.out{}'.format(name, i)))
+                reader = madats.Task(command='cat')
+                reader.params = [vdo, '>', vdo_out]
+                vdo.consumers.append(reader)
+                vdo_out.producers = [reader]
+                vds.add(vdo_out)
+        vds.add(vdo_h)
+        vds.add(vdo_w)
+        vds.strategy = madats.Policy.CAPACITY_AWARE
+        storage.get_storage_tiers()['burst']['capacity'] = 4096
+
+        madats.manage(vds)
+
+        assert(os.path.exists(os.path.join(self.burst, test_name, 'H')))
+        assert(os.path.exists(os.path.join(self.scratch, test_name, 'W')))
+        assert(not os.path.exists(os.path.join(datadir, 'H')))
+        assert(not os.path.exists(os.path.join(datadir, 'W')))
+        for name, readers in [('H', 3), ('W', 1)]:
+            for i in range(readers):
+                assert(os.path.exists(os.path.join(self.scratch, test_name, '{}.out{}'.format(name, i))))
+
+
+    '''
+    TEST-12: Spread the readers of the staged copy of an input over replicas inferred
+             from their number
+    '''
+    def test_replica_fanout(self):
+        vds, vdos = self.__create_vds__('test_replica_fanout')
+        vdos['A'].replication = 3
+
+        # inputs that were not moved are not replicated
+        assert(replication_manager.plan_replicas(vds, fanout=2) == {})
+
+        staged = dict((name, vds.copy(vdos[name], 'burst')) for name in ['A', 'C'])
+        replicated = replication_manager.plan_replicas(vds, fanout=2)
+        assert(len(replicated[staged['A']]) == 2)
+        assert(len(replicated[staged['C']]) == 1)
+        assert(set(replicated) == set(staged.values()))
+        replica = replicated[staged['C']][0]
+        assert(replica.storage_id == 'burst')
+        assert(replica.abspath == os.path.join(self.burst, '.replica1', staged['C'].relative_path))
+        readers = [t for t in replica.consumers if t.type == TaskType.COMPUTE]
+        assert(len(readers) == 2)
+        assert(all([replica in t.params and staged['C'] not in t.params for t in readers]))
+        assert(len([t for t in staged['C'].consumers if t.type == TaskType.COMPUTE]) == 2)
+
+
+    '''
+    TEST-13: Read replicas of staged-in data and remove them afterwards
+    '''
+    def test_replicated_input(self):
+        test_name = 'test_replicated_input'
+        vds, vdos = self.__create_vds__(test_name)
+        vds.auto_cleanup = True
+        vds.strategy = madats.Policy.STORAGE_AWARE
+        vdos['C'].replication = 2
+        with open(vdos['C'].abspath, 'r') as f:
+            data = f.read()
+
+        madats.manage(vds)
+
+        datadir = os.path.join(self.scratch, test_name)
+        for i in range(4):
+            with open(os.path.join(datadir, 'C.out{}'.format(i)), 'r') as f:
+                assert(f.read() == data)
+        assert(not os.path.exists(os.path.join(self.burst, test_name, 'C')))
+        assert(not os.path.exists(os.path.join(self.burst, '.replica1', test_name, 'C')))
+        assert(not os.path.exists(os.path.join(self.scratch, test_name, 'C.replica1')))
+
+
+    '''
+    TEST-14: Place the groups of files of a directory that fit in the capacity of a tier
+    '''
+    def test_partial_directory(self):
+        test_name = 'test_partial_directory'
+        datadir = os.path.join(self.scratch, test_name)
+        dirpath = os.path.join(datadir, 'D')
+        os.makedirs(os.path.join(dirpath, 'sub'))
+        for name in ['f0', 'f1', 'f2', os.path.join('sub', 'f3')]:
+            self.__create_file__(os.path.join(dirpath, name), 4096)
+        data = ''
+        for name in ['f0', os.path.join('sub', 'f3')]:
+            with open(os.path.join(dirpath, name), 'r') as f:
+                data += f.read()
+        vds = madats.VirtualDataSpace()
+        vdo_dir = madats.VirtualDataObject(dirpath)
+        for i in range(3):
+            vdo_out = madats.VirtualDataObject(os.path.join(datadir, 'out' + str(i)))
+            task = madats.Task(command='cd')
+            task.params = [vdo_dir, '&&', 'cat', 'f0', 'sub/f3', '>', vdo_out]
+            vdo_dir.consumers.append(task)
+            vdo_out.producers = [task]
+            vds.add(vdo_out)
+        vds.add(vdo_dir)
+        vds.strategy = madats.Policy.CAPACITY_AWARE
+        storage.get_storage_tiers()['burst']['capacity'] = 8192
+
+        groups = placement.split_directory(dirpath, 8192)
+        assert([len(g.files) for g in groups] == [2, 2])
+        chosen = placement.plan_capacity_aware(vds, placement.GREEDY, placement.SPLIT_SIZE, 4096)
+        assert(len(chosen) == 2 and all([p.group.total == 4 for p in chosen]))
+        assert(placement.plan_capacity_aware(vds, placement.GREEDY, placement.SPLIT_NONE) == [])
+
+        default_split = property_config._placement_split
+        default_group_size = property_config._placement_group_size
+        property_config._placement_split = placement.SPLIT_SIZE
+        property_config._placement_group_size = '4K'
+        try:
+            madats.manage(vds)
+        finally:
+            property_config._placement_split = default_split
+            property_config._placement_group_size = default_group_size
+
+        burst_dir = os.path.join(self.burst, test_name, 'D')
+        files = [os.path.join(burst_dir, name) for name in ['f0', 'f1', 'f2', os.path.join('sub', 'f3')]]
+        assert(all([os.path.exists(f) for f in files]))
+        assert(len([f for f in files if os.path.islink(f)]) == 2)
+        for i in range(3):
+            with open(os.path.join(datadir, 'out' + str(i)), 'r') as f:
+                assert(f.read() == data)
+
+        # a later copy replaces the links to the source instead of writing through them
+        with open(os.path.join(dirpath, 'f1'), 'r') as f:
+            f1_data = f.read()
+        copydir = os.path.join(datadir, 'copy')
+        transfer_manager.copy_partial(dirpath, copydir, ['f0'])
+        assert(os.path.islink(os.path.join(copydir, 'f1')))
+        transfer_manager.copy(dirpath, copydir)
+        assert(not os.path.islink(os.path.join(copydir, 'f1')))
+        for path in [os.path.join(dirpath, 'f1'), os.path.join(copydir, 'f1')]:
+            with open(path, 'r') as f:
+                assert(f.read() == f1_data)
+
+
+    '''
+    TEST-15: Predict the size of intermediate data and the runtime of tasks from a previous run
+    '''
+    def test_run_history(self):
+        datadir = os.path.join(self.scratch, 'test_run_history')
+        os.makedirs(datadir)
+        input_path = os.path.join(datadir, 'I')
+        output_path = os.path.join(datadir, 'O')
+        self.__create_file__(input_path, 8192)
+
+        def create_vds():
+            vds = madats.VirtualDataSpace()
+            vdo_in = madats.VirtualDataObject(input_path)
+            vdo_out = madats.VirtualDataObject(output_path)
+            task = madats.Task(command='sleep 0.2; cat')
+            task.params = [vdo_in, vdo_in, vdo_in, '>', vdo_out]
+            vdo_in.consumers = [task]
+            vdo_out.producers = [task]
+            vds.add(vdo_in)
+            vds.add(vdo_out)
+            return vds, vdo_out, task
+
+        vds, vdo_out, task = create_vds()
+        madats.manage(vds)
+        assert(os.path.getsize(output_path) == 3 * 8192)
+
+        # the next run of the workflow is planned with the observed size and runtime
+        os.remove(output_path)
+        vds, vdo_out, task = create_vds()
+        assert(placement.estimate_size(vdo_out) == 3 * 8192)
+        assert(placement.compute_time(task) >= 0.2)
+
+        # the runtime of a task submitted to a batch scheduler includes its queue wait
+        runtime = placement.compute_time(task)
+        task.scheduler = Scheduler.SLURM
+        recorder = history_manager.RunRecorder()
+        recorder.observe(task, 0, 1000)
+        recorder.flush(history_manager.run_history)
+        assert(placement.compute_time(task) == runtime)
+
+        # the names given to unnamed tasks of a workflow description do not identify them
+        task.name = 'task0'
+        assert(history_manager.task_key(task) == 'task0|' + task.command)
+        task.named = False
+        assert(history_manager.task_key(task).startswith(task.command + '|' + input_path))
+
+
+    '''
+    TEST-16: Stage in inputs to the node-local tiers of simulated nodes, and run their readers there
+    '''
+    def test_node_local(self):
+        test_name = 'test_node_local'
+        datadir = os.path.join(self.scratch, test_name)
+        os.makedirs(datadir)
+        local = os.path.join(self.workdir, 'local', '{node}')
+        tiers = storage.add_tier('local', {'mount': local, 'type': 'node-local', 'nodes': 2,
+                                           'bandwidth': 3000, 'persist': 'None'})
+        try:
+            assert(tiers == ['local@node0', 'local@node1'])
+            assert(storage.get_node('local@node1') == 'node1')
+            assert(storage.get_selected_storage() == 'burst')
+
+            # the first task reads two inputs, which are placed on the same node
+            vds = madats.VirtualDataSpace()
+            vds.strategy = madats.Policy.NODE_LOCAL
+            readers = {'task0': ['A', 'B'], 'task1': ['C'], 'task2': ['D']}
+            vdos = {}
+            tasks = {}
+            for name in sorted(readers):
+                inputs = []
+                for f in readers[name]:
+                    path = os.path.join(datadir, f)
+                    self.__create_file__(path, 2048)
+                    vdos[f] = madats.VirtualDataObject(path)
+                    inputs.append(vdos[f])
+                vdo_out = madats.VirtualDataObject(os.path.join(datadir, name + '.out'))
+                task = madats.Task(command='cat')
+                task.params = inputs + ['>', vdo_out]
+                for vdo in inputs:
+                    vdo.consumers.append(task)
+                    vds.add(vdo)
+                vdo_out.producers = [task]
+                vds.add(vdo_out)
+                tasks[name] = task
+
+            madats.manage(vds)
+            # 4KB on one node, and 2KB + 2KB on the other
+            assert(tasks['task0'].node != tasks['task1'].node)
+            assert(tasks['task1'].node == tasks['task2'].node)
+            for name in readers:
+                node = tasks[name].node
+                for f in readers[name]:
+                    assert(os.path.exists(os.path.join(self.workdir, 'local', node, test_name, f)))
+                assert(os.path.getsize(os.path.join(datadir, name + '.out')) == 2048 * len(readers[name]))
+
+            # a batch job runs on the node of its data
+            task = madats.Task(command='hostname')
+            task.scheduler = Scheduler.SLURM
+            task.node = 'node1'
+            execution_manager._script_dir = self.workdir
+            with open(execution_manager.generate_script(task)) as f:
+                assert('#SBATCH --nodelist=node1' in f.read())
+        finally:
+            storage.remove_tier('local')
+        assert(storage.get_node_tiers() == {})
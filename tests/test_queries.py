@@ -17,6 +17,7 @@ import os
 import sys
 import shutil
 import madats
+from madats.management import history_manager
 import random
 import string
 import yaml
@@ -42,6 +43,9 @@ class Tester():
             os.makedirs(self.archive)
 
         self.__setup_storage_config__()
+        # the test runs are recorded in a run history of their own
+        self.run_history = history_manager.run_history
+        history_manager.run_history = history_manager.RunHistory(directory=os.path.join(self.workdir, 'store'))
         
 
     def __setup_storage_config__(self):
@@ -60,6 +64,7 @@ class Tester():
 
 
     def teardown(self):
+        history_manager.run_history = self.run_history
         if os.path.exists(self.workdir):
             shutil.rmtree(self.workdir)
         #pass
@@ -0,0 +1,258 @@
+"""
+`tests.test_simulator`
+====================================
+
+.. currentmodule:: tests.test_simulator
+
+:platform: Unix, Mac
+:synopsis: Unit test module for simulating data management policies
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import pytest
+import os
+import sys
+import shutil
+import madats
+import yaml
+from madats.core import storage
+from madats.management import simulator, policy_manager, history_manager
+
+MB = 1024 * 1024
+
+class Tester():
+    def setup(self):
+        if 'MADATS_HOME' in os.environ:
+            pass
+        else:
+            print('MADATS_HOME is not set!')
+            sys.exit()
+        madats_home = os.path.expandvars('$MADATS_HOME')
+        self.workdir = os.path.join(madats_home, '_tmp')
+        self.scratch = os.path.join(self.workdir, 'scratch')
+        self.burst = os.path.join(self.workdir, 'burst')
+        self.archive = os.path.join(self.workdir, 'archive')
+
+        if not os.path.exists(self.scratch):
+            os.makedirs(self.scratch)
+        if not os.path.exists(self.burst):
+            os.makedirs(self.burst)
+        if not os.path.exists(self.archive):
+            os.makedirs(self.archive)
+
+        self.__setup_storage_config__()
+        # the test runs are recorded in a run history of their own
+        self.run_history = history_manager.run_history
+        history_manager.run_history = history_manager.RunHistory(directory=os.path.join(self.workdir, 'store'))
+
+
+    def __setup_storage_config__(self):
+        storage_config = {'system': 'test'}
+        storage_config['test'] = {}
+        storage_tiers = {'scratch': [self.scratch, 'ShortTerm', 700],
+                         'burst': [self.burst, 'None', 1600],
+                         'archive': [self.archive, 'LongTerm', 1]}
+        for k in storage_tiers:
+            storage_config['test'][k] = {'mount': storage_tiers[k][0],
+                                         'persist': storage_tiers[k][1],
+                                         'bandwidth': storage_tiers[k][2]}
+
+        storage_yaml = os.path.expandvars('$MADATS_HOME/config/storage.yaml')
+        self.__write_yaml__(storage_config, storage_yaml)
+
+
+    def teardown(self):
+        history_manager.run_history = self.run_history
+        storage.get_storage_tiers()['burst'].pop('capacity', None)
+        if os.path.exists(self.workdir):
+            shutil.rmtree(self.workdir)
+        pass
+
+
+    def __create_file__(self, filepath, size):
+        with open(filepath, 'w') as f:
+            f.write('x' * size)
+
+
+    def __write_yaml__(self, data, yaml_file):
+        with open(yaml_file, 'w') as f:
+            yaml.dump(data, f, default_flow_style=False)
+
+
+    def __create_task__(self, runtime, inputs, outputs):
+        task = madats.Task(command='cat')
+        task.runtime = runtime
+        task.params = inputs + ['>'] + outputs
+        for vdo in inputs:
+            vdo.consumers.append(task)
+        for vdo in outputs:
+            vdo.producers.append(task)
+        return task
+
+    '''
+    TEST-1: Predict the makespan and data movement of every policy without changing the VDS
+    '''
+    def test_simulate_policies(self):
+        datadir = os.path.join(self.scratch, 'test_simulate_policies')
+        os.makedirs(datadir)
+        self.__create_file__(os.path.join(datadir, 'A'), MB)
+        vds = madats.VirtualDataSpace()
+        vdo_a, vdo_b, vdo_c = [madats.VirtualDataObject(os.path.join(datadir, f)) for f in ['A', 'B', 'C']]
+        task1 = self.__create_task__(10, [vdo_a], [vdo_b])
+        task2 = self.__create_task__(5, [vdo_b], [vdo_c])
+        for vdo in [vdo_a, vdo_b, vdo_c]:
+            vds.add(vdo)
+
+        results = madats.simulate(vds)
+        scratch = 1.0 / 700
+        burst = 1.0 / 1600
+        none = results[madats.Policy.NONE]
+        assert(abs(none.makespan - (15 + 4 * scratch)) < 1e-6)
+        assert(sum(none.bytes_moved.values()) == 0)
+        # only the intermediate data is written to and read from the burst buffer
+        wfa = results[madats.Policy.WORKFLOW_AWARE]
+        assert(abs(wfa.makespan - (15 + 2 * scratch + 2 * burst)) < 1e-6)
+        assert(wfa.peak_occupancy['burst'] == MB)
+        # the input is staged in and the output is staged out
+        sta = results[madats.Policy.STORAGE_AWARE]
+        assert(abs(sta.makespan - (15 + 2 * scratch + 4 * burst)) < 1e-6)
+        assert(abs(sta.compute_done - (15 + scratch + 4 * burst)) < 1e-6)
+        assert(sta.bytes_moved == {'scratch->burst': MB, 'burst->scratch': MB})
+
+        assert(len(vds.vdos) == 3)
+        assert(task1.params == [vdo_a, '>', vdo_b])
+        assert(task2.params == [vdo_b, '>', vdo_c])
+
+
+    '''
+    TEST-2: Run no more tasks at a time than the concurrency limits
+    '''
+    def test_simulate_limits(self):
+        datadir = os.path.join(self.scratch, 'test_simulate_limits')
+        vds = madats.VirtualDataSpace()
+        for i in range(4):
+            vdo = madats.VirtualDataObject(os.path.join(datadir, 'out' + str(i)))
+            self.__create_task__(1, [], [vdo])
+            vds.add(vdo)
+
+        result = simulator.simulate_policy(vds, madats.Policy.NONE)
+        assert(result.makespan == 1)
+        result = simulator.simulate_policy(vds, madats.Policy.NONE, {simulator.COMPUTE: 2})
+        assert(result.makespan == 2)
+
+
+    '''
+    TEST-3: Stage in data only when the tier has the capacity for it
+    '''
+    def test_simulate_capacity(self):
+        datadir = os.path.join(self.scratch, 'test_simulate_capacity')
+        os.makedirs(datadir)
+        vds = madats.VirtualDataSpace()
+        for i in range(2):
+            path = os.path.join(datadir, 'in' + str(i))
+            self.__create_file__(path, MB)
+            vdo = madats.VirtualDataObject(path)
+            self.__create_task__(1, [vdo], [])
+            vds.add(vdo)
+        storage.get_storage_tiers()['burst']['capacity'] = MB
+
+        result = simulator.simulate_policy(vds, madats.Policy.STORAGE_AWARE, auto_cleanup=True)
+        assert(result.peak_occupancy['burst'] == MB)
+        assert(abs(result.makespan - 2 * (1 + 1.0 / 700 + 1.0 / 1600)) < 1e-6)
+
+
+    '''
+    TEST-4: Select the policy with the shortest estimated makespan for a workflow
+    '''
+    def test_auto_policy(self):
+        datadir = os.path.join(self.scratch, 'test_auto_policy')
+        os.makedirs(datadir)
+        files = [os.path.join(datadir, f) for f in ['A', 'B', 'C']]
+        self.__create_file__(files[0], MB)
+        workflow = {'task1': {'command': 'cat', 'runtime': 10, 'vin': [files[0]], 'vout': [files[1]],
+                              'params': [files[0], '>', files[1]]},
+                    'task2': {'command': 'cat', 'runtime': 5, 'vin': [files[1]], 'vout': [files[2]],
+                              'params': [files[1], '>', files[2]]}}
+        yaml_file = os.path.join(self.workdir, 'test_auto_policy.yaml')
+        self.__write_yaml__(workflow, yaml_file)
+
+        # only moving the intermediate data saves I/O time without staging data in or out
+        vds = madats.map(yaml_file, policy=madats.Policy.AUTO)
+        madats.manage(vds)
+        assert(vds.strategy == madats.Policy.WORKFLOW_AWARE)
+        assert(os.path.getsize(files[2]) == MB)
+        assert(os.path.exists(os.path.join(self.burst, 'test_auto_policy', 'B')))
+        assert(not os.path.exists(os.path.join(self.burst, 'test_auto_policy', 'A')))
+
+
+    '''
+    TEST-5: Plug in a site-specific policy, and simulate and apply it by its name
+    '''
+    def test_registered_policy(self):
+        datadir = os.path.join(self.scratch, 'test_registered_policy')
+        os.makedirs(datadir)
+        files = [os.path.join(datadir, f) for f in ['A', 'B', 'C']]
+        self.__create_file__(files[0], MB)
+        workflow = {'task1': {'command': 'cat', 'runtime': 10, 'vin': [files[0]], 'vout': [files[1]],
+                              'params': [files[0], '>', files[1]]},
+                    'task2': {'command': 'cat', 'runtime': 5, 'vin': [files[1]], 'vout': [files[2]],
+                              'params': [files[1], '>', files[2]]}}
+        yaml_file = os.path.join(self.workdir, 'test_registered_policy.yaml')
+        self.__write_yaml__(workflow, yaml_file)
+
+        # moves the inputs of the critical path to the fastest tier
+        class InputsPolicy(policy_manager.DataManagementPolicy):
+            def placement(self, vds, context):
+                fastest = max([t for t in context.tiers], key=context.bandwidth)
+                path = context.critical_path.tasks
+                return dict((vdo, fastest) for vdo in context.vdos
+                            if len(vdo.producers) == 0 and any([t in path for t in vdo.consumers])
+                            and context.size(vdo) == MB)
+
+            def manage(self, vds, context):
+                for vdo, tier in self.placement(vds, context).items():
+                    vds.copy(vdo, tier)
+
+        policy = policy_manager.register('inputs', InputsPolicy)
+        try:
+            assert('inputs' in policy_manager.names())
+            assert(madats.Policy.type('inputs') == policy)
+            vds = madats.map(yaml_file, policy=policy)
+            result = simulator.simulate(vds, [policy])[policy]
+            assert(result.bytes_moved == {'scratch->burst': MB})
+
+            madats.manage(vds)
+            assert(os.path.getsize(files[2]) == MB)
+            assert(os.path.exists(os.path.join(self.burst, 'test_registered_policy', 'A')))
+            assert(not os.path.exists(os.path.join(self.burst, 'test_registered_policy', 'B')))
+        finally:
+            policy_manager.unregister('inputs')
+        assert('inputs' not in policy_manager.names())
+        with pytest.raises(ValueError):
+            policy_manager.get('inputs')
+
+
+    '''
+    TEST-6: Simulate with the sizes of intermediate data observed by a previous run
+    '''
+    def test_observed_sizes(self):
+        datadir = os.path.join(self.scratch, 'test_observed_sizes')
+        os.makedirs(datadir)
+        self.__create_file__(os.path.join(datadir, 'A'), MB)
+        vds = madats.VirtualDataSpace()
+        vdo_a, vdo_b, vdo_c = [madats.VirtualDataObject(os.path.join(datadir, f)) for f in ['A', 'B', 'C']]
+        self.__create_task__(10, [vdo_a], [vdo_b])
+        self.__create_task__(5, [vdo_b], [vdo_c])
+        for vdo in [vdo_a, vdo_b, vdo_c]:
+            vds.add(vdo)
+
+        # without observations, the data is as large as the largest input of its producer
+        model = simulator.WorkflowModel(vds)
+        assert(model.sizes[vdo_b] == MB and model.sizes[vdo_c] == MB)
+
+        history_manager.run_history.record({'tasks': {}, 'vdos': {vdo_b.abspath: 4 * MB}})
+        model = simulator.WorkflowModel(vds)
+        assert(model.sizes[vdo_b] == 4 * MB)
+        assert(model.sizes[vdo_c] == 4 * MB)
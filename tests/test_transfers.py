@@ -0,0 +1,1062 @@
+"""
+`tests.test_transfers`
+====================================
+
+.. currentmodule:: tests.test_transfers
+
+:platform: Unix, Mac
+:synopsis: Unit test module for data movement between storage tiers
+
+.. moduleauthor:: Devarshi Ghoshal <dghoshal@lbl.gov>
+
+"""
+
+import pytest
+import subprocess
+import os
+import sys
+import shutil
+import madats
+import random
+import string
+import yaml
+import time
+import hashlib
+import json
+import threading
+from madats.core import storage, backends
+from madats.core.vds import DataTask
+from madats.management import execution_manager, transfer_manager, cache_manager, purge_manager, history_manager
+from madats.utils import hsi
+
+MOCK_HSI = '''#!{python}
+import json
+import os
+import shlex
+import shutil
+import sys
+
+# mock `hsi -q "prompt; get -R <local> : <archive>; put -R <local> : <archive>; ..."`
+# that records one line with the ordered requests for every HSI session, and of
+# `hsi -q "ls -P <archive> ..."` that lists the tape volumes in MOCK_HSI_VOLUMES
+def copy(src, dest):
+    if os.path.isdir(src):
+        shutil.copytree(src, dest)
+    else:
+        shutil.copy(src, dest)
+
+args = [a for a in sys.argv[1:] if a != '-q']
+lexer = shlex.shlex(' '.join(args), posix=True, punctuation_chars=';')
+lexer.whitespace_split = True
+commands = [[]]
+for token in lexer:
+    if token == ';':
+        commands.append([])
+    else:
+        commands[-1].append(token)
+
+if len(commands[0]) > 1 and commands[0][:2] == ['ls', '-P']:
+    volumes_file = os.environ.get('MOCK_HSI_VOLUMES', '')
+    if not os.path.exists(volumes_file):
+        sys.stderr.write('ls: no tape information\\n')
+        sys.exit(1)
+    with open(volumes_file, 'r') as f:
+        volumes = json.load(f)
+    for path in commands[0][2:]:
+        if path in volumes:
+            volume, section, offset = volumes[path]
+            print('FILE\\t{{}}\\t4096\\t4096\\t{{}}+{{}}\\t{{}}\\t5\\t0\\t1'.format(path, section, offset, volume))
+        else:
+            print('DIRECTORY\\t{{}}'.format(path))
+    sys.exit(0)
+
+requests = []
+for fields in commands:
+    fields = [f for f in fields if f != '-R']
+    if len(fields) != 4 or fields[0] not in ('get', 'put') or fields[2] != ':':
+        continue
+    local_path, archive_path = fields[1], fields[3]
+    if fields[0] == 'get':
+        copy(archive_path, local_path)
+        requests.append('get:' + archive_path)
+    else:
+        copy(local_path, archive_path)
+        requests.append('put:' + archive_path)
+
+with open(os.environ['MOCK_HSI_LOG'], 'a') as log:
+    log.write('\\t'.join(requests) + '\\n')
+'''
+
+class Tester():
+    def setup(self):
+        if 'MADATS_HOME' in os.environ:
+            pass
+        else:
+            print('MADATS_HOME is not set!')
+            sys.exit()
+        madats_home = os.path.expandvars('$MADATS_HOME')
+        self.workdir = os.path.join(madats_home, '_tmp')
+        self.scratch = os.path.join(self.workdir, 'scratch')
+        self.burst = os.path.join(self.workdir, 'burst')
+        self.archive = os.path.join(self.workdir, 'archive')
+
+        if not os.path.exists(self.scratch):
+            os.makedirs(self.scratch)
+        if not os.path.exists(self.burst):
+            os.makedirs(self.burst)
+        if not os.path.exists(self.archive):
+            os.makedirs(self.archive)
+
+        self.__setup_storage_config__()
+        # the test runs are recorded in a run history of their own
+        self.run_history = history_manager.run_history
+        history_manager.run_history = history_manager.RunHistory(directory=os.path.join(self.workdir, 'store'))
+        self.__setup_mock_hsi__()
+
+
+    def __setup_storage_config__(self):
+        storage_config = {'system': 'test'}
+        storage_config['test'] = {}
+        storage_tiers = {'scratch': [self.scratch, 'ShortTerm', 700],
+                         'burst': [self.burst, 'None', 1600],
+                         'archive': [self.archive, 'LongTerm', 1]}
+        for k in storage_tiers:
+            storage_config['test'][k] = {'mount': storage_tiers[k][0],
+                                         'persist': storage_tiers[k][1],
+                                         'bandwidth': storage_tiers[k][2]}
+
+        storage_yaml = os.path.expandvars('$MADATS_HOME/config/storage.yaml')
+        self.__write_yaml__(storage_config, storage_yaml)
+
+
+    def __setup_mock_hsi__(self):
+        bindir = os.path.join(self.workdir, 'bin')
+        if not os.path.exists(bindir):
+            os.makedirs(bindir)
+        mock_hsi = os.path.join(bindir, 'hsi')
+        with open(mock_hsi, 'w') as f:
+            f.write(MOCK_HSI.format(python=sys.executable))
+        os.chmod(mock_hsi, 0o755)
+        self.hsi_log = os.path.join(self.workdir, 'hsi.log')
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = bindir + os.pathsep + self.path
+        os.environ['MOCK_HSI_LOG'] = self.hsi_log
+
+
+    def teardown(self):
+        history_manager.run_history = self.run_history
+        os.environ['PATH'] = self.path
+        if os.path.exists(self.workdir):
+            shutil.rmtree(self.workdir)
+        pass
+
+
+    def __create_file__(self, filepath, content=None):
+        if not content:
+            data = filepath
+        else:
+            data = content
+
+        with open(filepath, 'w') as f:
+            f.write(data)
+
+
+    def __get_random_string__(self):
+        random_str = ''.join([random.choice(string.ascii_letters + string.digits) for n in range(32)])
+        return random_str
+
+
+    def __write_yaml__(self, data, yaml_file):
+        with open(yaml_file, 'w') as f:
+            yaml.dump(data, f, default_flow_style=False)
+
+
+    def __get_file_data__(self, filename):
+        with open(filename, 'r') as f:
+            lines = f.readlines()
+            return ''.join(lines)
+
+
+    def __get_hsi_sessions__(self):
+        if not os.path.exists(self.hsi_log):
+            return []
+        with open(self.hsi_log, 'r') as f:
+            return [line.rstrip('\n').split('\t') for line in f.readlines()]
+
+    '''
+    TEST-1: Recall all the archived inputs of a workflow level in a single HSI session,
+            ordered by their locality on the archive, including directories and paths
+            with spaces
+    '''
+    def test_archive_single_session(self):
+        test_name = 'test_archive_single_session'
+        datadir = os.path.join(self.archive, test_name)
+        if not os.path.exists(datadir):
+            os.makedirs(datadir)
+        outdir = os.path.join(self.scratch, test_name)
+        if not os.path.exists(outdir):
+            os.makedirs(outdir)
+        strdata = []
+        files = [os.path.join(datadir, 'in3'), os.path.join(datadir, 'in 1'),
+                 os.path.join(datadir, 'in2')]
+        for i in range(len(files)):
+            strdata.append(self.__get_random_string__())
+            self.__create_file__(files[i], strdata[i])
+        indir = os.path.join(datadir, 'indir')
+        os.makedirs(os.path.join(indir, 'sub'))
+        dirdata = self.__get_random_string__()
+        self.__create_file__(os.path.join(indir, 'sub', 'part'), dirdata)
+
+        # create a VDS
+        vds = madats.VirtualDataSpace()
+        vds.strategy = madats.Policy.STORAGE_AWARE
+
+        # create VDOs
+        vdos = [madats.VirtualDataObject(f) for f in files]
+        vdo_out = madats.VirtualDataObject(os.path.join(outdir, 'out'))
+
+        vdo_dir = madats.VirtualDataObject(indir)
+
+        # create tasks: each task reads an archived input
+        tasks = []
+        for vdo in vdos:
+            task = madats.Task(command='cat')
+            task.params = [vdo, '>>', vdo_out]
+            vdo.consumers = [task]
+            tasks.append(task)
+        task = madats.Task(command='ls')
+        task.params = [vdo_dir, '>>', vdo_out]
+        vdo_dir.consumers = [task]
+        tasks.append(task)
+        vdo_out.producers = tasks
+        for vdo in vdos + [vdo_dir]:
+            vds.add(vdo)
+        vds.add(vdo_out)
+
+        # manage VDS
+        madats.manage(vds)
+
+        sessions = self.__get_hsi_sessions__()
+        assert(len(sessions) == 1)
+        expected = ['get:' + f for f in sorted(files + [indir])]
+        assert(sessions[0] == expected)
+        for i in range(len(files)):
+            stagein = os.path.join(self.burst, test_name, os.path.basename(files[i]))
+            assert(self.__get_file_data__(stagein) == strdata[i])
+        stagein = os.path.join(self.burst, test_name, 'indir', 'sub', 'part')
+        assert(self.__get_file_data__(stagein) == dirdata)
+
+
+    '''
+    TEST-2: Order archive recalls by their tape volume, or through a pluggable locality key
+    '''
+    def test_archive_locality_key(self):
+        requests = [(hsi.GET, '/local/a', '/archive/a'), (hsi.GET, '/local/b', '/archive/b'),
+                    (hsi.GET, '/local/c', '/archive/c'), (hsi.PUT, '/local/d', '/archive/0/d')]
+        # the volumes cannot be queried: the recalls are in path order
+        assert(isinstance(transfer_manager.get_locality_key(), transfer_manager.VolumeLocalityKey))
+        ordered = transfer_manager.order_requests(requests)
+        assert([r[2] for r in ordered] == ['/archive/a', '/archive/b', '/archive/c', '/archive/0/d'])
+
+        # the volumes and positions listed by `ls -P` order the recalls
+        volumes_file = os.path.join(self.workdir, 'volumes.json')
+        with open(volumes_file, 'w') as f:
+            json.dump({'/archive/a': ['VOL002', 0, 0], '/archive/b': ['VOL001', 2, 512],
+                       '/archive/c': ['VOL001', 1, 0]}, f)
+        os.environ['MOCK_HSI_VOLUMES'] = volumes_file
+        try:
+            assert(hsi.query_volumes(['/archive/a', '/archive/b', '/archive/0']) ==
+                   {'/archive/a': ('VOL002', 0, 0), '/archive/b': ('VOL001', 2, 512)})
+            ordered = transfer_manager.order_requests(requests, transfer_manager.VolumeLocalityKey())
+        finally:
+            del os.environ['MOCK_HSI_VOLUMES']
+        assert([r[2] for r in ordered] == ['/archive/0/d', '/archive/c', '/archive/b', '/archive/a'])
+
+        volumes = {'/archive/a': 2, '/archive/b': 1, '/archive/c': 1, '/archive/0/d': 0}
+        default_key = transfer_manager.get_locality_key()
+        transfer_manager.set_locality_key(lambda path: (volumes[path], path))
+        try:
+            ordered = transfer_manager.order_requests(requests)
+        finally:
+            transfer_manager.set_locality_key(default_key)
+        assert([r[2] for r in ordered] == ['/archive/0/d', '/archive/b', '/archive/c', '/archive/a'])
+        command = hsi.session_command(ordered)
+        assert(command.count('hsi ') == 1)
+
+
+    '''
+    TEST-3: Limit the number of concurrent transfers to a storage tier
+    '''
+    def test_transfer_stream_limit(self):
+        test_name = 'test_transfer_stream_limit'
+        datadir = os.path.join(self.scratch, test_name)
+        if not os.path.exists(datadir):
+            os.makedirs(datadir)
+        strdata = []
+        files = [os.path.join(datadir, 'in' + str(i)) for i in range(4)]
+        for i in range(len(files)):
+            strdata.append(self.__get_random_string__())
+            self.__create_file__(files[i], strdata[i])
+
+        # create a VDS
+        vds = madats.VirtualDataSpace()
+        vds.strategy = madats.Policy.STORAGE_AWARE
+
+        # create VDOs and tasks: all the inputs are staged-in at the same time
+        for f in files:
+            vdo = madats.VirtualDataObject(f)
+            task = madats.Task(command='cat')
+            task.params = [vdo]
+            vdo.consumers = [task]
+            vds.add(vdo)
+
+        burst = storage.get_storage_tiers()['burst']
+        burst['max_streams'] = 1
+        try:
+            madats.manage(vds)
+        finally:
+            del burst['max_streams']
+
+        scheduler = execution_manager.transfer_scheduler
+        assert(scheduler.peak_streams['burst'] == 1)
+        report = scheduler.report()
+        assert(report[('scratch', 'burst')]['tasks'] == len(files))
+        assert(report[('scratch', 'burst')]['bytes'] == sum([len(s) for s in strdata]))
+        for i in range(len(files)):
+            stagein = os.path.join(self.burst, test_name, os.path.basename(files[i]))
+            assert(self.__get_file_data__(stagein) == strdata[i])
+
+
+    '''
+    TEST-4: Throttle the bytes/sec of transfers that share a token bucket
+    '''
+    def test_token_bucket(self):
+        bucket = transfer_manager.TokenBucket(rate=100000, capacity=100000)
+        start = time.time()
+        for i in range(3):
+            bucket.consume(100000)
+        # the first 100000 bytes are within the capacity of the bucket
+        assert(time.time() - start >= 1.5)
+
+
+    '''
+    TEST-5: Compute the content digest of the data while it is moved and record it
+            in the transfer manifest and the fingerprint store
+    '''
+    def test_inline_digest(self):
+        test_name = 'test_inline_digest'
+        datadir = os.path.join(self.scratch, test_name)
+        if not os.path.exists(os.path.join(datadir, 'indir')):
+            os.makedirs(os.path.join(datadir, 'indir'))
+        files = [os.path.join(datadir, 'in1'), os.path.join(datadir, 'indir', 'in2'),
+                 os.path.join(datadir, 'indir', 'in3')]
+        for f in files:
+            self.__create_file__(f, self.__get_random_string__())
+
+        # create a VDS
+        vds = madats.VirtualDataSpace()
+        vds.strategy = madats.Policy.STORAGE_AWARE
+
+        # create VDOs and tasks
+        vdo1 = madats.VirtualDataObject(files[0])
+        vdo2 = madats.VirtualDataObject(os.path.join(datadir, 'indir'))
+        task = madats.Task(command='ls')
+        task.params = [vdo1, vdo2]
+        vdo1.consumers = [task]
+        vdo2.consumers = [task]
+        vds.add(vdo1)
+        vds.add(vdo2)
+
+        madats.manage(vds)
+
+        manifest = execution_manager.transfer_scheduler.manifest
+        entries = dict([(e['src'], e) for e in manifest])
+        with open(files[0], 'rb') as f:
+            digest = hashlib.blake2b(f.read()).hexdigest()
+        assert(entries[files[0]]['digest'] == digest)
+        assert(entries[files[0]]['algorithm'] == 'blake2b')
+        assert(entries[os.path.join(datadir, 'indir')]['digest'] is not None)
+
+        for f in files:
+            stagein = f.replace(self.scratch, self.burst)
+            assert(storage.get_fingerprint(stagein) == storage.get_fingerprint(f))
+            assert(storage.is_same(f, stagein))
+        assert(storage.get_fingerprint(stagein)[0] == storage.get_fingerprint(f)[0])
+
+        # a modified file is no longer covered by its fingerprint
+        time.sleep(0.01)
+        with open(stagein, 'a') as f:
+            f.write('modified')
+        assert(storage.get_fingerprint(stagein) is None)
+        assert(not storage.is_same(files[2], stagein))
+
+        # a file replaced by a copy with the same size and time is not covered either
+        stagein = files[0].replace(self.scratch, self.burst)
+        stat = os.stat(stagein)
+        os.rename(stagein, stagein + '.old')
+        shutil.copy(stagein + '.old', stagein)
+        os.utime(stagein, (stat.st_atime, stat.st_mtime))
+        assert(storage.get_fingerprint(stagein) is None)
+
+        # the fingerprints of removed data are dropped
+        storage.remove_fingerprints([os.path.join(datadir, 'indir')])
+        fingerprints = storage.load_fingerprints()
+        assert(files[0] in fingerprints)
+        assert(all([f not in fingerprints for f in files[1:]]))
+
+
+    '''
+    TEST-6: Stage data in a configurable number of workflow levels ahead of its consumers
+    '''
+    def test_prefetch_lookahead(self):
+        test_name = 'test_prefetch_lookahead'
+        datadir = os.path.join(self.scratch, test_name)
+        if not os.path.exists(datadir):
+            os.makedirs(datadir)
+
+        def stagein_times(lookahead, capacity=1024 * 1024 * 1024):
+            name = str(lookahead) + ('' if capacity is not None else 'u')
+            files = [os.path.join(datadir, 'in' + name + str(i)) for i in range(3)]
+            for f in files:
+                self.__create_file__(f, self.__get_random_string__())
+
+            # create a chain of tasks, where each task also reads its own input
+            vds = madats.VirtualDataSpace()
+            vds.strategy = madats.Policy.STORAGE_AWARE
+            prev_vdo = None
+            for i in range(len(files)):
+                vdo_in = madats.VirtualDataObject(files[i])
+                vdo_out = madats.VirtualDataObject(os.path.join(datadir, 'out' + name + str(i)))
+                task = madats.Task(command='sleep 0.5; cat')
+                task.params = [vdo_in, '>', vdo_out]
+                vdo_in.consumers = [task]
+                vdo_out.producers = [task]
+                if prev_vdo is not None:
+                    task.params.insert(0, prev_vdo)
+                    prev_vdo.consumers = [task]
+                vds.add(vdo_in)
+                vds.add(vdo_out)
+                prev_vdo = vdo_out
+
+            default_lookahead = execution_manager.prefetch_lookahead
+            execution_manager.prefetch_lookahead = lookahead
+            # the lookahead only holds back stage-ins to tiers with a capacity
+            burst = storage.get_storage_tiers()['burst']
+            if capacity is not None:
+                burst['capacity'] = capacity
+            try:
+                madats.manage(vds)
+            finally:
+                execution_manager.prefetch_lookahead = default_lookahead
+                burst.pop('capacity', None)
+            manifest = execution_manager.transfer_scheduler.manifest
+            entries = dict([(e['src'], e) for e in manifest])
+            return [entries[f]['start'] for f in files]
+
+        # just-in-time: every input is staged in once the previous task has finished
+        times = stagein_times(0)
+        assert(times[1] - times[0] >= 0.5)
+        assert(times[2] - times[1] >= 0.5)
+        # all the inputs are staged in ahead of the computation
+        times = stagein_times(2)
+        assert(times[2] - times[0] < 0.5)
+        assert(execution_manager.prefetch_scheduler.prefetched >= 2)
+        # and without a capacity, even with a just-in-time lookahead
+        times = stagein_times(0, None)
+        assert(times[2] - times[0] < 0.5)
+
+
+    '''
+    TEST-7: Stage out every output as soon as it is produced, while the workflow computes
+    '''
+    def test_early_stage_out(self):
+        test_name = 'test_early_stage_out'
+        datadir = os.path.join(self.scratch, test_name)
+        if not os.path.exists(datadir):
+            os.makedirs(datadir)
+
+        for mode in [madats.ExecutionMode.DAG, madats.ExecutionMode.BIN]:
+            # a quick and a slow branch, each producing a workflow output
+            vds = madats.VirtualDataSpace()
+            vds.strategy = madats.Policy.STORAGE_AWARE
+            outputs = []
+            for branch, command in [('fast', 'cat'), ('slow', 'sleep 1; cat')]:
+                input_file = os.path.join(datadir, '{}-{}.in'.format(branch, mode))
+                self.__create_file__(input_file, self.__get_random_string__())
+                vdo_in = madats.VirtualDataObject(input_file)
+                vdo_out = madats.VirtualDataObject(os.path.join(datadir, '{}-{}.out'.format(branch, mode)))
+                task = madats.Task(command=command)
+                task.params = [vdo_in, '>', vdo_out]
+                vdo_in.consumers = [task]
+                vdo_out.producers = [task]
+                vds.add(vdo_in)
+                vds.add(vdo_out)
+                outputs.append(vdo_out.abspath)
+
+            madats.manage(vds, mode)
+            timings = execution_manager.timings
+            manifest = execution_manager.transfer_scheduler.manifest
+            entries = dict([(e['dest'], e) for e in manifest])
+            # the quick branch is staged out while the slow branch still computes
+            assert(entries[outputs[0]]['start'] < timings['compute_done'])
+            assert(timings['data_durable'] >= timings['compute_done'])
+            # the outputs are durable when the last stage-out finishes
+            durable = max([entries[o]['start'] + entries[o]['seconds'] for o in outputs])
+            assert(timings['data_durable'] - durable < 0.1)
+            for output in outputs:
+                assert(os.path.exists(output))
+
+
+    '''
+    TEST-8: Resume an interrupted transfer from its journal
+    '''
+    def test_resumable_transfer(self):
+        test_name = 'test_resumable_transfer'
+        datadir = os.path.join(self.scratch, test_name)
+        if os.path.exists(datadir):
+            shutil.rmtree(datadir)
+        os.makedirs(os.path.join(datadir, 'indir'))
+        src = os.path.join(datadir, 'indir')
+        dest = os.path.join(self.burst, test_name, 'indir')
+        files = ['a', 'b', 'c']
+        for f in files:
+            self.__create_file__(os.path.join(src, f), self.__get_random_string__() * 1024)
+
+        default_chunk_size = transfer_manager.CHUNK_SIZE
+        default_journal_interval = transfer_manager.JOURNAL_INTERVAL
+        transfer_manager.CHUNK_SIZE = 1024
+        transfer_manager.JOURNAL_INTERVAL = 4096
+        journal_file = os.path.join(datadir, 'indir.journal')
+        try:
+            # interrupt the transfer in the middle of the second file
+            copied = [0]
+            def interrupt(nbytes):
+                copied[0] += nbytes
+                if copied[0] > 32 * 1024 + 20 * 1024:
+                    raise IOError('interrupted')
+            journal = transfer_manager.TransferJournal(journal_file)
+            with pytest.raises(IOError):
+                transfer_manager.copy(src, dest, interrupt, [], journal)
+            journal.close()
+
+            # the restarted transfer skips the first file and resumes the second one
+            journal = transfer_manager.TransferJournal(journal_file)
+            assert(journal.copied(os.path.join(src, 'a'), os.path.join(dest, 'a')))
+            assert(journal.offset(os.path.join(src, 'b'), os.path.join(dest, 'b')) == 20 * 1024)
+            digests = []
+            nbytes = transfer_manager.copy(src, dest, None, digests, journal)
+            journal.remove()
+        finally:
+            transfer_manager.CHUNK_SIZE = default_chunk_size
+            transfer_manager.JOURNAL_INTERVAL = default_journal_interval
+
+        assert(nbytes == 12 * 1024 + 32 * 1024)
+        assert(not os.path.exists(journal_file))
+        for src_file, dest_file, digest in digests:
+            with open(src_file, 'rb') as f:
+                data = f.read()
+            with open(dest_file, 'rb') as f:
+                assert(f.read() == data)
+            # the resumed file is not read again, so it has no digest
+            if os.path.basename(src_file) == 'b':
+                assert(digest is None)
+            else:
+                assert(digest == hashlib.blake2b(data).hexdigest())
+        assert(len(digests) == len(files))
+
+
+    '''
+    TEST-9: Compress the copies moved to a slower tier that are read back, and journal them
+    '''
+    def test_compressed_transfer(self):
+        test_name = 'test_compressed_transfer'
+        datadir = os.path.join(self.burst, test_name)
+        if os.path.exists(datadir):
+            shutil.rmtree(datadir)
+        os.makedirs(datadir)
+        content = self.__get_random_string__() * 1024
+        fast_file = os.path.join(datadir, 'out')
+        self.__create_file__(fast_file, content)
+        slow_file = fast_file.replace(self.burst, self.scratch)
+        restored_file = fast_file + '.restored'
+
+        # an evicted copy is demoted to the slower tier and restored from it by MaDaTS
+        vdo_fast = madats.VirtualDataObject(fast_file)
+        vdo_slow = madats.VirtualDataObject(slow_file)
+        vdo_restored = madats.VirtualDataObject(restored_file)
+        demote = DataTask('demote', vdo_fast, vdo_slow)
+        restore = DataTask('restore', vdo_slow, vdo_restored)
+        vdo_slow.add_producer(demote)
+        vdo_slow.add_consumer(restore)
+        vdo_restored.add_producer(restore)
+        # while the data staged out to its final location is not compressed
+        vdo_final = madats.VirtualDataObject(os.path.join(self.scratch, test_name, 'final'))
+        stage_out = DataTask('stage_out', vdo_fast, vdo_final)
+
+        default_compression = transfer_manager.get_compression()
+        assert(default_compression == 'never')
+        assert(transfer_manager.compression_mode(demote) is None)
+        # the test tiers are only ~2x apart, so compress whenever data moves to a slower tier
+        transfer_manager.set_compression('always')
+        # and the test tiers are on the same device, where data is not compressed
+        transfer_manager.set_fast_path(False)
+        scheduler = transfer_manager.TransferScheduler()
+        try:
+            assert(transfer_manager.compression_mode(stage_out) is None)
+            assert(transfer_manager.compression_mode(demote) == transfer_manager.COMPRESS)
+            transfer_manager.transfer(demote, scheduler)
+            transfer_manager.transfer(restore, scheduler)
+        finally:
+            transfer_manager.set_compression(default_compression)
+            transfer_manager.set_fast_path(True)
+
+        entries = dict([(e['dest'], e) for e in scheduler.manifest])
+        assert(not os.path.exists(slow_file))
+        assert(os.path.exists(slow_file + '.zst'))
+        assert(entries[slow_file]['compression'] == 'zstd')
+        assert(entries[slow_file]['compression_ratio'] < 0.5)
+        assert(entries[slow_file]['bytes'] == len(content))
+        assert(entries[restored_file]['compression'] == 'zstd')
+        with open(restored_file, 'r') as f:
+            assert(f.read() == content)
+
+        # a compressed copy is journaled, and skipped when the data task is restarted
+        journal = transfer_manager.TransferJournal(os.path.join(self.workdir, test_name + '.journal'))
+        dest = os.path.join(datadir, 'journaled')
+        digests = []
+        nbytes = transfer_manager.copy(fast_file, dest, None, digests, journal, transfer_manager.COMPRESS)
+        assert(nbytes == len(content))
+        journal.close()
+        journal = transfer_manager.TransferJournal(journal.journal_file)
+        restarted = []
+        nbytes = transfer_manager.copy(fast_file, dest, None, restarted, journal, transfer_manager.COMPRESS)
+        journal.remove()
+        assert(nbytes == 0)
+        assert(restarted == digests)
+
+
+    '''
+    TEST-10: Share staged-in data across workflows through a cache
+    '''
+    def test_shared_cache(self):
+        test_name = 'test_shared_cache'
+        datadir = os.path.join(self.scratch, test_name)
+        if os.path.exists(datadir):
+            shutil.rmtree(datadir)
+        os.makedirs(datadir)
+        input_file = os.path.join(datadir, 'reference')
+        self.__create_file__(input_file, self.__get_random_string__())
+        cached_file = input_file.replace(self.scratch, self.burst)
+
+        def run(output_name):
+            vds = madats.VirtualDataSpace()
+            vds.strategy = madats.Policy.STORAGE_AWARE
+            vds.auto_cleanup = True
+            vds.cache = True
+            vdo_in = madats.VirtualDataObject(input_file)
+            vdo_out = madats.VirtualDataObject(os.path.join(datadir, output_name))
+            task = madats.Task(command='cat')
+            task.params = [vdo_in, '>', vdo_out]
+            vdo_in.consumers = [task]
+            vdo_out.producers = [task]
+            vds.add(vdo_in)
+            vds.add(vdo_out)
+            madats.manage(vds)
+            manifest = execution_manager.transfer_scheduler.manifest
+            return dict([(e['dest'], e) for e in manifest])
+
+        # the first workflow stages in the reference data, the second one maps the cached copy
+        entries = run('out1')
+        assert(entries[cached_file]['bytes'] > 0)
+        assert(os.path.exists(cached_file))
+        entries = run('out2')
+        assert(entries[cached_file]['bytes'] == 0)
+        assert(os.path.exists(cached_file))
+        entry = cache_manager.dataset_cache.entries()[cached_file]
+        assert(entry['staged'] and entry['refs'] == [])
+
+        # unreferenced copies are evicted when the cache is full
+        for eviction, evicted in [(cache_manager.LRU, 'a'), (cache_manager.SIZE, 'b')]:
+            cache = cache_manager.DatasetCache(name=test_name + '_' + eviction, eviction=eviction, size=25)
+            for name, size in [('a', 10), ('b', 12)]:
+                path = os.path.join(self.burst, test_name, eviction + name)
+                self.__create_file__(path, 'x' * size)
+                assert(not cache.acquire(input_file, path, 'burst', size, 'owner'))
+                cache.staged(path, size)
+                cache.release(path, 'owner')
+            path = os.path.join(self.burst, test_name, eviction + 'c')
+            cache.acquire(input_file, path, 'burst', 10, 'owner')
+            assert(not os.path.exists(os.path.join(self.burst, test_name, eviction + evicted)))
+            assert(len(cache.entries()) == 2)
+            os.remove(cache.index.path)
+
+
+    '''
+    TEST-11: Rename or link data between tiers on the same device instead of copying it
+    '''
+    def test_same_device_fast_path(self):
+        test_name = 'test_same_device_fast_path'
+        datadir = os.path.join(self.scratch, test_name)
+        if os.path.exists(datadir):
+            shutil.rmtree(datadir)
+        os.makedirs(datadir)
+        input_file = os.path.join(datadir, 'in')
+        self.__create_file__(input_file, self.__get_random_string__())
+        output_file = os.path.join(datadir, 'out')
+
+        # the test tiers are on the same device
+        vds = madats.VirtualDataSpace()
+        vds.strategy = madats.Policy.STORAGE_AWARE
+        vds.auto_cleanup = True
+        vdo_in = madats.VirtualDataObject(input_file)
+        vdo_in.mutable = False
+        vdo_out = madats.VirtualDataObject(output_file)
+        task = madats.Task(command='cat')
+        task.params = [vdo_in, '>', vdo_out]
+        vdo_in.consumers = [task]
+        vdo_out.producers = [task]
+        vds.add(vdo_in)
+        vds.add(vdo_out)
+        madats.manage(vds)
+
+        manifest = execution_manager.transfer_scheduler.manifest
+        entries = dict([(e['dest'], e) for e in manifest])
+        stagein_file = input_file.replace(self.scratch, self.burst)
+        # the immutable input is cloned or hard linked, and the output that is cleaned up is renamed
+        assert(entries[stagein_file]['method'] in ['reflink', 'hardlink'])
+        assert(entries[output_file]['method'] == 'rename')
+        assert(not os.path.exists(output_file.replace(self.scratch, self.burst)))
+        with open(input_file, 'r') as fin:
+            with open(output_file, 'r') as fout:
+                assert(fin.read() == fout.read())
+
+        # a renamed directory replaces the destination, which is kept if the rename fails
+        src_dir = os.path.join(datadir, 'dir')
+        dest_dir = os.path.join(self.burst, test_name, 'dir')
+        for path, content in [(src_dir, 'new'), (dest_dir, 'old')]:
+            os.makedirs(path)
+            self.__create_file__(os.path.join(path, content), content)
+        transfer_manager._rename(src_dir, dest_dir)
+        assert(os.listdir(dest_dir) == ['new'])
+        assert(not os.path.exists(src_dir))
+        with pytest.raises(OSError):
+            transfer_manager._rename(src_dir, dest_dir)
+        assert(os.listdir(dest_dir) == ['new'])
+        assert(sorted(os.listdir(os.path.dirname(dest_dir))) == ['dir'])
+
+
+    '''
+    TEST-12: Preserve the holes of a sparse file
+    '''
+    def test_sparse_copy(self):
+        test_name = 'test_sparse_copy'
+        datadir = os.path.join(self.scratch, test_name)
+        if not os.path.exists(datadir):
+            os.makedirs(datadir)
+        src = os.path.join(datadir, 'checkpoint')
+        dest = os.path.join(self.burst, test_name, 'checkpoint')
+        # a file with a leading hole, two data ranges and a trailing hole
+        size = 64 * transfer_manager.MB
+        with open(src, 'wb') as f:
+            for offset in [8 * transfer_manager.MB, 40 * transfer_manager.MB]:
+                f.seek(offset)
+                f.write(os.urandom(transfer_manager.MB))
+            f.truncate(size)
+        if not transfer_manager.is_sparse(src):
+            pytest.skip('the file system does not support sparse files')
+
+        digests = []
+        nbytes = transfer_manager.copy(src, dest, None, digests)
+        assert(nbytes < 8 * transfer_manager.MB)
+        assert(os.path.getsize(dest) == size)
+        assert(transfer_manager.is_sparse(dest))
+        assert(os.stat(dest).st_blocks * 512 < 8 * transfer_manager.MB)
+        with open(src, 'rb') as f:
+            with open(dest, 'rb') as g:
+                assert(f.read() == g.read())
+
+        # the digest is of the content, as if the holes were read as zeros
+        with open(src, 'rb') as f:
+            assert(digests[0][2] == hashlib.blake2b(f.read()).hexdigest())
+        # and the sparse copy has the same digest
+        copies = []
+        transfer_manager.copy(dest, dest + '.copy', None, copies)
+        assert(copies[0][2] == digests[0][2])
+        # and so has a copy of the same data that is not sparse
+        dense = os.path.join(datadir, 'dense')
+        with open(src, 'rb') as f:
+            with open(dense, 'wb') as g:
+                g.write(f.read())
+        copies = []
+        transfer_manager.copy(dense, dense + '.copy', None, copies)
+        assert(copies[0][2] == digests[0][2])
+
+
+    '''
+    TEST-13: Select transfer backends by the interfaces of the tiers
+    '''
+    def test_transfer_backends(self):
+        test_name = 'test_transfer_backends'
+        datadir = os.path.join(self.scratch, test_name)
+        if os.path.exists(datadir):
+            shutil.rmtree(datadir)
+        os.makedirs(datadir)
+
+        # the built-in backends, selected by the interfaces of the tiers
+        assert(isinstance(backends.get_backend('posix', 'posix'), backends.PosixParallelBackend))
+        assert(isinstance(backends.get_backend('hsi', 'posix'), backends.HsiBackend))
+        assert(isinstance(backends.get_backend('posix', 'mock'), backends.LocalThrottledBackend))
+        archive_file = os.path.join(self.archive, test_name, 'in')
+        vdo_archive = madats.VirtualDataObject(archive_file)
+        vdo_burst = madats.VirtualDataObject(archive_file.replace(self.archive, self.burst))
+        datatask = DataTask('dt', vdo_archive, vdo_burst)
+        assert('hsi -q' in datatask.command)
+        assert(isinstance(datatask.backend, backends.HsiBackend))
+        assert(not transfer_manager.is_native_transfer(datatask))
+
+        # backends declare their throughput characteristics
+        throttled = backends.LocalThrottledBackend(bandwidth=1, latency=0.2)
+        assert(abs(throttled.estimate(10 * backends.MB) - 10.2) < 0.01)
+        assert(backends.hsi_backend.estimate(0) == backends.hsi_backend.latency)
+        # and copy with cp -R in a job script unless they have a command of their own
+        assert(backends.TransferBackend().command(vdo_archive, vdo_burst) == 'cp -R')
+
+        # a parallel backend only moves data over the streams the tier limits leave free
+        parallel = DataTask('parallel', madats.VirtualDataObject(os.path.join(datadir, 'dir')),
+                            madats.VirtualDataObject(os.path.join(self.burst, test_name, 'dir')))
+        scheduler = transfer_manager.TransferScheduler()
+        burst = storage.get_storage_tiers()['burst']
+        burst['max_streams'] = 2
+        try:
+            assert(scheduler.acquire(parallel, 0, parallel.backend.streams) == 2)
+            scheduler.release(parallel)
+            assert(scheduler.acquire(datatask, 0, 1) == 1)
+            assert(scheduler.acquire(parallel, 0, parallel.backend.streams) == 1)
+            scheduler.release(parallel)
+            scheduler.release(datatask)
+        finally:
+            del burst['max_streams']
+        assert(scheduler.peak_streams['burst'] == 2)
+
+        # a throttled local backend stands in for the posix backend
+        input_file = os.path.join(datadir, 'in')
+        self.__create_file__(input_file, 'x' * (512 * 1024))
+        backends.register('posix', 'posix', throttled)
+        transfer_manager.set_fast_path(False)
+        try:
+            vds = madats.VirtualDataSpace()
+            vds.strategy = madats.Policy.STORAGE_AWARE
+            vdo_in = madats.VirtualDataObject(input_file)
+            task = madats.Task(command='cat')
+            task.params = [vdo_in]
+            vdo_in.consumers = [task]
+            vds.add(vdo_in)
+            madats.manage(vds)
+        finally:
+            backends.register('posix', 'posix', backends.PosixParallelBackend())
+            transfer_manager.set_fast_path(True)
+
+        manifest = execution_manager.transfer_scheduler.manifest
+        entries = dict([(e['src'], e) for e in manifest])
+        assert(entries[input_file]['seconds'] >= 0.2 + 0.5)
+        assert(os.path.exists(input_file.replace(self.scratch, self.burst)))
+
+
+    '''
+    TEST-14: Schedule data tasks by their slack to the deadlines of their VDOs
+    '''
+    def test_deadline_scheduling(self):
+        test_name = 'test_deadline_scheduling'
+        datadir = os.path.join(self.scratch, test_name)
+        if os.path.exists(datadir):
+            shutil.rmtree(datadir)
+        os.makedirs(datadir)
+
+        def create_vds():
+            vds = madats.VirtualDataSpace()
+            vds.strategy = madats.Policy.STORAGE_AWARE
+            outputs = {}
+            for name in ['relaxed', 'urgent']:
+                input_file = os.path.join(datadir, name + '.in')
+                self.__create_file__(input_file, self.__get_random_string__())
+                vdo_in = madats.VirtualDataObject(input_file)
+                vdo_out = madats.VirtualDataObject(os.path.join(datadir, name + '.out'))
+                task = madats.Task(command='cat')
+                task.params = [vdo_in, '>', vdo_out]
+                vdo_in.consumers = [task]
+                vdo_out.producers = [task]
+                vds.add(vdo_in)
+                vds.add(vdo_out)
+                outputs[name] = vdo_out
+            return vds, outputs
+
+        # the stage-out of the output with a deadline, and the tasks leading to it, go first
+        vds, outputs = create_vds()
+        outputs['urgent'].deadline = int((time.time() + 3600) * 1000)
+        dag = madats.get_workflow_dag(vds)
+        scheduler = transfer_manager.DeadlineScheduler(dag)
+        stageouts = dict([(t.dest, t) for t in dag if transfer_manager.is_stage_out(t)])
+        urgent = stageouts[outputs['urgent']]
+        relaxed = stageouts[outputs['relaxed']]
+        assert(scheduler.priority(urgent) < scheduler.priority(relaxed, 0))
+        assert(0 < scheduler.slack(urgent) <= 3600)
+        assert(scheduler.latest_start(relaxed) is None)
+        producer = urgent.predecessors[0]
+        assert(scheduler.latest_start(producer) <= scheduler.latest_start(urgent))
+        assert(len(scheduler.infeasible) == 0)
+
+        # a deadline that has already passed is reported before the workflow runs
+        vds, outputs = create_vds()
+        outputs['urgent'].deadline = int((time.time() - 60) * 1000)
+        madats.manage(vds)
+        infeasible = execution_manager.deadline_scheduler.infeasible
+        assert(list(infeasible.keys()) == [outputs['urgent']])
+        assert(infeasible[outputs['urgent']] >= 60)
+        assert(os.path.exists(outputs['urgent'].abspath))
+
+
+    '''
+    TEST-15: Purge the copies left on the tiers once their lifetime expires
+    '''
+    def test_purge_expired_copies(self):
+        test_name = 'test_purge_expired_copies'
+        datadir = os.path.join(self.scratch, test_name)
+        if os.path.exists(datadir):
+            shutil.rmtree(datadir)
+        os.makedirs(datadir)
+
+        # the copies of the input, the intermediate and the output are left on the burst buffer
+        input_file = os.path.join(datadir, 'in')
+        mid_file = os.path.join(datadir, 'mid')
+        output_file = os.path.join(datadir, 'out')
+        self.__create_file__(input_file, self.__get_random_string__())
+        vds = madats.VirtualDataSpace()
+        vds.strategy = madats.Policy.STORAGE_AWARE
+        vdo_in = madats.VirtualDataObject(input_file)
+        vdo_in.persistence = madats.Persistence.SHORT_TERM
+        vdo_mid = madats.VirtualDataObject(mid_file)
+        vdo_mid.persistence = madats.Persistence.NONE
+        vdo_out = madats.VirtualDataObject(output_file)
+        task = madats.Task(command='cat')
+        task.params = [vdo_in, '>', vdo_mid]
+        last = madats.Task(command='cat')
+        last.params = [vdo_mid, '>', vdo_out]
+        vdo_in.consumers = [task]
+        vdo_mid.producers = [task]
+        vdo_mid.consumers = [last]
+        vdo_out.producers = [last]
+        vds.add(vdo_in)
+        vds.add(vdo_mid)
+        vds.add(vdo_out)
+        madats.manage(vds)
+
+        burst_in = input_file.replace(self.scratch, self.burst)
+        burst_mid = mid_file.replace(self.scratch, self.burst)
+        burst_out = output_file.replace(self.scratch, self.burst)
+        assert(burst_in in storage.load_fingerprints())
+        entries = purge_manager.placement_index.entries()
+        assert(entries[burst_in]['lifetime'] == madats.Persistence.SHORT_TERM)
+        assert(entries[burst_out]['lifetime'] == 0)
+        # the intermediate is written straight to the burst buffer, without a data task
+        assert(not os.path.exists(mid_file))
+        assert(entries[burst_mid]['lifetime'] == 0)
+
+        def expired(report):
+            return dict([(item['path'], item['action']) for item in report
+                         if item['path'] in [burst_in, burst_out]])
+
+        # the dry run only reports the copies that outlived their persistence
+        report = madats.purge(dry_run=True, now=time.time() + 60)
+        assert(expired(report) == {burst_out: purge_manager.DELETE})
+        report = madats.purge(dry_run=True, now=time.time() + 7200)
+        assert(expired(report) == {burst_in: purge_manager.DELETE, burst_out: purge_manager.DELETE})
+        assert(os.path.exists(burst_in) and os.path.exists(burst_out))
+
+        # the only copy of the output is demoted to where it came from
+        data = self.__get_file_data__(output_file)
+        os.remove(output_file)
+        report = madats.purge(tiers=['burst'], now=time.time() + 7200)
+        assert(expired(report) == {burst_in: purge_manager.DELETE, burst_out: purge_manager.DEMOTE})
+        assert(not os.path.exists(burst_in) and not os.path.exists(burst_out))
+        assert(self.__get_file_data__(output_file) == data)
+        entries = purge_manager.placement_index.entries()
+        assert(burst_in not in entries and burst_out not in entries)
+        assert(burst_in not in storage.load_fingerprints())
+
+
+    '''
+    TEST-16: Copy a directory tree with the native data mover as `cp -R` does
+    '''
+    def test_native_copy_semantics(self):
+        test_name = 'test_native_copy_semantics'
+        src = os.path.join(self.scratch, test_name, 'tree')
+        os.makedirs(os.path.join(src, 'a', 'b'))
+        self.__create_file__(os.path.join(src, 'top'), 'top')
+        self.__create_file__(os.path.join(src, 'a', 'script'), 'echo')
+        self.__create_file__(os.path.join(src, 'a', 'b', 'nested'), 'nested')
+        os.chmod(os.path.join(src, 'a', 'script'), 0o750)
+        os.chmod(os.path.join(src, 'a', 'b'), 0o700)
+        os.symlink('script', os.path.join(src, 'a', 'link'))
+        os.symlink(os.path.join('a', 'b'), os.path.join(src, 'dirlink'))
+
+        def tree(root):
+            entries = {}
+            for dirpath, dirnames, filenames in os.walk(root):
+                for name in dirnames + filenames:
+                    path = os.path.join(dirpath, name)
+                    mode = os.lstat(path).st_mode
+                    if os.path.islink(path):
+                        content = os.readlink(path)
+                    elif os.path.isdir(path):
+                        content = None
+                    else:
+                        content = self.__get_file_data__(path)
+                    entries[os.path.relpath(path, root)] = (mode, content)
+            return entries
+
+        expected = os.path.join(self.burst, test_name, 'cp')
+        os.makedirs(os.path.dirname(expected))
+        subprocess.check_call(['cp', '-R', src, expected])
+        for streams in [1, 4]:
+            dest = os.path.join(self.burst, test_name, 'native' + str(streams))
+            transfer_manager.copy(src, dest, streams=streams)
+            assert(tree(dest) == tree(expected))
+
+
+    '''
+    TEST-17: Fail a data task that raises an unexpected error, and finish the workflow
+    '''
+    def test_transfer_error(self):
+        test_name = 'test_transfer_error'
+        datadir = os.path.join(self.scratch, test_name)
+        os.makedirs(datadir)
+        input_file = os.path.join(datadir, 'in')
+        self.__create_file__(input_file, self.__get_random_string__())
+        vds = madats.VirtualDataSpace()
+        vds.strategy = madats.Policy.STORAGE_AWARE
+        vdo_in = madats.VirtualDataObject(input_file)
+        vdo_out = madats.VirtualDataObject(os.path.join(datadir, 'out'))
+        task = madats.Task(command='cat')
+        task.params = [vdo_in, '>', vdo_out]
+        vdo_in.consumers = [task]
+        vdo_out.producers = [task]
+        vds.add(vdo_in)
+        vds.add(vdo_out)
+
+        def fail(task):
+            raise KeyError('unknown tier')
+
+        default_methods = transfer_manager.fast_path_methods
+        transfer_manager.fast_path_methods = fail
+        try:
+            del execution_manager.result_list[:]
+            for mode in [madats.ExecutionMode.BIN, madats.ExecutionMode.DAG]:
+                manager = threading.Thread(target=madats.manage, args=(vds, mode))
+                manager.daemon = True
+                manager.start()
+                manager.join(60)
+                assert(not manager.is_alive())
+            assert(any(["unknown tier" in str(r) for r in execution_manager.result_list]))
+        finally:
+            transfer_manager.fast_path_methods = default_methods
+        assert(len(execution_manager.transfer_scheduler._granted) == 0)